@@ -1,13 +1,32 @@
 from fastapi import FastAPI, HTTPException
-from transformers import GPT2LMHeadModel, GPT2Tokenizer
+from fastapi.responses import StreamingResponse
 from huggingface_hub import hf_hub_download
+from concurrent.futures import ThreadPoolExecutor
 import torch
 import os
 import json
+import asyncio
+import copy
+import functools
+import hashlib
+import math
+import re
+import shutil
+import string
+import sys
+import tempfile
+import threading
+import time
+import warnings
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, Tuple, Deque
+from collections import deque, OrderedDict
 from pydantic import BaseModel
 
+# Generation helpers shared with the coaching engine in app/ (this file is itself the "app" module)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "app"))
+from json_stopping import JSONObjectStoppingCriteria
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -16,20 +35,66 @@ logger = logging.getLogger(__name__)
 MODEL_REPO = "PhilmoLSC/philmoLSC"  # Use the user's Hugging Face model repo
 MODEL_NAME = "distilgpt2"
 HF_TOKEN = os.getenv("HF_TOKEN")
-MAX_LENGTH = 150
+MAX_NEW_TOKENS = int(os.getenv("MAX_NEW_TOKENS", 100))
+# Mask logits so /event generations can only spell a tweak object of the expected schema
+CONSTRAINED_DECODING = os.getenv("CONSTRAINED_DECODING", "true").lower() in ("1", "true", "yes")
+# Reuse the attention keys/values of the opening prompt instruction instead of prefilling it per request
+PROMPT_PREFIX_CACHE = os.getenv("PROMPT_PREFIX_CACHE", "true").lower() in ("1", "true", "yes")
+MAX_PROMPT_TOKENS = 512
 DEVICE = "cpu"  # Force CPU for Fly.io cost optimization
 PORT = int(os.getenv("PORT", 8080))  # Default to 8080 for Fly.io
 
+LOCAL_MODEL_PATH = "./app/fine_tuned_gpt2"
+
+# Three-tier model fallback order: Hub repo, local fine-tune, base DistilGPT-2
+MODEL_SOURCES = [
+    ("hub", MODEL_REPO),
+    ("local", LOCAL_MODEL_PATH),
+    ("base", MODEL_NAME),
+]
+
+# On-disk artifact cache: verified safetensors snapshots reused across restarts ("" disables it)
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", "./model_cache")
+MODEL_REVISION = os.getenv("MODEL_REVISION", "main")  # branch, tag or commit; pinned to a commit sha on download
+MODEL_CACHE_VERIFY = os.getenv("MODEL_CACHE_VERIFY", "size").lower()  # size | sha256 (re-hash at every start)
+
 # Memory optimization settings
-MODEL_DTYPE = torch.float16  # Use float16 for reduced memory usage
+MODEL_DTYPE = torch.float32  # Weights load in fp32; MODEL_PRECISION picks the inference format
 LOW_CPU_MEM = True
 # Remove device_map to avoid accelerate dependency and reduce memory usage
 
+# Inference precision: fp32, bf16 or int8 (dynamic-quantized Linear layers).
+# fp16 matmuls are slow on CPU, so there is deliberately no fp16 mode.
+MODEL_PRECISION = os.getenv("MODEL_PRECISION", "fp32").lower()
+SUPPORTED_PRECISIONS = ("fp32", "bf16", "int8")
+# Reject a reduced-precision model whose self-check perplexity drifts further than this from fp32
+PRECISION_MAX_PERPLEXITY_RATIO = float(os.getenv("PRECISION_MAX_PERPLEXITY_RATIO", 1.25))
+SELF_CHECK_TEXT = (
+    "You are a fitness AI assistant. Generate a JSON workout tweak response.\n"
+    '{"action": "reduce_volume", "reason": "User skipped a set - reducing volume to prevent overtraining", '
+    '"modifications": {"sets": -1, "rest_time": 30}}'
+)
+
+# Inference worker pool settings (keeps model.generate off the event loop)
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", 1))
+INFERENCE_QUEUE_DEPTH = int(os.getenv("INFERENCE_QUEUE_DEPTH", 8))
+INFERENCE_RETRY_AFTER = int(os.getenv("INFERENCE_RETRY_AFTER", 2))  # seconds
+
+# Micro-batching settings for concurrent /event generations
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", 8))
+BATCH_WAIT_MS = float(os.getenv("BATCH_WAIT_MS", 10))
+
+# Response cache for repeated /event prompts
+TWEAK_CACHE_MAX_ENTRIES = int(os.getenv("TWEAK_CACHE_MAX_ENTRIES", 1024))
+TWEAK_CACHE_MAX_BYTES = int(os.getenv("TWEAK_CACHE_MAX_BYTES", 2 * 1024 * 1024))
+TWEAK_CACHE_TTL = float(os.getenv("TWEAK_CACHE_TTL", 600))  # seconds
+
 class EventRequest(BaseModel):
     event: str
     user_id: str
     context: Dict[str, Any] = {}
     user_data: Dict[str, Any] = {}
+    fresh: bool = False  # Skip the tweak cache and sample a new response
 
 # Enhanced Nutrition AI Models
 class NutritionRecommendationRequest(BaseModel):
@@ -39,6 +104,10 @@ class NutritionRecommendationRequest(BaseModel):
     current_intake: Dict[str, float]  # today's nutrition intake
     goals: Dict[str, float]  # nutrition goals
 
+class NutritionBatchRequest(BaseModel):
+    # Each item is a NutritionRecommendationRequest body, validated per item so one bad item fails alone
+    requests: List[Dict[str, Any]]
+
 class NutritionFeedbackRequest(BaseModel):
     user_id: str
     recommendation_id: str
@@ -50,63 +119,940 @@ class HydrationRequest(BaseModel):
     current_intake: float  # liters consumed today
     target_intake: float  # target liters per day
 
-def load_model():
-    """Load the PhilmoLSC/philmoLSC model or fallback options"""
-    try:
-        logger.info(f"Loading model from {MODEL_REPO}...")
+class InferenceQueueFull(Exception):
+    """Raised when the inference pool cannot accept another model call"""
+
+class InferenceExecutor:
+    """Bounded worker pool for blocking model calls.
+
+    At most ``workers`` calls run at once and at most ``queue_depth`` more
+    wait for a free worker; anything beyond that is rejected immediately so
+    callers can shed load instead of piling up behind slow generations.
+    """
+
+    def __init__(self, workers: int = INFERENCE_WORKERS, queue_depth: int = INFERENCE_QUEUE_DEPTH):
+        self.workers = max(1, workers)
+        self.queue_depth = max(0, queue_depth)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.queue_depth
+
+    def _release(self, _future) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            self.completed += 1
+
+    async def run(self, fn, *args, **kwargs):
+        """Run ``fn`` on a worker thread, raising InferenceQueueFull when saturated"""
+        return await self.submit(fn, *args, **kwargs)
+
+    def submit(self, fn, *args, **kwargs) -> asyncio.Future:
+        """Admit ``fn`` to the pool right away and return an awaitable for its result.
+
+        Raises InferenceQueueFull synchronously, so callers can reject a request
+        before they start responding to it (e.g. before opening a stream).
+        """
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                self.rejected += 1
+                raise InferenceQueueFull(f"{self._in_flight} model calls already in flight")
+            self._in_flight += 1
 
-        # Priority 1: Try PhilmoLSC/philmoLSC from Hugging Face
         try:
-            model = GPT2LMHeadModel.from_pretrained(
-                MODEL_REPO,
-                torch_dtype=MODEL_DTYPE,
-                low_cpu_mem_usage=LOW_CPU_MEM,
-                token=HF_TOKEN if HF_TOKEN else None
-            )
-            tokenizer = GPT2Tokenizer.from_pretrained(
-                MODEL_REPO,
-                token=HF_TOKEN if HF_TOKEN else None
-            )
-            tokenizer.pad_token = tokenizer.eos_token
-            logger.info("✅ PhilmoLSC/philmoLSC model loaded successfully!")
-            return model, tokenizer
+            future = self._pool.submit(functools.partial(fn, *args, **kwargs))
+        except Exception:
+            self._release(None)
+            raise
+
+        # Release the slot when the worker finishes, not when the caller stops
+        # waiting, so cancelled requests still count until their generate ends
+        future.add_done_callback(self._release)
+        return asyncio.wrap_future(future)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            in_flight = self._in_flight
+        return {
+            "workers": self.workers,
+            "queue_depth": self.queue_depth,
+            "in_flight": in_flight,
+            "queued": max(0, in_flight - self.workers),
+            "completed": self.completed,
+            "rejected": self.rejected
+        }
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+def load_pretrained(path: str, token: Optional[str] = None, revision: Optional[str] = None):
+    """Load a GPT-2 model and tokenizer prepared for batched CPU inference"""
+    # Imported here: pulling in transformers takes seconds and must not delay startup
+    from transformers import GPT2LMHeadModel, GPT2Tokenizer
+
+    model = GPT2LMHeadModel.from_pretrained(
+        path,
+        torch_dtype=MODEL_DTYPE,
+        low_cpu_mem_usage=LOW_CPU_MEM,
+        token=token,
+        revision=revision
+    )
+    model.eval()
+    tokenizer = GPT2Tokenizer.from_pretrained(path, token=token, revision=revision)
+    tokenizer.pad_token = tokenizer.eos_token
+    tokenizer.padding_side = "left"  # Batched generation continues from the right edge
+    return model, tokenizer
+
+class ModelArtifactCache:
+    """Verified model snapshots on local disk, keyed by source and pinned revision.
+
+    Layout under the cache root, one directory per model source:
+        <slug>/refs/<requested revision>   -> resolved revision (commit sha)
+        <slug>/snapshots/<resolved>/       -> safetensors weights, config, tokenizer, manifest.json
+
+    Weights are stored as safetensors so from_pretrained memory-maps them instead of
+    unpickling, and every file is listed in the manifest with its size and sha256.
+    The hashes are computed once when a snapshot is written; lookups compare sizes
+    unless ``verify`` is "sha256". A snapshot that fails verification is deleted and
+    treated as a miss.
+    """
+
+    MANIFEST = "manifest.json"
+
+    def __init__(self, root: str, verify: str = "size"):
+        self.root = root
+        self.verify = verify
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.corrupt = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.root)
+
+    def _source_dir(self, source: str) -> str:
+        slug = re.sub(r"[^A-Za-z0-9._-]+", "--", source.strip("./")) or "model"
+        return os.path.join(self.root, slug)
+
+    @staticmethod
+    def _file_sha256(path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _write_atomic(path: str, text: str) -> None:
+        tmp = f"{path}.tmp-{os.getpid()}"
+        with open(tmp, "w") as f:
+            f.write(text)
+        os.replace(tmp, path)
+
+    def requested_revision(self, source: str) -> str:
+        """Revision a source is cached under; local directories are keyed by their file stats"""
+        if not os.path.isdir(source):
+            return MODEL_REVISION
+        stats = hashlib.sha256()
+        for name in sorted(os.listdir(source)):
+            path = os.path.join(source, name)
+            if os.path.isfile(path):
+                st = os.stat(path)
+                stats.update(f"{name}:{st.st_size}:{st.st_mtime_ns};".encode())
+        return f"local-{stats.hexdigest()[:16]}"
+
+    def resolve_revision(self, source: str, token: Optional[str] = None) -> str:
+        """Commit sha a Hub revision currently points to (network); local directories resolve offline"""
+        if os.path.isdir(source):
+            return self.requested_revision(source)
+        from huggingface_hub import HfApi
+        return HfApi().model_info(source, revision=MODEL_REVISION, token=token).sha
+
+    def _verify(self, snapshot: str) -> bool:
+        try:
+            with open(os.path.join(snapshot, self.MANIFEST)) as f:
+                files = json.load(f)["files"]
+            for name, expected in files.items():
+                path = os.path.join(snapshot, name)
+                if os.path.getsize(path) != expected["size"]:
+                    return False
+                if self.verify == "sha256" and self._file_sha256(path) != expected["sha256"]:
+                    return False
+            return bool(files)
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+
+    def lookup(self, source: str) -> Optional[str]:
+        """Path of a verified snapshot for the source's pinned revision, without network access"""
+        if not self.enabled:
+            return None
+        source_dir = self._source_dir(source)
+        try:
+            with open(os.path.join(source_dir, "refs", self.requested_revision(source))) as f:
+                revision = f.read().strip()
+        except OSError:
+            self.misses += 1
+            return None
+
+        snapshot = os.path.join(source_dir, "snapshots", revision)
+        if not self._verify(snapshot):
+            logger.warning(f"Cached snapshot {snapshot} failed verification - discarding it")
+            shutil.rmtree(snapshot, ignore_errors=True)
+            self.corrupt += 1
+            self.misses += 1
+            return None
+        self.hits += 1
+        return snapshot
+
+    def store(self, source: str, revision: str, model, tokenizer) -> Optional[str]:
+        """Save a loaded (fp32) model as a verified snapshot and pin the requested revision to it"""
+        if not self.enabled:
+            return None
+        source_dir = self._source_dir(source)
+        os.makedirs(os.path.join(source_dir, "snapshots"), exist_ok=True)
+        os.makedirs(os.path.join(source_dir, "refs"), exist_ok=True)
+
+        # Build the snapshot next to its final location, then rename it into place in one step
+        tmp = tempfile.mkdtemp(prefix=".tmp-", dir=source_dir)
+        try:
+            model.save_pretrained(tmp, safe_serialization=True)
+            tokenizer.save_pretrained(tmp)
+            files = {
+                name: {"size": os.path.getsize(path), "sha256": self._file_sha256(path)}
+                for name in sorted(os.listdir(tmp))
+                for path in [os.path.join(tmp, name)]
+                if os.path.isfile(path)
+            }
+            manifest = {"source": source, "revision": revision, "created": time.time(), "files": files}
+            with open(os.path.join(tmp, self.MANIFEST), "w") as f:
+                json.dump(manifest, f, indent=2)
+
+            snapshot = os.path.join(source_dir, "snapshots", revision)
+            shutil.rmtree(snapshot, ignore_errors=True)
+            os.replace(tmp, snapshot)
+        except Exception:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+        self._write_atomic(os.path.join(source_dir, "refs", self.requested_revision(source)), revision)
+        self.stores += 1
+        return snapshot
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "dir": self.root or None,
+            "verify": self.verify,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "corrupt": self.corrupt
+        }
+
+model_artifact_cache = ModelArtifactCache(MODEL_CACHE_DIR, MODEL_CACHE_VERIFY)
+
+def measure_model(model, tokenizer) -> Dict[str, float]:
+    """Perplexity and forward-pass latency on a fixed tweak sample"""
+    inputs = tokenizer(SELF_CHECK_TEXT, return_tensors="pt")
+    with torch.no_grad():
+        model(**inputs)  # Warm-up
+        start = time.perf_counter()
+        outputs = model(**inputs, labels=inputs["input_ids"])
+        latency_ms = (time.perf_counter() - start) * 1000
+    return {
+        "perplexity": round(float(torch.exp(outputs.loss.float())), 3),
+        "latency_ms": round(latency_ms, 2)
+    }
+
+def _replace_conv1d_with_linear(module: torch.nn.Module) -> None:
+    """Swap GPT-2's Conv1D projections for equivalent nn.Linear layers so they can be quantized"""
+    from transformers.pytorch_utils import Conv1D
+
+    for name, child in module.named_children():
+        if isinstance(child, Conv1D):
+            in_features, out_features = child.weight.shape
+            linear = torch.nn.Linear(in_features, out_features)
+            linear.weight.data = child.weight.data.t().contiguous()
+            linear.bias.data = child.bias.data
+            setattr(module, name, linear)
+        else:
+            _replace_conv1d_with_linear(child)
+
+def _quantize_int8(model):
+    """Dynamic int8 quantization of a model's nn.Linear layers
+
+    Uses torchao's quantize_ when it is installed. Otherwise it uses the deprecated
+    torch.ao.quantization.quantize_dynamic, with its deprecation warnings logged
+    rather than raised. Once torch removes that API this raises, and optimize_model
+    serves fp32.
+    """
+    try:
+        from torchao.quantization import Int8DynamicActivationInt8WeightConfig, quantize_
+    except ImportError:
+        quantize_ = None
+    if quantize_ is not None:
+        quantize_(model, Int8DynamicActivationInt8WeightConfig())
+        return model
+
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        quantize_dynamic = getattr(getattr(torch.ao, "quantization", None), "quantize_dynamic", None)
+        if quantize_dynamic is None:
+            raise RuntimeError("int8 needs torchao: torch.ao.quantization.quantize_dynamic is not available")
+        quantized = quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    if caught:
+        logger.warning(f"int8 uses the deprecated torch.ao quantization path (install torchao to replace it): "
+                       f"{'; '.join(sorted({str(w.message).strip() for w in caught}))}")
+    return quantized
+
+def apply_precision(model, precision: str):
+    """Return a copy of an fp32 model converted to the requested inference precision"""
+    if precision == "fp32":
+        return model
+    if precision == "bf16":
+        return copy.deepcopy(model).to(torch.bfloat16)
+    if precision == "int8":
+        quantizable = copy.deepcopy(model)
+        _replace_conv1d_with_linear(quantizable)
+        return _quantize_int8(quantizable)
+    raise ValueError(f"Unsupported precision '{precision}', expected one of {SUPPORTED_PRECISIONS}")
+
+def optimize_model(model, tokenizer, precision: str = MODEL_PRECISION):
+    """Convert a freshly loaded fp32 model to ``precision`` after a perplexity/latency self-check.
+
+    Falls back to fp32 when conversion fails or perplexity drifts past
+    PRECISION_MAX_PERPLEXITY_RATIO. Returns the model to serve and a report
+    for /health.
+    """
+    report: Dict[str, Any] = {"requested": precision, "active": "fp32"}
+    baseline = measure_model(model, tokenizer)
+    report["fp32"] = baseline
+
+    if precision not in SUPPORTED_PRECISIONS:
+        logger.warning(f"Unknown MODEL_PRECISION '{precision}', serving fp32")
+        report["error"] = f"unsupported precision, expected one of {SUPPORTED_PRECISIONS}"
+        report.update(baseline)
+        return model, report
+
+    if precision == "fp32":
+        report.update(baseline)
+        return model, report
+
+    try:
+        candidate = apply_precision(model, precision)
+        check = measure_model(candidate, tokenizer)
+    except Exception as e:
+        logger.warning(f"Could not switch model to {precision}, serving fp32: {e}")
+        report["error"] = str(e)
+        report.update(baseline)
+        return model, report
 
+    ratio = check["perplexity"] / baseline["perplexity"]
+    report[precision] = check
+    report["perplexity_ratio"] = round(ratio, 3)
+    if not math.isfinite(check["perplexity"]) or ratio > PRECISION_MAX_PERPLEXITY_RATIO:
+        logger.warning(
+            f"{precision} self-check failed (perplexity {check['perplexity']} vs fp32 {baseline['perplexity']}), serving fp32"
+        )
+        report["error"] = "perplexity self-check failed"
+        report.update(baseline)
+        return model, report
+
+    logger.info(f"✅ Serving {precision} model: {check['latency_ms']}ms/forward vs {baseline['latency_ms']}ms fp32")
+    report["active"] = precision
+    report.update(check)
+    return candidate, report
+
+def load_and_cache(source: str, token: Optional[str] = None):
+    """Load a model source at a pinned revision and snapshot it into the artifact cache"""
+    revision = model_artifact_cache.resolve_revision(source, token) if model_artifact_cache.enabled else None
+    model, tokenizer = load_pretrained(
+        source,
+        token=token,
+        revision=None if os.path.isdir(source) else revision
+    )
+    if revision:
+        try:
+            model_artifact_cache.store(source, revision, model, tokenizer)
+            logger.info(f"💾 Cached {source}@{revision} in {MODEL_CACHE_DIR}")
         except Exception as e:
-            logger.warning(f"Could not load PhilmoLSC/philmoLSC model: {e}")
+            logger.warning(f"Could not cache {source}: {e}")
+    return model, tokenizer
 
-        # Priority 2: Try local fine-tuned model
+def load_tier(source: str, token: Optional[str] = None):
+    """Load one model tier: its verified cached snapshot if there is one, otherwise the source itself"""
+    snapshot = model_artifact_cache.lookup(source)
+    if snapshot is not None:
         try:
-            local_model_path = "./app/fine_tuned_gpt2"
-            logger.info(f"Trying local model at {local_model_path}...")
-            model = GPT2LMHeadModel.from_pretrained(
-                local_model_path,
-                torch_dtype=MODEL_DTYPE,
-                low_cpu_mem_usage=LOW_CPU_MEM
-            )
-            tokenizer = GPT2Tokenizer.from_pretrained(local_model_path)
-            tokenizer.pad_token = tokenizer.eos_token
-            logger.info("✅ Local fine-tuned model loaded successfully!")
+            model, tokenizer = load_pretrained(snapshot)
+            logger.info(f"✅ {source} loaded from cached snapshot {snapshot}")
             return model, tokenizer
+        except Exception as e:
+            logger.warning(f"Could not load cached snapshot {snapshot}: {e}")
+    return load_and_cache(source, token=token)
 
+def load_model():
+    """Load the PhilmoLSC/philmoLSC model or fallback options
+    
+    Tiers are tried in MODEL_SOURCES order, each from its cached snapshot first and then
+    from the network or disk, so a lower tier cached during a Hub outage never shadows
+    the Hub model once it is reachable again.
+    """
+    global precision_report
+    for tier, source in MODEL_SOURCES:
+        if tier == "base":
+            logger.info("🔄 Falling back to base DistilGPT-2 model (constitution compliant)...")
+        else:
+            logger.info(f"Loading {tier} model from {source}...")
+        try:
+            model, tokenizer = load_tier(source, token=HF_TOKEN if tier == "hub" and HF_TOKEN else None)
+            logger.info(f"✅ {source} model loaded successfully!")
+            model, precision_report = optimize_model(model, tokenizer)
+            model_state["source"] = source
+            return model, tokenizer
         except Exception as e:
-            logger.warning(f"Could not load local model: {e}")
-
-        # Priority 3: Base DistilGPT-2 fallback (constitution compliant)
-        logger.info("🔄 Falling back to base DistilGPT-2 model (constitution compliant)...")
-        model = GPT2LMHeadModel.from_pretrained(
-            MODEL_NAME,
-            torch_dtype=MODEL_DTYPE,
-            low_cpu_mem_usage=LOW_CPU_MEM
+            logger.warning(f"Could not load {tier} model {source}: {e}")
+
+    logger.error("❌ Error loading model: every tier failed")
+    return None, None
+
+# Opening instruction shared by every /event prompt, whose key/value states can be reused. It ends
+# on "." so the prompt splits at a token boundary: the "\n\n" after it tokenizes the same alone
+# as in the full prompt. The rules follow the request details, as the model has always seen them.
+TWEAK_PROMPT_PREFIX = "You are a fitness AI assistant. Generate a JSON workout tweak response."
+
+def build_tweak_prompt(event_type: str, user_data: Dict[str, Any], context: Dict[str, Any]) -> str:
+    """Build the context-aware prompt for a workout tweak"""
+    # Extract relevant user data
+    current_program = user_data.get("current_program", {})
+    fitness_level = user_data.get("fitness_level", "intermediate")
+    goals = user_data.get("goals", [])
+
+    # Create context-aware prompt with better JSON formatting instructions
+    prompt_parts = [
+        TWEAK_PROMPT_PREFIX,
+        "",
+        f"Event: {event_type}",
+        f"User Fitness Level: {fitness_level}",
+        f"Goals: {', '.join(goals) if goals else 'general fitness'}",
+        f"Current Program: {json.dumps(current_program)}",
+        f"Context: {json.dumps(context)}",
+        "",
+        "Rules:",
+        "- No rep drops below 80% of planned reps",
+        "- Maintain progressive overload principles",
+        "- Consider user's fitness level and goals",
+        "",
+        "Return ONLY valid JSON with these exact fields:",
+        '{"action": "action_name", "reason": "explanation", "modifications": {"field": value}}',
+        "",
+        "JSON:"
+    ]
+
+    return "\n".join(prompt_parts)
+
+class PromptPrefixCache:
+    """Key/value states of TWEAK_PROMPT_PREFIX, computed once per loaded model.
+
+    Every /event prompt opens with the same instruction, so its attention
+    keys/values are identical across requests. generate_tweak_texts seeds each
+    batched generate with a copy of them expanded to the batch size, and the model
+    only prefills the request-specific suffix. The states are rebuilt whenever the
+    serving model or tokenizer changes, and install_model clears them explicitly.
+    """
+
+    def __init__(self, enabled: bool = PROMPT_PREFIX_CACHE):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._owner: Optional[Tuple[Any, Any]] = None
+        self.prefix_ids: Optional[torch.Tensor] = None
+        self._layers: Optional[List[Tuple[torch.Tensor, torch.Tensor]]] = None
+        self.builds = 0
+        self.uses = 0
+        self.build_ms: Optional[float] = None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._owner = None
+            self.prefix_ids = None
+            self._layers = None
+
+    @staticmethod
+    def _cache_layers(past_key_values) -> List[Tuple[torch.Tensor, torch.Tensor]]:
+        if hasattr(past_key_values, "layers"):
+            return [(layer.keys, layer.values) for layer in past_key_values.layers]
+        if hasattr(past_key_values, "key_cache"):
+            return list(zip(past_key_values.key_cache, past_key_values.value_cache))
+        return [(keys, values) for keys, values in past_key_values]
+
+    def prepare(self, model, tokenizer) -> Tuple[torch.Tensor, bool]:
+        """Token ids of the prefix for this tokenizer, and whether its key/value states are available"""
+        with self._lock:
+            if self._owner is None or self._owner[0] is not model or self._owner[1] is not tokenizer:
+                self.prefix_ids = tokenizer(TWEAK_PROMPT_PREFIX, return_tensors="pt")["input_ids"]
+                self._layers = None
+                self._owner = (model, tokenizer)
+                if self.enabled:
+                    start = time.perf_counter()
+                    with torch.no_grad():
+                        outputs = model(self.prefix_ids, use_cache=True)
+                    self._layers = self._cache_layers(outputs.past_key_values)
+                    self.build_ms = round((time.perf_counter() - start) * 1000, 2)
+                    self.builds += 1
+            return self.prefix_ids, self._layers is not None
+
+    def past_key_values(self, batch_size: int):
+        """Fresh cache holding the prefix states for ``batch_size`` rows (generate extends it in place)"""
+        from transformers import DynamicCache
+
+        cache = DynamicCache()
+        for layer_idx, (keys, values) in enumerate(self._layers):
+            cache.update(
+                keys.expand(batch_size, -1, -1, -1).contiguous(),
+                values.expand(batch_size, -1, -1, -1).contiguous(),
+                layer_idx
+            )
+        with self._lock:
+            self.uses += 1
+        return cache
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "prefix_tokens": int(self.prefix_ids.shape[1]) if self.prefix_ids is not None else None,
+            "builds": self.builds,
+            "uses": self.uses,
+            "build_ms": self.build_ms
+        }
+
+prompt_prefix_cache = PromptPrefixCache()
+
+def encode_tweak_prompts(prompts: List[str], tok, prefix_ids: Optional[torch.Tensor]) -> Tuple[torch.Tensor, torch.Tensor, bool]:
+    """Token ids and attention mask for a batch of prompts.
+
+    Prompts that share TWEAK_PROMPT_PREFIX are encoded as the prefix ids followed by
+    the left-padded suffixes, so the prefix occupies the same positions in every row
+    and its cached key/value states line up. Returns whether that layout was used.
+    """
+    if prefix_ids is None or not all(prompt.startswith(TWEAK_PROMPT_PREFIX) for prompt in prompts):
+        inputs = tok(prompts, return_tensors="pt", padding=True, truncation=True, max_length=MAX_PROMPT_TOKENS)
+        return inputs["input_ids"], inputs["attention_mask"], False
+
+    suffixes = [prompt[len(TWEAK_PROMPT_PREFIX):] for prompt in prompts]
+    inputs = tok(suffixes, return_tensors="pt", padding=True, truncation=True,
+                 max_length=MAX_PROMPT_TOKENS - prefix_ids.shape[1])
+    batch_size = len(prompts)
+    input_ids = torch.cat([prefix_ids.expand(batch_size, -1), inputs["input_ids"]], dim=1)
+    attention_mask = torch.cat([
+        torch.ones(batch_size, prefix_ids.shape[1], dtype=inputs["attention_mask"].dtype),
+        inputs["attention_mask"]
+    ], dim=1)
+    return input_ids, attention_mask, True
+
+class TweakGrammar:
+    """Character-level automaton for the tweak object, compiled against a tokenizer's vocabulary.
+
+    Accepts exactly
+        {"action": "<identifier>", "reason": "<text>", "modifications": {"<identifier>": <number>, ...}}
+    with optional leading whitespace and the separators spelled as in the prompt template.
+    Strings may not contain quotes, backslashes or control characters, so no escapes are needed.
+
+    For every automaton state the set of vocabulary tokens that keep the text valid is
+    computed once and cached, together with the state each token ends in. Tokens made only
+    of string (or identifier) characters are resolved from a precomputed table instead of
+    being walked character by character.
+    """
+
+    START = "start"
+    DONE = "done"
+    IDENTIFIER_CHARS = frozenset(string.ascii_letters + string.digits + "_")
+    DIGITS = frozenset(string.digits)
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self.eos_token_id = tokenizer.eos_token_id
+        self._explicit: Dict[str, Dict[str, str]] = {}
+        self._classes: Dict[str, List[Tuple[str, str]]] = {}
+        self._build_automaton()
+        self._distance = self._closing_distances()
+        self.max_distance = max(self._distance.values())
+
+        self._texts = self._decode_vocab(tokenizer)
+        self.vocab_size = len(self._texts)
+        self._by_first_char: Dict[str, List[int]] = {}
+        self._plain: Dict[str, set] = {"identifier": set(), "string": set()}
+        for token_id, text in enumerate(self._texts):
+            if not text:
+                continue
+            self._by_first_char.setdefault(text[0], []).append(token_id)
+            if all(self._char_in_class("string", ch) for ch in text):
+                self._plain["string"].add(token_id)
+                if all(ch in self.IDENTIFIER_CHARS for ch in text):
+                    self._plain["identifier"].add(token_id)
+
+        self._compiled: Dict[str, Tuple[torch.Tensor, torch.Tensor, torch.Tensor]] = {}
+        self._budget_masks: Dict[Tuple[str, int], torch.Tensor] = {}
+
+    # Automaton
+
+    def _literal(self, name: str, text: str, then: str) -> str:
+        """Chain of states that must spell ``text``; returns the first state"""
+        states = [f"{name}:{i}" for i in range(len(text))] + [then]
+        for i, ch in enumerate(text):
+            self._explicit[states[i]] = {ch: states[i + 1]}
+        return states[0]
+
+    def _state(self, name: str, explicit: Optional[Dict[str, str]] = None,
+               classes: Optional[List[Tuple[str, str]]] = None) -> None:
+        self._explicit[name] = explicit or {}
+        self._classes[name] = classes or []
+
+    def _build_automaton(self) -> None:
+        next_key = self._literal("next_key", ' "', "key")
+        reason = self._literal("to_reason", ', "reason": "', "reason")
+        modifications = self._literal("to_modifications", ', "modifications": {', "modifications")
+        value = self._literal("to_value", ": ", "value")
+        number_end = {",": next_key, "}": "close"}
+
+        self._state(self.START, {" ": self.START, "\n": self.START,
+                                 "{": self._literal("open", '"action": "', "action")})
+        self._state("action", classes=[("identifier", "action_body")])
+        self._state("action_body", {'"': reason}, [("identifier", "action_body")])
+        self._state("reason", classes=[("string", "reason_body")])
+        self._state("reason_body", {'"': modifications}, [("string", "reason_body")])
+        self._state("modifications", {"}": "close", '"': "key"})
+        self._state("key", classes=[("identifier", "key_body")])
+        self._state("key_body", {'"': value}, [("identifier", "key_body")])
+        self._state("value", {"-": "number_sign", "0": "number_zero"}, [("nonzero", "number_int")])
+        self._state("number_sign", {"0": "number_zero"}, [("nonzero", "number_int")])
+        self._state("number_zero", {".": "number_dot", **number_end})
+        self._state("number_int", {".": "number_dot", **number_end}, [("digit", "number_int")])
+        self._state("number_dot", classes=[("digit", "number_frac")])
+        self._state("number_frac", dict(number_end), [("digit", "number_frac")])
+        self._state("close", {"}": self.DONE})
+        self._state(self.DONE)
+
+    def _char_in_class(self, char_class: str, ch: str) -> bool:
+        if char_class == "identifier":
+            return ch in self.IDENTIFIER_CHARS
+        if char_class == "digit":
+            return ch in self.DIGITS
+        if char_class == "nonzero":
+            return ch in self.DIGITS and ch != "0"
+        # JSON string content without escapes; U+FFFD marks a token holding a partial UTF-8 sequence
+        return ch >= " " and ch not in '"\\\ufffd'
+
+    def step(self, state: str, ch: str) -> Optional[str]:
+        """State after reading one character, or None if the character is not allowed"""
+        target = self._explicit[state].get(ch)
+        if target is not None:
+            return target
+        for char_class, target in self._classes.get(state, ()):
+            if self._char_in_class(char_class, ch):
+                return target
+        return None
+
+    def walk(self, state: Optional[str], text: str) -> Optional[str]:
+        for ch in text:
+            if state is None:
+                return None
+            state = self.step(state, ch)
+        return state
+
+    def _closing_distances(self) -> Dict[str, int]:
+        """Fewest characters needed to finish the object from each state"""
+        alphabet = [ch for ch in string.printable if ch not in "\t\r\x0b\x0c"]
+        edges: Dict[str, set] = {}
+        for state in self._explicit:
+            for ch in alphabet:
+                target = self.step(state, ch)
+                if target is not None:
+                    edges.setdefault(target, set()).add(state)
+
+        distance = {self.DONE: 0}
+        frontier = deque([self.DONE])
+        while frontier:
+            state = frontier.popleft()
+            for previous in edges.get(state, ()):
+                if previous not in distance:
+                    distance[previous] = distance[state] + 1
+                    frontier.append(previous)
+        return distance
+
+    # Vocabulary
+
+    @staticmethod
+    def _decode_vocab(tokenizer) -> List[Optional[str]]:
+        """Text of every token, decoded once; None for special tokens"""
+        special = set(tokenizer.all_special_ids)
+        pieces = tokenizer.convert_ids_to_tokens(list(range(len(tokenizer))))
+        byte_decoder = getattr(tokenizer, "byte_decoder", None)
+        texts: List[Optional[str]] = []
+        for token_id, piece in enumerate(pieces):
+            if token_id in special or piece is None:
+                texts.append(None)
+                continue
+            try:
+                text = bytes(byte_decoder[c] for c in piece).decode("utf-8", errors="replace")
+            except (TypeError, KeyError):
+                text = tokenizer.decode([token_id])
+            texts.append(text)
+        return texts
+
+    def _compile_state(self, state: str) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        """Allowed token ids from a state, the closing distance after each, and the full mask"""
+        if state == self.DONE:
+            ids, distances = [self.eos_token_id], [0]
+        else:
+            ends: Dict[int, str] = {}
+            # Tokens made entirely of a class that loops on its target never need walking
+            shortcut: Dict[int, str] = {}
+            for char_class, target in self._classes.get(state, ()):
+                if char_class in self._plain and (char_class, target) in self._classes.get(target, ()):
+                    for token_id in self._plain[char_class]:
+                        shortcut.setdefault(token_id, target)
+
+            for first_char, token_ids in self._by_first_char.items():
+                if self.step(state, first_char) is None:
+                    continue
+                for token_id in token_ids:
+                    end = shortcut.get(token_id) or self.walk(state, self._texts[token_id])
+                    if end is not None:
+                        ends[token_id] = end
+            ids = list(ends)
+            distances = [self._distance[end] for end in ends.values()]
+
+        ids_tensor = torch.tensor(ids, dtype=torch.long)
+        mask = torch.zeros(self.vocab_size, dtype=torch.bool)
+        mask[ids_tensor] = True
+        return ids_tensor, torch.tensor(distances, dtype=torch.long), mask
+
+    def compile(self) -> "TweakGrammar":
+        """Precompute the token masks of every state (otherwise done lazily on first use)"""
+        for state in self._explicit:
+            self._compiled_state(state)
+        return self
+
+    def _compiled_state(self, state: str) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        compiled = self._compiled.get(state)
+        if compiled is None:
+            compiled = self._compiled[state] = self._compile_state(state)
+        return compiled
+
+    def allowed_tokens(self, state: str, remaining: int) -> torch.Tensor:
+        """Boolean vocabulary mask of tokens that keep the object valid and closable in ``remaining`` tokens"""
+        ids, distances, mask = self._compiled_state(state)
+        if remaining > self.max_distance:
+            return mask
+
+        key = (state, remaining)
+        budget_mask = self._budget_masks.get(key)
+        if budget_mask is None:
+            # Every closing character has a single-character token, so a state d characters
+            # from the end can always be closed in d more tokens
+            keep = distances <= remaining - 1
+            if not bool(keep.any()):
+                keep = distances == distances.min()
+            budget_mask = torch.zeros(self.vocab_size, dtype=torch.bool)
+            budget_mask[ids[keep]] = True
+            self._budget_masks[key] = budget_mask
+        return budget_mask
+
+    def advance(self, state: str, token_id: int) -> str:
+        """State after a sampled token; finished (or derailed) rows stay done"""
+        if state == self.DONE or token_id >= self.vocab_size:
+            return self.DONE
+        text = self._texts[token_id]
+        return (self.walk(state, text) if text else None) or self.DONE
+
+class TweakJSONLogitsProcessor:
+    """Logits processor that keeps each row of a batched generate inside TweakGrammar.
+
+    Rows that close the object may only emit EOS afterwards, so generation stops as soon
+    as every row is done. Used through ``model.generate(logits_processor=...)``.
+    """
+
+    def __init__(self, grammar: TweakGrammar, max_new_tokens: int):
+        self.grammar = grammar
+        self.max_new_tokens = max_new_tokens
+        self.states: Optional[List[str]] = None
+        self._prompt_width = 0
+
+    def __call__(self, input_ids: torch.Tensor, scores: torch.Tensor) -> torch.Tensor:
+        if self.states is None:
+            self._prompt_width = input_ids.shape[1]
+            self.states = [self.grammar.START] * input_ids.shape[0]
+        else:
+            last_tokens = input_ids[:, -1].tolist()
+            self.states = [self.grammar.advance(state, token) for state, token in zip(self.states, last_tokens)]
+
+        remaining = self.max_new_tokens - (input_ids.shape[1] - self._prompt_width)
+        width = min(scores.shape[-1], self.grammar.vocab_size)
+        for row, state in enumerate(self.states):
+            mask = self.grammar.allowed_tokens(state, remaining)
+            scores[row, :width].masked_fill_(~mask[:width], float("-inf"))
+            scores[row, width:] = float("-inf")
+        return scores
+
+_tweak_grammar: Optional[TweakGrammar] = None
+
+def tweak_grammar_for(tok) -> TweakGrammar:
+    """Grammar compiled against ``tok``, rebuilt whenever the serving tokenizer changes"""
+    global _tweak_grammar
+    if _tweak_grammar is None or _tweak_grammar.tokenizer is not tok:
+        _tweak_grammar = TweakGrammar(tok)
+    return _tweak_grammar
+
+class GenerationMetrics:
+    """Tokens generated (and saved by early stopping) per tweak, and generations wasted on unparseable output"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.sequences = 0
+        self.new_tokens = 0
+        self.early_stops = 0
+        self.tokens_saved = 0
+        self.parsed = 0
+        self.wasted = 0
+
+    def record_tokens(self, counts: List[int], saved: Optional[List[int]] = None) -> None:
+        with self._lock:
+            self.sequences += len(counts)
+            self.new_tokens += sum(counts)
+            for tokens_saved in saved or ():
+                if tokens_saved > 0:
+                    self.early_stops += 1
+                    self.tokens_saved += tokens_saved
+
+    def record_parse(self, ok: bool) -> None:
+        with self._lock:
+            if ok:
+                self.parsed += 1
+            else:
+                self.wasted += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            attempts = self.parsed + self.wasted
+            return {
+                "constrained": CONSTRAINED_DECODING,
+                "generations": attempts,
+                "wasted": self.wasted,
+                "wasted_rate": round(self.wasted / attempts, 4) if attempts else 0.0,
+                "avg_new_tokens": round(self.new_tokens / self.sequences, 2) if self.sequences else 0.0,
+                "early_stops": self.early_stops,
+                "avg_tokens_saved": round(self.tokens_saved / self.sequences, 2) if self.sequences else 0.0
+            }
+
+generation_metrics = GenerationMetrics()
+
+def generate_tweak_texts(prompts: List[str], streamer=None) -> List[str]:
+    """Run one batched generate over left-padded prompts and decode each continuation.
+
+    ``streamer`` (single prompt only) receives tokens as they are generated.
+    """
+    prefix_ids, prefix_cached = prompt_prefix_cache.prepare(model, tokenizer)
+    input_ids, attention_mask, shares_prefix = encode_tweak_prompts(prompts, tokenizer, prefix_ids)
+    prompt_width = input_ids.shape[1]
+
+    from transformers import LogitsProcessorList, StoppingCriteriaList
+
+    # Stop each row at the tweak's closing brace instead of running out the token budget
+    stopping = JSONObjectStoppingCriteria(tokenizer, prompt_width, MAX_NEW_TOKENS)
+    generate_kwargs = {"stopping_criteria": StoppingCriteriaList([stopping])}
+    if CONSTRAINED_DECODING:
+        generate_kwargs["logits_processor"] = LogitsProcessorList([
+            TweakJSONLogitsProcessor(tweak_grammar_for(tokenizer), MAX_NEW_TOKENS)
+        ])
+    if shares_prefix and prefix_cached:
+        # The model only prefills the suffix tokens that follow the cached prefix
+        generate_kwargs["past_key_values"] = prompt_prefix_cache.past_key_values(len(prompts))
+
+    with torch.no_grad():
+        outputs = model.generate(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            max_new_tokens=MAX_NEW_TOKENS,
+            num_return_sequences=1,
+            temperature=0.3,  # Lower temperature for more consistent JSON
+            do_sample=True,
+            pad_token_id=tokenizer.eos_token_id,
+            eos_token_id=tokenizer.eos_token_id,
+            streamer=streamer,
+            **generate_kwargs
         )
-        tokenizer = GPT2Tokenizer.from_pretrained(MODEL_NAME)
-        tokenizer.pad_token = tokenizer.eos_token
-        logger.info("✅ Base DistilGPT-2 model loaded successfully!")
 
-        return model, tokenizer
+    continuations = outputs[:, prompt_width:]
+    generation_metrics.record_tokens(
+        (continuations != tokenizer.eos_token_id).sum(dim=1).tolist(),
+        stopping.tokens_saved
+    )
 
-    except Exception as e:
-        logger.error(f"❌ Error loading model: {e}")
-        return None, None
+    # Only decode what the model generated; the prompt itself contains a JSON template
+    return [
+        tokenizer.decode(row, skip_special_tokens=True)
+        for row in continuations
+    ]
+
+def parse_tweak_response(response_text: str, user_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Extract, validate and safety-check the tweak JSON from generated text"""
+    # Clean the response text
+    response_text = response_text.strip()
+
+    # Find the first complete JSON object
+    json_start = response_text.find("{")
+    if json_start == -1:
+        raise ValueError("No JSON object found in response")
+
+    # Count braces to find complete JSON
+    brace_count = 0
+    json_end = json_start
+    for i, char in enumerate(response_text[json_start:], json_start):
+        if char == '{':
+            brace_count += 1
+        elif char == '}':
+            brace_count -= 1
+            if brace_count == 0:
+                json_end = i + 1
+                break
+
+    if brace_count != 0:
+        # Fallback: find the last closing brace
+        json_end = response_text.rfind("}") + 1
+
+    if json_end <= json_start:
+        raise ValueError("Invalid JSON structure")
+
+    json_str = response_text[json_start:json_end].strip()
+
+    # Clean up common issues
+    json_str = json_str.replace('```json', '').replace('```', '')
+    json_str = json_str.strip()
+
+    tweak = json.loads(json_str)
+
+    # Validate required fields
+    if not isinstance(tweak, dict) or not all(key in tweak for key in ["action", "reason", "modifications"]):
+        raise ValueError("Missing required fields")
+
+    # Apply safety rules
+    return apply_safety_rules(tweak, user_data)
+
+def tweak_from_response(response_text: str, user_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Parse generated text into a tweak, or None when the model output is unusable"""
+    try:
+        tweak = parse_tweak_response(response_text, user_data)
+    except (json.JSONDecodeError, ValueError) as e:
+        generation_metrics.record_parse(False)
+        logger.warning(f"Invalid AI response, using fallback: {e}")
+        return None
+    generation_metrics.record_parse(True)
+    return tweak
 
 def generate_ai_tweak(event_type: str, user_data: Dict[str, Any], context: Dict[str, Any]) -> Dict[str, Any]:
     """Generate AI-powered workout tweak based on event and user data"""
@@ -114,104 +1060,370 @@ def generate_ai_tweak(event_type: str, user_data: Dict[str, Any], context: Dict[
         if model is None or tokenizer is None:
             return generate_fallback_tweak(event_type, context)
 
-        # Extract relevant user data
-        current_program = user_data.get("current_program", {})
-        workout_history = user_data.get("workout_history", [])
-        fitness_level = user_data.get("fitness_level", "intermediate")
-        goals = user_data.get("goals", [])
-
-        # Create context-aware prompt with better JSON formatting instructions
-        prompt_parts = [
-            "You are a fitness AI assistant. Generate a JSON workout tweak response.",
-            "",
-            f"Event: {event_type}",
-            f"User Fitness Level: {fitness_level}",
-            f"Goals: {', '.join(goals) if goals else 'general fitness'}",
-            f"Current Program: {json.dumps(current_program)}",
-            f"Context: {json.dumps(context)}",
-            "",
-            "Rules:",
-            "- No rep drops below 80% of planned reps",
-            "- Maintain progressive overload principles",
-            "- Consider user's fitness level and goals",
-            "",
-            "Return ONLY valid JSON with these exact fields:",
-            '{"action": "action_name", "reason": "explanation", "modifications": {"field": value}}',
-            "",
-            "JSON:"
-        ]
+        prompt = build_tweak_prompt(event_type, user_data, context)
+        response_text = generate_tweak_texts([prompt])[0]
+        return tweak_from_response(response_text, user_data) or generate_fallback_tweak(event_type, context)
+
+    except Exception as e:
+        logger.error(f"Error generating AI tweak: {e}")
+        return generate_fallback_tweak(event_type, context)
 
-        prompt = "\n".join(prompt_parts)
+def latency_summary(samples_ms) -> Dict[str, Any]:
+    """p50/p95/max of a window of latency samples in milliseconds"""
+    latencies = sorted(samples_ms)
 
-        # Tokenize and generate
-        inputs = tokenizer.encode(prompt, return_tensors="pt", max_length=512, truncation=True)
+    def percentile(q: float) -> Optional[float]:
+        if not latencies:
+            return None
+        return round(latencies[int(q * (len(latencies) - 1))], 2)
 
-        with torch.no_grad():
-            outputs = model.generate(
-                inputs,
-                max_length=min(len(inputs[0]) + 100, MAX_LENGTH),
-                num_return_sequences=1,
-                temperature=0.3,  # Lower temperature for more consistent JSON
-                do_sample=True,
-                pad_token_id=tokenizer.eos_token_id,
-                eos_token_id=tokenizer.eos_token_id
-            )
+    return {
+        "p50": percentile(0.5),
+        "p95": percentile(0.95),
+        "max": percentile(1.0),
+        "samples": len(latencies)
+    }
+
+class TweakBatcher:
+    """Micro-batching scheduler for /event generations.
+
+    Prompts are collected for up to ``max_wait_ms`` (or until ``max_batch_size``
+    are waiting) and then run as a single batched generate on the inference
+    pool. A new batch is only formed when a worker is free, so requests that
+    arrive while the model is busy join the next, larger batch.
+    """
+
+    def __init__(self, executor: InferenceExecutor,
+                 max_batch_size: int = BATCH_MAX_SIZE,
+                 max_wait_ms: float = BATCH_WAIT_MS,
+                 max_pending: Optional[int] = None):
+        self.executor = executor
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.max_pending = max_pending or (INFERENCE_WORKERS + INFERENCE_QUEUE_DEPTH) * self.max_batch_size
+        self.concurrency = getattr(executor, "workers", 1)
+
+        self._loop = None
+        self._pending: Deque[Tuple[str, asyncio.Future, float]] = deque()
+        self._in_flight = 0
+
+        # Metrics
+        self.batches = 0
+        self.requests = 0
+        self.rejected = 0
+        self._latencies_ms: Deque[float] = deque(maxlen=1024)
 
-        response_text = tokenizer.decode(outputs[0], skip_special_tokens=True)
+    def _ensure_scheduler(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        # Asyncio primitives are bound to the loop they were created on
+        self._loop = loop
+        self._pending = deque()
+        self._in_flight = 0
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._scheduler = loop.create_task(self._schedule())
 
-        # Extract JSON from response with better error handling
+    async def submit(self, prompt: str) -> str:
+        """Queue a prompt and wait for its generated continuation"""
+        self._ensure_scheduler()
+        if len(self._pending) + self._in_flight >= self.max_pending:
+            self.rejected += 1
+            raise InferenceQueueFull(f"{len(self._pending)} prompts waiting for a batch")
+
+        future = self._loop.create_future()
+        self._pending.append((prompt, future, time.perf_counter()))
+        self._wakeup.set()
+        return await future
+
+    async def _schedule(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            await self._slots.acquire()
+
+            # Hold the batch open until it fills up or the oldest prompt has waited long enough
+            deadline = self._pending[0][2] + self.max_wait if self._pending else 0.0
+            while self._pending and len(self._pending) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+
+            batch = []
+            while self._pending and len(batch) < self.max_batch_size:
+                batch.append(self._pending.popleft())
+            if self._pending:
+                self._wakeup.set()
+            else:
+                self._wakeup.clear()
+
+            if not batch:
+                self._slots.release()
+                continue
+
+            self._in_flight += len(batch)
+            self._loop.create_task(self._run_batch(batch))
+
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future, float]]) -> None:
         try:
-            # Clean the response text
-            response_text = response_text.strip()
-            
-            # Find the first complete JSON object
-            json_start = response_text.find("{")
-            if json_start == -1:
-                raise ValueError("No JSON object found in response")
-            
-            # Count braces to find complete JSON
-            brace_count = 0
-            json_end = json_start
-            for i, char in enumerate(response_text[json_start:], json_start):
-                if char == '{':
-                    brace_count += 1
-                elif char == '}':
-                    brace_count -= 1
-                    if brace_count == 0:
-                        json_end = i + 1
-                        break
-            
-            if brace_count != 0:
-                # Fallback: find the last closing brace
-                json_end = response_text.rfind("}") + 1
-            
-            if json_end <= json_start:
-                raise ValueError("Invalid JSON structure")
-            
-            json_str = response_text[json_start:json_end].strip()
-            
-            # Clean up common issues
-            json_str = json_str.replace('```json', '').replace('```', '')
-            json_str = json_str.strip()
-            
-            tweak = json.loads(json_str)
+            texts = await self.executor.run(generate_tweak_texts, [prompt for prompt, _, _ in batch])
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            now = time.perf_counter()
+            for (_, future, enqueued), text in zip(batch, texts):
+                self._latencies_ms.append((now - enqueued) * 1000)
+                if not future.done():
+                    future.set_result(text)
+            self.batches += 1
+            self.requests += len(batch)
+        finally:
+            self._in_flight -= len(batch)
+            self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        avg_batch_size = self.requests / self.batches if self.batches else 0.0
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "pending": len(self._pending),
+            "in_flight": self._in_flight,
+            "batches": self.batches,
+            "requests": self.requests,
+            "rejected": self.rejected,
+            "avg_batch_size": round(avg_batch_size, 2),
+            "avg_batch_fill": round(avg_batch_size / self.max_batch_size, 3),
+            "latency_ms": latency_summary(self._latencies_ms)
+        }
 
-            # Validate required fields
-            if not all(key in tweak for key in ["action", "reason", "modifications"]):
-                raise ValueError("Missing required fields")
+class TweakCache:
+    """LRU + TTL cache of parsed, safety-checked tweaks keyed by prompt fingerprint.
 
-            # Apply safety rules
-            tweak = apply_safety_rules(tweak, user_data)
+    Bounded both by entry count and by the approximate serialized size of the
+    stored tweaks; the least recently used entries are evicted first.
+    """
 
-            return tweak
-        except (json.JSONDecodeError, ValueError) as e:
-            logger.warning(f"Invalid AI response, using fallback: {e}")
-            return generate_fallback_tweak(event_type, context)
+    def __init__(self, max_entries: int = TWEAK_CACHE_MAX_ENTRIES,
+                 max_bytes: int = TWEAK_CACHE_MAX_BYTES,
+                 ttl_seconds: float = TWEAK_CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, int, Dict[str, Any]]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
 
-    except Exception as e:
-        logger.error(f"Error generating AI tweak: {e}")
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def fingerprint(event_type: str, user_data: Dict[str, Any], context: Dict[str, Any]) -> str:
+        """Hash of the canonicalized prompt inputs (sorted JSON)"""
+        canonical = json.dumps({
+            "event": event_type,
+            "fitness_level": user_data.get("fitness_level", "intermediate"),
+            "goals": user_data.get("goals", []),
+            "current_program": user_data.get("current_program", {}),
+            "context": context
+        }, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            stored_at, size, tweak = entry
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+        # Callers may annotate the tweak, so never hand out the cached object
+        return copy.deepcopy(tweak)
+
+    def put(self, key: str, tweak: Dict[str, Any]) -> None:
+        size = len(json.dumps(tweak, default=str))
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic(), size, copy.deepcopy(tweak))
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+async def generate_ai_tweak_batched(event_type: str, user_data: Dict[str, Any],
+                                    context: Dict[str, Any], use_cache: bool = True) -> Dict[str, Any]:
+    """Async generate_ai_tweak that shares model.generate calls through the micro-batcher.
+
+    Identical prompts are answered from the tweak cache unless ``use_cache`` is
+    False; a fresh generation still refreshes the cached entry.
+    """
+    cache_key = TweakCache.fingerprint(event_type, user_data, context)
+    if use_cache:
+        cached = tweak_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    prompt = build_tweak_prompt(event_type, user_data, context)
+    response_text = await tweak_batcher.submit(prompt)
+    tweak = tweak_from_response(response_text, user_data)
+    if tweak is None:
         return generate_fallback_tweak(event_type, context)
 
+    tweak_cache.put(cache_key, tweak)
+    return tweak
+
+class TweakTextStreamer:
+    """Generation streamer that hands decoded text to the event loop as tokens arrive.
+
+    Implements the ``put``/``end`` protocol model.generate expects from a streamer.
+    It runs on the inference worker thread and forwards each new piece of text to
+    an asyncio queue; ``None`` marks the end of generation.
+    """
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self._loop = asyncio.get_running_loop()
+        self._prompt_seen = False
+        self._token_ids: List[int] = []
+        self._emitted = 0
+        self._ended = False
+
+    def _push(self, item: Optional[str]) -> None:
+        self._loop.call_soon_threadsafe(self.queue.put_nowait, item)
+
+    def put(self, value: torch.Tensor) -> None:
+        if not self._prompt_seen:
+            self._prompt_seen = True  # generate passes the prompt ids first
+            return
+        self._token_ids.extend(value.reshape(-1).tolist())
+        text = self.tokenizer.decode(self._token_ids, skip_special_tokens=True)
+        if text.endswith("\ufffd"):
+            return  # Wait for the rest of a multi-byte character
+        if len(text) > self._emitted:
+            self._push(text[self._emitted:])
+            self._emitted = len(text)
+
+    def end(self) -> None:
+        if not self._ended:
+            self._ended = True
+            self._push(None)
+
+class PartialTweakParser:
+    """Pulls completed, validated fields out of a tweak object while it is still being generated"""
+
+    FIELDS = {
+        "action": re.compile(r'"action"\s*:\s*"([A-Za-z0-9_]+)"'),
+        "reason": re.compile(r'"reason"\s*:\s*"([^"\\]*)"')
+    }
+    # A number is only complete once the separator after it has been generated
+    MODIFICATION = re.compile(r'"([A-Za-z0-9_]+)"\s*:\s*(-?(?:0|[1-9]\d*)(?:\.\d+)?)\s*[,}]')
+
+    def __init__(self, user_data: Dict[str, Any]):
+        self.user_data = user_data
+        self.text = ""
+        self._sent_fields: set = set()
+        self._sent_modifications: set = set()
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Fields completed by ``chunk``, each as a one-key partial tweak"""
+        self.text += chunk
+        fields = []
+        for field, pattern in self.FIELDS.items():
+            if field not in self._sent_fields:
+                match = pattern.search(self.text)
+                if match:
+                    self._sent_fields.add(field)
+                    fields.append({field: match.group(1)})
+
+        start = self.text.find('"modifications"')
+        if start != -1:
+            body = self.text.find("{", start)
+            for match in self.MODIFICATION.finditer(self.text, body + 1 if body != -1 else len(self.text)):
+                key = match.group(1)
+                if key in self._sent_modifications:
+                    continue
+                self._sent_modifications.add(key)
+                # Same safety rules as the final tweak, so clients never see an unsafe value
+                checked = apply_safety_rules(
+                    {"action": "", "reason": "", "modifications": {key: json.loads(match.group(2))}},
+                    self.user_data
+                )
+                fields.append({"modifications": {key: checked["modifications"][key]}})
+        return fields
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """One Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+class StreamMetrics:
+    """Time-to-first-token and total latency of streamed responses"""
+
+    def __init__(self, window: int = 1024):
+        self.streams = 0
+        self._ttft_ms: Deque[float] = deque(maxlen=window)
+        self._total_ms: Deque[float] = deque(maxlen=window)
+
+    def record(self, ttft_ms: Optional[float], total_ms: float) -> None:
+        self.streams += 1
+        if ttft_ms is not None:
+            self._ttft_ms.append(ttft_ms)
+        self._total_ms.append(total_ms)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "streams": self.streams,
+            "ttft_ms": latency_summary(self._ttft_ms),
+            "total_ms": latency_summary(self._total_ms)
+        }
+
+stream_metrics = StreamMetrics()
+
 def apply_safety_rules(tweak: Dict[str, Any], user_data: Dict[str, Any]) -> Dict[str, Any]:
     """Apply safety rules to ensure tweaks don't violate constraints"""
     modifications = tweak.get("modifications", {})
@@ -261,30 +1473,106 @@ def generate_fallback_tweak(event_type: str, context: Dict[str, Any]) -> Dict[st
 # Initialize FastAPI app
 app = FastAPI(title="Adaptive fIt AI Service", version="1.0.0")
 
-# Load model and tokenizer
-try:
-    model, tokenizer = load_model()
-except Exception as e:
-    logger.error(f"Failed to initialize model: {e}")
-    model, tokenizer = None, None
+# Dedicated pool for model calls so /health and nutrition endpoints never wait on generate
+inference_executor = InferenceExecutor()
+tweak_batcher = TweakBatcher(inference_executor)
+tweak_cache = TweakCache()
+
+@app.on_event("shutdown")
+async def shutdown_inference_executor():
+    inference_executor.shutdown()
+
+@app.on_event("startup")
+async def start_nutrition_batch_pool():
+    # One spawn-based worker pool for /nutrition/recommendations/batch, reused by every call
+    try:
+        from enhanced_nutrition_ai import start_batch_pool
+    except ImportError:
+        return
+    start_batch_pool()
+
+@app.on_event("shutdown")
+async def shutdown_nutrition_batch_pool():
+    try:
+        from enhanced_nutrition_ai import shutdown_batch_pool
+    except ImportError:
+        return
+    shutdown_batch_pool()
+
+# Model and tokenizer load in the background; /event serves fallbacks until they are ready
+model, tokenizer = None, None
+precision_report: Dict[str, Any] = {"requested": MODEL_PRECISION, "active": None}
+model_state: Dict[str, Any] = {
+    "status": "loading",  # loading -> ready | failed
+    "source": None,
+    "error": None,
+    "load_seconds": None
+}
+
+def install_model(new_model, new_tokenizer) -> None:
+    """Swap in a model for serving and drop anything derived from the previous one"""
+    global model, tokenizer
+    model, tokenizer = new_model, new_tokenizer
+    tweak_cache.clear()
+    prompt_prefix_cache.clear()
+
+def initialize_model() -> None:
+    """Load the model (blocking) and publish it; runs on a background thread"""
+    model_state.update(status="loading", error=None)
+    start = time.perf_counter()
+    try:
+        loaded_model, loaded_tokenizer = load_model()
+    except Exception as e:
+        logger.error(f"Failed to initialize model: {e}")
+        loaded_model, loaded_tokenizer = None, None
+        model_state["error"] = str(e)
+
+    model_state["load_seconds"] = round(time.perf_counter() - start, 2)
+    if loaded_model is None or loaded_tokenizer is None:
+        model_state["status"] = "failed"
+        model_state["error"] = model_state["error"] or "no model source could be loaded"
+        logger.warning("Serving fallback tweaks only - AI model failed to load")
+        return
+
+    install_model(loaded_model, loaded_tokenizer)
+    try:
+        # Prefill the shared prompt header now rather than on the first /event request
+        prompt_prefix_cache.prepare(loaded_model, loaded_tokenizer)
+    except Exception as e:
+        logger.warning(f"Could not precompute the prompt prefix cache: {e}")
+    if CONSTRAINED_DECODING:
+        try:
+            # Build every grammar token mask now rather than on the first /event request
+            tweak_grammar_for(loaded_tokenizer).compile()
+        except Exception as e:
+            logger.warning(f"Could not precompile the tweak grammar: {e}")
+    model_state["status"] = "ready"
+    logger.info(f"✅ Model ready after {model_state['load_seconds']}s")
+
+@app.on_event("startup")
+async def start_model_loader():
+    # Accept connections immediately; health checks must not wait on Hub downloads
+    threading.Thread(target=initialize_model, name="model-loader", daemon=True).start()
 
 @app.post("/event")
 async def handle_event(request: EventRequest):
     """Handle app events and return AI-powered workout tweaks"""
     
     try:
-        # If model is not available, use fallback logic
-        if model is None or tokenizer is None:
-            logger.info("Using fallback logic - AI model not available")
+        # If model is not available (still loading or failed), use fallback logic (cheap, stays on the event loop)
+        ai_powered = model is not None and tokenizer is not None
+        if not ai_powered:
+            logger.info(f"Using fallback logic - AI model {model_state['status']}")
             tweak = generate_fallback_tweak(
                 event_type=request.event,
                 context=request.context
             )
         else:
-            tweak = generate_ai_tweak(
+            tweak = await generate_ai_tweak_batched(
                 event_type=request.event,
                 user_data=request.user_data,
-                context=request.context
+                context=request.context,
+                use_cache=not request.fresh
             )
 
         return {
@@ -292,9 +1580,17 @@ async def handle_event(request: EventRequest):
             "tweak": tweak,
             "user_id": request.user_id,
             "event": request.event,
-            "ai_powered": model is not None
+            "ai_powered": ai_powered
         }
 
+    except InferenceQueueFull as e:
+        logger.warning(f"Rejecting event for user {request.user_id}: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail="AI inference queue is full, please retry shortly",
+            headers={"Retry-After": str(INFERENCE_RETRY_AFTER)}
+        )
+
     except Exception as e:
         logger.error(f"Error processing event: {e}")
         # Return fallback even on error
@@ -308,6 +1604,96 @@ async def handle_event(request: EventRequest):
             "note": "Used fallback due to error"
         }
 
+async def stream_tweak_events(request: EventRequest, streamer: TweakTextStreamer,
+                             generation: asyncio.Future, cache_key: str, started: float):
+    """SSE frames for /event/stream: partial fields while decoding, then the final tweak and timings"""
+    parser = PartialTweakParser(request.user_data)
+    ttft_ms = None
+    while True:
+        chunk = await streamer.queue.get()
+        if chunk is None:
+            break
+        if ttft_ms is None:
+            ttft_ms = round((time.perf_counter() - started) * 1000, 2)
+        for field in parser.feed(chunk):
+            yield sse_event("field", field)
+
+    tweak = None
+    try:
+        tweak = tweak_from_response((await generation)[0], request.user_data)
+    except Exception as e:
+        logger.error(f"Error streaming event: {e}")
+    if tweak is None:
+        tweak = generate_fallback_tweak(request.event, request.context)
+    else:
+        tweak_cache.put(cache_key, tweak)
+
+    yield sse_event("tweak", {
+        "success": True,
+        "tweak": tweak,
+        "user_id": request.user_id,
+        "event": request.event,
+        "ai_powered": True
+    })
+    total_ms = round((time.perf_counter() - started) * 1000, 2)
+    stream_metrics.record(ttft_ms, total_ms)
+    yield sse_event("done", {"ttft_ms": ttft_ms, "total_ms": total_ms})
+
+@app.post("/event/stream")
+async def handle_event_stream(request: EventRequest):
+    """Stream an AI workout tweak as Server-Sent Events.
+
+    Emits ``field`` events with each validated field (action, reason, one
+    modification at a time) as soon as it has been decoded, then ``tweak`` with
+    the complete safety-checked tweak (same body as /event) and ``done`` with the
+    time to first token and total latency in milliseconds.
+    """
+    started = time.perf_counter()
+    sse_headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+    def immediate(tweak: Dict[str, Any], ai_powered: bool) -> StreamingResponse:
+        frames = [
+            sse_event("tweak", {
+                "success": True,
+                "tweak": tweak,
+                "user_id": request.user_id,
+                "event": request.event,
+                "ai_powered": ai_powered
+            }),
+            sse_event("done", {"ttft_ms": None, "total_ms": round((time.perf_counter() - started) * 1000, 2)})
+        ]
+        return StreamingResponse(iter(frames), media_type="text/event-stream", headers=sse_headers)
+
+    if model is None or tokenizer is None:
+        logger.info(f"Using fallback logic - AI model {model_state['status']}")
+        return immediate(generate_fallback_tweak(request.event, request.context), False)
+
+    cache_key = TweakCache.fingerprint(request.event, request.user_data, request.context)
+    if not request.fresh:
+        cached = tweak_cache.get(cache_key)
+        if cached is not None:
+            return immediate(cached, True)
+
+    streamer = TweakTextStreamer(tokenizer)
+    prompt = build_tweak_prompt(request.event, request.user_data, request.context)
+    try:
+        generation = inference_executor.submit(generate_tweak_texts, [prompt], streamer)
+    except InferenceQueueFull as e:
+        logger.warning(f"Rejecting event stream for user {request.user_id}: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail="AI inference queue is full, please retry shortly",
+            headers={"Retry-After": str(INFERENCE_RETRY_AFTER)}
+        )
+    # Also unblocks the stream if generate fails before calling streamer.end()
+    generation.add_done_callback(lambda _: streamer.end())
+
+    return StreamingResponse(
+        stream_tweak_events(request, streamer, generation, cache_key, started),
+        media_type="text/event-stream",
+        headers=sse_headers
+    )
+
 # Enhanced Nutrition AI Endpoints
 
 @app.post("/nutrition/recommendations")
@@ -316,7 +1702,7 @@ async def get_nutrition_recommendations_endpoint(request: NutritionRecommendatio
     try:
         # Import nutrition AI functions (dynamic import to handle potential issues)
         try:
-            from app.enhanced_nutrition_ai import get_nutrition_recommendations
+            from enhanced_nutrition_ai import get_nutrition_recommendations
             
             result = get_nutrition_recommendations(
                 user_id=request.user_id,
@@ -352,12 +1738,29 @@ async def get_nutrition_recommendations_endpoint(request: NutritionRecommendatio
         logger.error(f"Error in nutrition recommendations endpoint: {e}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@app.post("/nutrition/recommendations/batch")
+async def get_nutrition_recommendations_batch_endpoint(request: NutritionBatchRequest):
+    """Nutrition recommendations for many users, streamed as NDJSON (one line per user, in request order)
+    
+    Users are processed in parallel worker processes; each line carries ``index`` and
+    ``user_id``, and an invalid or failing item only gets ``success: false`` on its own line.
+    """
+    try:
+        from enhanced_nutrition_ai import get_nutrition_recommendations_batch
+    except ImportError as ie:
+        logger.warning(f"Nutrition AI module not available: {ie}")
+        raise HTTPException(status_code=503, detail="Nutrition AI is not available")
+
+    lines = (json.dumps(result, default=str) + "\n" for result in get_nutrition_recommendations_batch(request.requests))
+    # A sync iterator is consumed in Starlette's threadpool, so the event loop stays free
+    return StreamingResponse(lines, media_type="application/x-ndjson")
+
 @app.post("/nutrition/feedback")
 async def process_nutrition_feedback_endpoint(request: NutritionFeedbackRequest):
     """Process user feedback on nutrition recommendations for learning"""
     try:
         try:
-            from app.enhanced_nutrition_ai import process_nutrition_feedback
+            from enhanced_nutrition_ai import process_nutrition_feedback
             
             result = process_nutrition_feedback(
                 user_id=request.user_id,
@@ -385,7 +1788,7 @@ async def get_nutrition_insights_endpoint(user_id: str, days: int = 7):
     """Get nutrition insights and analytics for user"""
     try:
         try:
-            from app.enhanced_nutrition_ai import get_nutrition_insights
+            from enhanced_nutrition_ai import get_nutrition_insights
             
             result = get_nutrition_insights(user_id=user_id, days=days)
             return result
@@ -419,7 +1822,7 @@ async def get_hydration_recommendations_endpoint(request: HydrationRequest):
     """Generate personalized hydration recommendations based on recovery data"""
     try:
         try:
-            from app.enhanced_nutrition_ai import get_hydration_recommendations
+            from enhanced_nutrition_ai import get_hydration_recommendations
             
             result = get_hydration_recommendations(
                 user_id=request.user_id,
@@ -523,10 +1926,51 @@ async def health_check():
     """Health check endpoint"""
     return {
         "status": "healthy",  # Always healthy if the service is running
+        "model_status": model_state["status"],
         "model_available": model is not None,
-        "model_repo": MODEL_REPO if model is not None else None,
+        "model_repo": model_state["source"] if model is not None else None,
+        "model_error": model_state["error"],
+        "model_load_seconds": model_state["load_seconds"],
         "device": DEVICE,
-        "fallback_enabled": True
+        "precision": precision_report,
+        "model_cache": model_artifact_cache.stats(),
+        "fallback_enabled": True,
+        "inference": inference_executor.stats()
+    }
+
+@app.get("/health/live")
+async def liveness_check():
+    """Liveness probe: the process is up and serving, even while the model warms up"""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness probe: 503 while the model is still loading.
+
+    A failed load still reports ready (degraded) because /event keeps serving
+    rule-based fallbacks, so restarting the instance would not help.
+    """
+    status = model_state["status"]
+    body = {
+        "status": status,
+        "ready": status != "loading",
+        "degraded": status == "failed",
+        "model_repo": model_state["source"]
+    }
+    if status == "loading":
+        raise HTTPException(status_code=503, detail=body, headers={"Retry-After": str(INFERENCE_RETRY_AFTER)})
+    return body
+
+@app.get("/metrics")
+async def inference_metrics():
+    """Inference pool, micro-batching and tweak cache metrics"""
+    return {
+        "inference": inference_executor.stats(),
+        "batching": tweak_batcher.stats(),
+        "cache": tweak_cache.stats(),
+        "generation": generation_metrics.stats(),
+        "prefix_cache": prompt_prefix_cache.stats(),
+        "streaming": stream_metrics.stats()
     }
 
 @app.get("/")
@@ -537,8 +1981,13 @@ async def root():
         "version": "2.0.0",
         "endpoints": [
             "/event", 
+            "/event/stream",
             "/health",
+            "/health/live",
+            "/health/ready",
+            "/metrics",
             "/nutrition/recommendations",
+            "/nutrition/recommendations/batch",
             "/nutrition/feedback", 
             "/nutrition/insights/{user_id}",
             "/nutrition/hydration",
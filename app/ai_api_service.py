@@ -2,11 +2,15 @@
 FastAPI Service for Git-Fit AI Integration
 
 This service provides REST API endpoints for:
-1. AI-enhanced coaching response generation
+1. AI-enhanced coaching response generation (optionally streamed as Server-Sent Events)
 2. Workout narration composition
 3. Sentiment analysis for user feedback
 4. Pronunciation guide generation
 5. Model health and status monitoring
+6. Personalized workout recommendations for a whole session in one call
+7. Population-level analytics over learned user preference profiles (admin)
+8. Preference and AI-performance insights for many users per request
+9. Feedback on issued recommendations (joined back by tweak_id) and per-type outcome counters
 
 Integration Points:
 - Called by TypeScript services (aiCoaching.ts, narrationComposer.ts)
@@ -16,16 +20,20 @@ Integration Points:
 
 from fastapi import FastAPI, HTTPException, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ConfigDict
 from typing import Dict, List, Optional, Any
 import json
 import os
+from dataclasses import asdict
+import time
 from datetime import datetime
 import uvicorn
 
 # Import our AI services
 from ai_coaching_enhancer import AICoachingEnhancer, CoachingContext
 from narration_composer import NarrationComposer, WorkoutNarration
+from enhanced_ai_engine import WorkoutContext, initialize_enhanced_engine, shutdown_enhanced_engine
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -46,6 +54,8 @@ app.add_middleware(
 # Initialize AI services
 ai_enhancer = AICoachingEnhancer()
 narration_composer = NarrationComposer(ai_enhancer)
+# Recommendations share the coaching model; with no model loaded they fall back to the rules
+enhanced_engine = initialize_enhanced_engine(ai_enhancer.model, ai_enhancer.tokenizer)
 
 # Pydantic models for API requests/responses
 class CoachingRequest(BaseModel):
@@ -70,6 +80,35 @@ class SentimentRequest(BaseModel):
 class PronunciationRequest(BaseModel):
     exercise_name: str
 
+class SessionExercise(BaseModel):
+    model_config = ConfigDict(extra="allow")  # any other exercise_data fields pass through
+
+    exercise_name: Optional[str] = None
+    planned_sets: int = 1  # one recommendation per planned set
+
+class SessionRecommendationsRequest(BaseModel):
+    user_id: str
+    context: Dict[str, Any]  # WorkoutContext fields; time_of_day and day_of_week are required
+    exercises: List[SessionExercise]
+    event_type: str = "workout_tweak"
+
+class PopulationStatsRequest(BaseModel):
+    fields: Optional[List[str]] = None  # numeric UserPreferenceProfile fields
+    group_by: Optional[str] = None  # 'interaction_tier' or 'label'
+    labels: Optional[Dict[str, str]] = None  # user_id -> group, e.g. experience level
+    histogram_bins: int = 0
+
+class RecommendationFeedbackRequest(BaseModel):
+    user_id: str
+    tweak_id: str  # from the recommendation being answered
+    feedback: Dict[str, Any]  # action ('accepted' / 'rejected' / 'modified'), rating, modification_reason, ...
+
+class InsightsRequest(BaseModel):
+    user_ids: List[str]
+
+# Upper bound on users per insights request
+MAX_INSIGHTS_USERS = int(os.getenv("MAX_INSIGHTS_USERS", 500))
+
 class APIResponse(BaseModel):
     success: bool
     data: Optional[Any] = None
@@ -152,6 +191,63 @@ async def generate_coaching_response(request: CoachingRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate coaching response: {str(e)}")
 
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format one Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/api/coaching/stream")
+async def stream_coaching_response(request: CoachingRequest):
+    """
+    Stream an AI-enhanced coaching response as Server-Sent Events.
+    Sends `token` events with text as it is generated, so text-to-speech can start
+    speaking early, then a `done` event with the full response, time to first
+    token and total latency (ms).
+    """
+    started = time.perf_counter()
+    context = CoachingContext(
+        coach_persona=request.coach_persona,
+        workout_phase=request.workout_phase,
+        exercise_name=request.exercise_name,
+        set_number=request.set_number,
+        rep_count=request.rep_count,
+        has_pr=request.has_pr,
+        heart_rate=request.heart_rate,
+        rest_time=request.rest_time,
+        user_sentiment=request.user_sentiment
+    )
+
+    def events():
+        # Runs in Starlette's threadpool, so blocking on the model does not stall the event loop
+        pieces = []
+        ttft_ms = None
+        try:
+            for piece in ai_enhancer.stream_enhanced_response(context):
+                if ttft_ms is None:
+                    ttft_ms = round((time.perf_counter() - started) * 1000, 2)
+                pieces.append(piece)
+                yield _sse_event("token", {"text": piece})
+        except Exception as e:
+            yield _sse_event("error", {"error": f"Failed to generate coaching response: {str(e)}"})
+            return
+
+        yield _sse_event("done", {
+            "response": "".join(pieces),
+            "context": {
+                "persona": request.coach_persona,
+                "phase": request.workout_phase,
+                "exercise": request.exercise_name
+            },
+            "ttft_ms": ttft_ms,
+            "total_ms": round((time.perf_counter() - started) * 1000, 2),
+            "timestamp": datetime.now().isoformat()
+        })
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/api/narration/compose")
 async def compose_narration(request: NarrationRequest, background_tasks: BackgroundTasks):
     """Compose a complete workout narration"""
@@ -277,6 +373,99 @@ async def export_enhanced_scripts(background_tasks: BackgroundTasks):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to start script export: {str(e)}")
 
+@app.post("/api/recommendations/session")
+def session_recommendations(request: SessionRecommendationsRequest):
+    """Recommendations for every exercise x set of a workout in one round trip (batched model calls)
+    
+    A plain ``def`` so FastAPI runs the blocking model.generate calls in its threadpool.
+    """
+    try:
+        context = WorkoutContext(**request.context)
+    except TypeError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid workout context: {str(e)}")
+
+    items = []
+    for exercise in request.exercises:
+        exercise_data = exercise.model_dump(exclude_unset=True)
+        for set_number in range(1, exercise.planned_sets + 1):
+            items.append((request.user_id, {**exercise_data, "current_set": set_number}, context, request.event_type))
+
+    try:
+        recommendations = enhanced_engine.generate_personalized_recommendations_batch(items)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to generate session recommendations: {str(e)}")
+
+    return APIResponse(
+        success=True,
+        data={
+            "user_id": request.user_id,
+            "recommendations": [
+                {
+                    "exercise_name": exercise_data.get("exercise_name"),
+                    "set_number": exercise_data["current_set"],
+                    "recommendation": asdict(recommendation)
+                }
+                for (_, exercise_data, _, _), recommendation in zip(items, recommendations)
+            ]
+        },
+        timestamp=datetime.now().isoformat()
+    )
+
+@app.post("/api/admin/profiles/stats")
+def population_profile_stats(request: PopulationStatsRequest):
+    """Fleet-wide aggregates of learned preference profiles (vectorized over the columnar profile table)"""
+    try:
+        stats = enhanced_engine.get_population_stats(
+            fields=request.fields,
+            group_by=request.group_by,
+            labels=request.labels,
+            histogram_bins=request.histogram_bins
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return APIResponse(
+        success=True,
+        data=stats,
+        timestamp=datetime.now().isoformat()
+    )
+
+@app.post("/api/recommendations/feedback")
+def recommendation_feedback(request: RecommendationFeedbackRequest):
+    """Learn from the user's response to a recommendation"""
+    enhanced_engine.process_user_feedback(request.user_id, request.tweak_id, request.feedback)
+    return APIResponse(
+        success=True,
+        data={"user_id": request.user_id, "tweak_id": request.tweak_id},
+        timestamp=datetime.now().isoformat()
+    )
+
+@app.get("/api/admin/recommendations/types")
+def recommendation_type_stats():
+    """Issued/accepted/rejected counters and mean confidence per recommendation type"""
+    return APIResponse(
+        success=True,
+        data=enhanced_engine.get_recommendation_type_stats(),
+        timestamp=datetime.now().isoformat()
+    )
+
+@app.post("/api/insights")
+def user_insights(request: InsightsRequest):
+    """Insights for up to MAX_INSIGHTS_USERS users in one call (constant-time reads of running aggregates)"""
+    if len(request.user_ids) > MAX_INSIGHTS_USERS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_INSIGHTS_USERS} user_ids per request")
+
+    return APIResponse(
+        success=True,
+        data=enhanced_engine.get_users_insights(request.user_ids),
+        timestamp=datetime.now().isoformat()
+    )
+
+@app.on_event("shutdown")
+async def flush_profiles_on_shutdown():
+    """Persist pending profile updates before the process exits"""
+    shutdown_enhanced_engine()
+
 # Error handlers
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
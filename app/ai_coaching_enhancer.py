@@ -10,6 +10,7 @@ This service integrates with the existing TypeScript coaching system while addin
 """
 
 import json
+import sys
 import os
 import random
 import logging
@@ -18,13 +19,19 @@ from typing import Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass, asdict
 from datetime import datetime, timedelta
 import pickle
+import threading
+import time
 from collections import defaultdict, deque
-from transformers import pipeline, GPT2LMHeadModel, GPT2Tokenizer
+from transformers import pipeline, GPT2LMHeadModel, GPT2Tokenizer, TextIteratorStreamer, StoppingCriteriaList
 import torch
 
 logger = logging.getLogger(__name__)
 
-@dataclass
+def intern_reasons(reasons) -> List[str]:
+    """Rejection reasons as interned strings, so each distinct reason is stored once"""
+    return [sys.intern(str(reason)) for reason in reasons]
+
+@dataclass(slots=True)
 class UserPreferenceProfile:
     """Comprehensive user preference profile learned from interactions"""
     user_id: str
@@ -55,10 +62,10 @@ class UserPreferenceProfile:
     learning_rate: float = 0.1
     
     def __post_init__(self):
-        if self.common_rejection_reasons is None:
-            self.common_rejection_reasons = []
+        # Reasons come from a small vocabulary; interning shares one string per reason across users
+        self.common_rejection_reasons = intern_reasons(self.common_rejection_reasons or [])
 
-@dataclass
+@dataclass(slots=True)
 class WorkoutContext:
     """Context information for AI decision making"""
     time_of_day: str
@@ -71,7 +78,7 @@ class WorkoutContext:
     previous_performance: Optional[Dict[str, Any]] = None
     wearable_data: Optional[Dict[str, Any]] = None
     
-@dataclass
+@dataclass(slots=True)
 class AIRecommendation:
     """AI recommendation with detailed reasoning"""
     type: str  # 'weight_adjustment', 'rep_modification', 'rest_change', etc.
@@ -88,6 +95,28 @@ class AIRecommendation:
         if self.alternative_options is None:
             self.alternative_options = []
 
+@dataclass(slots=True)
+class CoachingContext:
+    """Workout moment a coaching line is generated for"""
+    coach_persona: str  # 'alice' or 'aiden'
+    workout_phase: str
+    exercise_name: str
+    set_number: int
+    rep_count: int
+    has_pr: bool = False
+    heart_rate: Optional[int] = None
+    rest_time: Optional[int] = None
+    user_sentiment: Optional[str] = None
+
+class _StopWhenSet:
+    """Stopping criterion that ends generation once the streaming consumer has what it needs"""
+
+    def __init__(self, event: threading.Event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full((input_ids.shape[0],), self.event.is_set(), dtype=torch.bool, device=input_ids.device)
+
 class AICoachingEnhancer:
     """Enhances the existing coaching system with AI capabilities"""
 
@@ -206,12 +235,8 @@ class AICoachingEnhancer:
         }
         return phase_mapping.get(phase, 'set_start')
 
-    def _enhance_with_ai(self, base_responses: List[str], context: CoachingContext) -> str:
-        """Use AI to create a variation of existing response patterns"""
-        if not base_responses:
-            return self._generate_fallback_response(context)
-
-        # Select a base response to enhance (avoid repetition)
+    def _select_base_response(self, base_responses: List[str], context: CoachingContext) -> str:
+        """Pick a script line to vary, avoiding recently used ones"""
         available_responses = [r for r in base_responses if r not in self.used_phrases[context.coach_persona][context.workout_phase]]
         if not available_responses:
             # Reset used phrases if we've used them all
@@ -220,10 +245,23 @@ class AICoachingEnhancer:
 
         base_response = random.choice(available_responses)
         self.used_phrases[context.coach_persona][context.workout_phase].add(base_response)
+        return base_response
 
-        # Create a more sophisticated prompt for the fine-tuned model
+    def _build_variation_prompt(self, base_response: str, context: CoachingContext) -> str:
+        """Prompt asking the fine-tuned model for a persona-styled variation of a script line"""
         persona_style = "encouraging and motivational" if context.coach_persona == 'alice' else "disciplined and precise"
-        prompt = f"Coach {context.coach_persona.title()} style: {persona_style}\nPhase: {context.workout_phase}\nExercise: {context.exercise_name}\nBase: {base_response}\nVariation:"
+        return f"Coach {context.coach_persona.title()} style: {persona_style}\nPhase: {context.workout_phase}\nExercise: {context.exercise_name}\nBase: {base_response}\nVariation:"
+
+    def _enhance_with_ai(self, base_responses: List[str], context: CoachingContext) -> str:
+        """Use AI to create a variation of existing response patterns"""
+        if not base_responses:
+            return self._generate_fallback_response(context)
+
+        # Select a base response to enhance (avoid repetition)
+        base_response = self._select_base_response(base_responses, context)
+
+        # Create a more sophisticated prompt for the fine-tuned model
+        prompt = self._build_variation_prompt(base_response, context)
 
         try:
             inputs = self.tokenizer(
@@ -272,6 +310,82 @@ class AICoachingEnhancer:
             print(f"AI enhancement failed: {e}")
             return base_response
 
+    def stream_enhanced_response(self, context: CoachingContext):
+        """
+        Streaming variant of generate_enhanced_response for text-to-speech clients.
+        Yields the coaching line in pieces as the model decodes it. Text is held back
+        until the variation is long enough to be used (same 10-character rule as
+        _enhance_with_ai); if it never gets there, the script line is yielded instead.
+        """
+        base_responses = self._get_base_responses(context)
+        if not base_responses:
+            yield self._generate_fallback_response(context)
+            return
+
+        base_response = self._select_base_response(base_responses, context)
+        prompt = self._build_variation_prompt(base_response, context)
+
+        try:
+            inputs = self.tokenizer(prompt, return_tensors="pt", truncation=True, max_length=128).to(self.device)
+            streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+            stop = threading.Event()
+
+            def generate(**kwargs):
+                try:
+                    with torch.no_grad():
+                        self.model.generate(**kwargs)
+                except Exception as e:
+                    print(f"AI enhancement failed: {e}")
+                finally:
+                    streamer.end()  # Never leave the consumer waiting
+
+            generation = threading.Thread(
+                target=generate,
+                kwargs=dict(
+                    input_ids=inputs["input_ids"],
+                    attention_mask=inputs["attention_mask"],
+                    max_new_tokens=30,
+                    no_repeat_ngram_size=3,
+                    temperature=0.8,
+                    top_p=0.9,
+                    do_sample=True,
+                    pad_token_id=self.tokenizer.eos_token_id,
+                    eos_token_id=self.tokenizer.eos_token_id,
+                    streamer=streamer,
+                    stopping_criteria=StoppingCriteriaList([_StopWhenSet(stop)])
+                ),
+                daemon=True
+            )
+            generation.start()
+        except Exception as e:
+            print(f"AI enhancement failed: {e}")
+            yield base_response
+            return
+
+        text = ""
+        emitted = 0
+        try:
+            for chunk in streamer:
+                text += chunk
+                if emitted == 0:
+                    text = text.lstrip()
+                # Only the first line is the variation; stop decoding once it ends
+                line_end = text.find('\n')
+                if line_end != -1:
+                    text = text[:line_end]
+                    stop.set()
+                if len(text.strip()) > 10 and len(text) > emitted:
+                    yield text[emitted:]
+                    emitted = len(text)
+                if stop.is_set():
+                    break
+        finally:
+            stop.set()
+            generation.join()
+
+        if emitted == 0:
+            yield base_response
+
     def _generate_fallback_response(self, context: CoachingContext) -> str:
         """Generate a basic fallback response when no scripts are available"""
         if context.coach_persona == 'alice':
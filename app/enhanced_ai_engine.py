@@ -4,18 +4,34 @@ Implements comprehensive user preference learning and real-time workout adjustme
 """
 
 import json
+import sys
 import logging
 import numpy as np
-import pickle
 import os
+import threading
+import uuid
 from typing import Dict, List, Any, Optional, Tuple
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, fields
 from datetime import datetime, timedelta
-from collections import defaultdict, deque
+from collections import OrderedDict, defaultdict, deque
+from itertools import islice
+
+try:
+    from .interaction_log import InteractionLog
+    from .json_stopping import JSONObjectStoppingCriteria
+    from .profile_store import LazyLRUMap, ProfileStore, WriteBehindWriter
+except ImportError:
+    from interaction_log import InteractionLog
+    from json_stopping import JSONObjectStoppingCriteria
+    from profile_store import LazyLRUMap, ProfileStore, WriteBehindWriter
 
 logger = logging.getLogger(__name__)
 
-@dataclass  
+def intern_reasons(reasons) -> List[str]:
+    """Rejection reasons as interned strings, so each distinct reason is stored once"""
+    return [sys.intern(str(reason)) for reason in reasons]
+
+@dataclass(slots=True)
 class UserPreferenceProfile:
     """User preference profile learned from interactions"""
     user_id: str
@@ -46,10 +62,10 @@ class UserPreferenceProfile:
     learning_rate: float = 0.1
     
     def __post_init__(self):
-        if self.common_rejection_reasons is None:
-            self.common_rejection_reasons = []
+        # Reasons come from a small vocabulary; interning shares one string per reason across users
+        self.common_rejection_reasons = intern_reasons(self.common_rejection_reasons or [])
 
-@dataclass
+@dataclass(slots=True)
 class WorkoutContext:
     """Context information for AI decision making"""
     time_of_day: str
@@ -62,7 +78,7 @@ class WorkoutContext:
     previous_performance: Optional[Dict[str, Any]] = None
     wearable_data: Optional[Dict[str, Any]] = None
     
-@dataclass  
+@dataclass(slots=True)
 class AIRecommendation:
     """AI recommendation with detailed reasoning"""
     type: str  # 'weight_adjustment', 'rep_modification', 'rest_change', etc.
@@ -74,24 +90,449 @@ class AIRecommendation:
     expected_outcome: str
     risk_assessment: str
     alternative_options: List[Dict[str, Any]] = None
+    tweak_id: str = ""  # Send back with feedback so it joins to this recommendation
     
     def __post_init__(self):
         if self.alternative_options is None:
             self.alternative_options = []
 
+# Numeric UserPreferenceProfile fields mirrored as columns of ProfileColumns
+PROFILE_COLUMN_FIELDS = tuple(f.name for f in fields(UserPreferenceProfile) if f.type in (float, int, 'float', 'int'))
+
+# Grouping of profiles by interaction count (same thresholds as the coaching meta-recommendations)
+INTERACTION_TIERS = ((10, 'new'), (100, 'learning'), (float('inf'), 'established'))
+
+class ProfileColumns:
+    """Structure-of-arrays copy of the numeric profile fields for population-level queries
+    
+    Each field is one NumPy column indexed by a per-user row, so fleet-wide aggregates
+    are single vectorized passes instead of loops over profile objects. Rows are
+    upserted from UserPreferenceProfile objects; per-user reads stay on the profiles.
+    Upserts come from concurrent requests, so writes and reads take ``lock``; hold it
+    across several reads that must see the same rows.
+    """
+    
+    def __init__(self, capacity: int = 1024):
+        self.lock = threading.RLock()
+        self.index: Dict[str, int] = {}
+        self.user_ids: List[str] = []
+        self.columns: Dict[str, np.ndarray] = {
+            name: np.zeros(max(1, capacity), dtype=np.float64) for name in PROFILE_COLUMN_FIELDS
+        }
+    
+    @classmethod
+    def from_profiles(cls, profiles) -> 'ProfileColumns':
+        profiles = list(profiles)
+        table = cls(capacity=len(profiles))
+        for profile in profiles:
+            table.upsert(profile)
+        return table
+    
+    def __len__(self) -> int:
+        with self.lock:
+            return len(self.user_ids)
+    
+    def __contains__(self, user_id: str) -> bool:
+        with self.lock:
+            return user_id in self.index
+    
+    def _grow(self):
+        """Double every column once the rows fill it (called under ``lock``)"""
+        capacity = len(next(iter(self.columns.values())))
+        if len(self.user_ids) < capacity:
+            return
+        for name, column in self.columns.items():
+            grown = np.zeros(capacity * 2, dtype=column.dtype)
+            grown[:capacity] = column
+            self.columns[name] = grown
+    
+    def upsert(self, profile: UserPreferenceProfile):
+        """Insert or overwrite one user's row"""
+        with self.lock:
+            row = self.index.get(profile.user_id)
+            if row is None:
+                self._grow()
+                row = len(self.user_ids)
+                self.index[profile.user_id] = row
+                self.user_ids.append(profile.user_id)
+            for name in PROFILE_COLUMN_FIELDS:
+                self.columns[name][row] = getattr(profile, name)
+    
+    def column(self, name: str) -> np.ndarray:
+        """Live view of one field over all rows"""
+        if name not in self.columns:
+            raise KeyError(f"Unknown profile field '{name}'")
+        with self.lock:
+            return self.columns[name][:len(self.user_ids)]
+    
+    def row(self, user_id: str) -> Dict[str, float]:
+        with self.lock:
+            row = self.index[user_id]
+            return {name: float(column[row]) for name, column in self.columns.items()}
+    
+    def interaction_tiers(self) -> np.ndarray:
+        """Tier label of each row by total_interactions"""
+        bounds = np.array([bound for bound, _ in INTERACTION_TIERS[:-1]])
+        names = np.array([name for _, name in INTERACTION_TIERS])
+        return names[np.searchsorted(bounds, self.column('total_interactions'), side='right')]
+    
+    def summary(self, field: str, mask: Optional[np.ndarray] = None) -> Dict[str, Any]:
+        """count / mean / std / min / percentiles / max of one field"""
+        with self.lock:
+            values = self.column(field).copy()
+        if mask is not None:
+            values = values[mask]
+        if values.size == 0:
+            return {'count': 0}
+        p25, p50, p75 = np.percentile(values, [25, 50, 75])
+        return {
+            'count': int(values.size),
+            'mean': float(values.mean()),
+            'std': float(values.std()),
+            'min': float(values.min()),
+            'p25': float(p25),
+            'p50': float(p50),
+            'p75': float(p75),
+            'max': float(values.max())
+        }
+    
+    def group_by(self, field: str, labels) -> Dict[str, Dict[str, float]]:
+        """count / mean / std / min / max of ``field`` per label (one label per row)"""
+        with self.lock:
+            values = self.column(field).copy()
+        labels = np.asarray(labels)
+        if labels.shape != values.shape:
+            raise ValueError(f"Expected {values.size} labels, got {labels.size}")
+        if values.size == 0:
+            return {}
+        groups, inverse = np.unique(labels, return_inverse=True)
+        counts = np.bincount(inverse)
+        means = np.bincount(inverse, weights=values) / counts
+        variances = np.bincount(inverse, weights=values * values) / counts - means * means
+        minimums = np.full(len(groups), np.inf)
+        maximums = np.full(len(groups), -np.inf)
+        np.minimum.at(minimums, inverse, values)
+        np.maximum.at(maximums, inverse, values)
+        return {
+            str(group): {
+                'count': int(counts[i]),
+                'mean': float(means[i]),
+                'std': float(np.sqrt(max(variances[i], 0.0))),
+                'min': float(minimums[i]),
+                'max': float(maximums[i])
+            }
+            for i, group in enumerate(groups)
+        }
+    
+    def histogram(self, field: str, bins: int = 10) -> Dict[str, List[float]]:
+        with self.lock:
+            values = self.column(field).copy()
+        counts, edges = np.histogram(values, bins=bins)
+        return {'counts': counts.tolist(), 'edges': edges.tolist()}
+
+# Interactions kept in memory per user
+HISTORY_LENGTH = 100
+
+# Recent-acceptance windows: the last 10 interactions for insights, 20 for pattern analysis
+INSIGHT_WINDOW = 10
+PATTERN_WINDOW = 20
+
+def _rating(feedback: Dict[str, Any]) -> float:
+    """Rating of one feedback; missing or non-numeric ratings count as neutral (3)"""
+    rating = feedback.get('rating', 3)
+    return rating if isinstance(rating, (int, float)) else 3
+
+# Recommendation type of interactions whose tweak_id was not issued by this engine
+UNKNOWN_TYPE = 'unknown'
+
+# Change in mean confidence between history halves that counts as a trend
+CONFIDENCE_TREND_DELTA = 0.05
+
+class RunningHalves:
+    """Values split into an older and a newer half (sizes ``len // 2`` and the rest) with running sums"""
+    
+    __slots__ = ('first', 'second', 'first_sum', 'second_sum')
+    
+    def __init__(self):
+        self.first: deque = deque()
+        self.second: deque = deque()
+        self.first_sum = 0
+        self.second_sum = 0
+    
+    def __len__(self) -> int:
+        return len(self.first) + len(self.second)
+    
+    def push(self, value: float):
+        self.second.append(value)
+        self.second_sum += value
+        while len(self.first) < len(self) // 2:
+            moved = self.second.popleft()
+            self.second_sum -= moved
+            self.first.append(moved)
+            self.first_sum += moved
+    
+    def pop_oldest(self):
+        if self.first:
+            self.first_sum -= self.first.popleft()
+        else:
+            self.second_sum -= self.second.popleft()
+    
+    def means(self) -> Tuple[float, float]:
+        first = self.first_sum / len(self.first) if self.first else float('nan')
+        second = self.second_sum / len(self.second) if self.second else float('nan')
+        return first, second
+
+class InteractionHistory(deque):
+    """Bounded interaction history that keeps its insight aggregates up to date on append
+    
+    Acceptance/rejection counts of the recent windows, rating and confidence sums of the
+    older and newer half of the history and feedback counts per recommendation type are
+    updated in O(1) per appended (or evicted) interaction, so insights never rescan the
+    history. Other deque mutators are rare and rebuild the aggregates from scratch.
+    """
+    
+    def __init__(self, iterable=(), maxlen: Optional[int] = HISTORY_LENGTH):
+        super().__init__((), maxlen)
+        self._reset()
+        self.extend(iterable)
+    
+    def _reset(self):
+        self._recent: Dict[int, deque] = {size: deque(maxlen=size) for size in (INSIGHT_WINDOW, PATTERN_WINDOW)}
+        self._accepted = {size: 0 for size in self._recent}
+        self._rejected = {size: 0 for size in self._recent}
+        self._ratings = RunningHalves()
+        # Only interactions joined to an issued recommendation carry a confidence
+        self._confidences = RunningHalves()
+        # recommendation type -> feedback action -> count
+        self.type_actions: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    
+    @staticmethod
+    def _action(interaction: Dict[str, Any]) -> Any:
+        return interaction['feedback'].get('action')
+    
+    @staticmethod
+    def _confidence(interaction: Dict[str, Any]) -> Optional[float]:
+        confidence = interaction.get('confidence')
+        return confidence if isinstance(confidence, (int, float)) else None
+    
+    def append(self, interaction: Dict[str, Any]) -> None:
+        if self.maxlen is not None and len(self) == self.maxlen:
+            if self.maxlen == 0:
+                return
+            evicted = self[0]
+            self._count_type(evicted, -1)
+            self._ratings.pop_oldest()
+            if self._confidence(evicted) is not None:
+                self._confidences.pop_oldest()
+        super().append(interaction)
+        
+        action = self._action(interaction)
+        for size, window in self._recent.items():
+            if len(window) == size:
+                dropped = window[0]
+                self._accepted[size] -= dropped == 'accepted'
+                self._rejected[size] -= dropped == 'rejected'
+            window.append(action)
+            self._accepted[size] += action == 'accepted'
+            self._rejected[size] += action == 'rejected'
+        self._count_type(interaction, 1)
+        
+        self._ratings.push(_rating(interaction['feedback']))
+        confidence = self._confidence(interaction)
+        if confidence is not None:
+            self._confidences.push(confidence)
+    
+    def _count_type(self, interaction: Dict[str, Any], delta: int):
+        kind = interaction.get('type', UNKNOWN_TYPE)
+        actions = self.type_actions[kind]
+        action = str(self._action(interaction))
+        actions[action] += delta
+        if not actions[action]:
+            del actions[action]
+            if not actions:
+                del self.type_actions[kind]
+    
+    def extend(self, interactions) -> None:
+        for interaction in interactions:
+            self.append(interaction)
+    
+    def clear(self) -> None:
+        super().clear()
+        self._reset()
+    
+    def _rebuild(self):
+        interactions = list(self)
+        self.clear()
+        self.extend(interactions)
+    
+    def recent_counts(self, size: int = INSIGHT_WINDOW) -> Tuple[int, int, int]:
+        """(interactions, accepted, rejected) among the last ``size`` interactions"""
+        return len(self._recent[size]), self._accepted[size], self._rejected[size]
+    
+    def half_rating_means(self) -> Tuple[float, float]:
+        """Mean rating of the older and the newer half of the history"""
+        return self._ratings.means()
+    
+    def half_confidence_means(self) -> Tuple[int, float, float]:
+        """(interactions with a confidence, mean confidence of their older half, of their newer half)"""
+        return (len(self._confidences),) + self._confidences.means()
+    
+    def accepted_types(self) -> Dict[str, int]:
+        """Accepted recommendations per type, most accepted first"""
+        counts = {kind: actions['accepted'] for kind, actions in self.type_actions.items() if actions.get('accepted')}
+        return dict(sorted(counts.items(), key=lambda item: (-item[1], item[0])))
+    
+    def __reduce__(self):
+        return type(self), (list(self), self.maxlen)
+
+def _rebuilding(name):
+    method = getattr(deque, name)
+    
+    def wrapper(self, *args):
+        result = method(self, *args)
+        self._rebuild()
+        return result
+    wrapper.__name__ = name
+    return wrapper
+
+for _name in ('appendleft', 'extendleft', 'pop', 'popleft', 'insert', 'remove', 'rotate',
+              'reverse', '__setitem__', '__delitem__', '__iadd__'):
+    setattr(InteractionHistory, _name, _rebuilding(_name))
+
+class TweakRegistry:
+    """Recommendations issued under a tweak_id, so feedback can be joined back to what was suggested
+    
+    Keeps the type, confidence and factors of the last ``max_entries`` issued recommendations
+    and all-time counters per recommendation type (issued, feedback actions, confidence sum),
+    updated in O(1) as recommendations are issued and feedback arrives.
+    """
+    
+    FEEDBACK_ACTIONS = ('accepted', 'rejected', 'modified')
+    
+    def __init__(self, max_entries: int = 100_000):
+        self.max_entries = max(1, max_entries)
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.type_counters: Dict[str, Dict[str, float]] = defaultdict(
+            lambda: {'issued': 0, 'confidence_sum': 0.0, 'feedback': 0,
+                     **{action: 0 for action in self.FEEDBACK_ACTIONS}}
+        )
+        self.unmatched_feedback = 0
+    
+    def register(self, user_id: str, recommendation: 'AIRecommendation') -> str:
+        """Record an issued recommendation and return its new tweak_id"""
+        tweak_id = uuid.uuid4().hex
+        confidence = float(recommendation.confidence)
+        entry = {
+            'user_id': user_id,
+            'type': recommendation.type,
+            'confidence': confidence,
+            'factors': list(recommendation.factors or []),
+            'issued_at': datetime.now().timestamp()
+        }
+        with self._lock:
+            self._entries[tweak_id] = entry
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            counters = self.type_counters[recommendation.type]
+            counters['issued'] += 1
+            counters['confidence_sum'] += confidence
+        return tweak_id
+    
+    def get(self, tweak_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._entries.get(tweak_id)
+    
+    def record_feedback(self, tweak_id: str, user_id: str, action: Any) -> Optional[Dict[str, Any]]:
+        """Join feedback to the recommendation it answers; None for unknown (or another user's) tweak ids"""
+        with self._lock:
+            entry = self._entries.get(tweak_id)
+            if entry is None or entry['user_id'] != user_id:
+                self.unmatched_feedback += 1
+                return None
+            counters = self.type_counters[entry['type']]
+            counters['feedback'] += 1
+            if action in self.FEEDBACK_ACTIONS:
+                counters[action] += 1
+            return entry
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            types = {
+                kind: {
+                    **counters,
+                    'mean_confidence': counters['confidence_sum'] / counters['issued'] if counters['issued'] else None,
+                    'acceptance_rate': counters['accepted'] / counters['feedback'] if counters['feedback'] else None
+                }
+                for kind, counters in self.type_counters.items()
+            }
+            return {'registered': len(self._entries), 'unmatched_feedback': self.unmatched_feedback, 'types': types}
+
 class EnhancedAIEngine:
     """Enhanced AI coaching engine with preference learning and real-time adaptation"""
     
-    def __init__(self, model=None, tokenizer=None, user_profiles_path: str = "./user_profiles.pkl"):
+    def __init__(self, model=None, tokenizer=None, user_profiles_path: str = "./user_profiles.pkl",
+                 profile_store_path: Optional[str] = None, durability: Optional[str] = None,
+                 flush_interval_ms: Optional[float] = None, flush_max_records: Optional[int] = None,
+                 max_resident_users: Optional[int] = None, history_loader=None,
+                 interaction_log_dir: Optional[str] = None, interaction_retention_days: Optional[int] = None):
         self.model = model
         self.tokenizer = tokenizer
+        # Legacy whole-file pickle; imported into the keyed profile store once, then left as *.migrated
         self.user_profiles_path = user_profiles_path
-        self.user_profiles: Dict[str, UserPreferenceProfile] = {}
-        self.interaction_history = defaultdict(lambda: deque(maxlen=100))
+        self.profile_store_path = profile_store_path or os.path.splitext(user_profiles_path)[0] + ".db"
+        # Profile persistence: sync (write-through), batched (write-behind) or memory (tests)
+        self.durability = (durability or os.getenv("PROFILE_DURABILITY", "batched")).lower()
+        self.profile_store = ProfileStore(self.profile_store_path) if self.durability != "memory" else None
+        
+        # Coalesce bursts of feedback for the same users into periodic batched writes
+        self.profile_writer = WriteBehindWriter(
+            self.profile_store,
+            lambda uid: self.user_profiles.peek(uid),
+            mode=self.durability,
+            flush_interval_ms=flush_interval_ms or float(os.getenv("PROFILE_FLUSH_INTERVAL_MS", 500)),
+            flush_max_records=flush_max_records or int(os.getenv("PROFILE_FLUSH_MAX_RECORDS", 256))
+        )
+        # Not registered with atexit: the owning service calls shutdown() (see shutdown_enhanced_engine)
+        
+        # Only recently active users stay in memory; the rest are faulted in from the store.
+        # Without a store (memory mode) nothing could be faulted back, so nothing is evicted.
+        self.max_resident_users = max_resident_users or int(os.getenv("MAX_RESIDENT_USERS", 10000))
+        resident_limit = self.max_resident_users if self.profile_store is not None else None
+        # Append-only per-user/day log of interactions, so pattern analysis survives restarts.
+        # Nothing is replayed at startup; a user's recent interactions are tailed on first access.
+        self.interaction_log = None
+        if self.durability != "memory":
+            self.interaction_log = InteractionLog(
+                interaction_log_dir or os.getenv("INTERACTION_LOG_DIR") or os.path.splitext(user_profiles_path)[0] + "_interactions",
+                retention_days=interaction_retention_days or int(os.getenv("INTERACTION_RETENTION_DAYS", 90))
+            )
+        # history_loader(user_id) -> recent interactions (oldest first) or None
+        if history_loader is None and self.interaction_log is not None:
+            history_loader = lambda uid: self.interaction_log.tail(uid, HISTORY_LENGTH)
+        self.history_loader = history_loader
+        self.user_profiles = LazyLRUMap(
+            self._fault_in_profile,
+            max_resident=resident_limit,
+            on_evict=self.profile_writer.write_now,
+            keys_source=self.profile_store.keys if self.profile_store is not None else None
+        )
+        self.interaction_history = LazyLRUMap(
+            self._fault_in_history,
+            max_resident=resident_limit,
+            default_factory=InteractionHistory
+        )
         
-        # Load existing profiles
+        # Import any legacy pickle; profiles themselves load on first access
         self._load_user_profiles()
         
+        # Columnar copy for population analytics, built on first use and kept in sync on save
+        self.profile_columns: Optional[ProfileColumns] = None
+        self._profile_columns_lock = threading.Lock()
+        
         # Safety constraints
         self.safety_constraints = {
             'min_rep_percentage': 0.8,  # Never suggest < 80% of planned reps
@@ -100,93 +541,200 @@ class EnhancedAIEngine:
             'max_session_extension': 0.2,  # Max 20% session duration extension
         }
         
+        # Issued recommendations by tweak_id, joined back to feedback in process_user_feedback
+        self.tweak_registry = TweakRegistry(int(os.getenv("TWEAK_REGISTRY_SIZE", 100_000)))
+        
+        # Early-stop accounting for _generate_ai_suggestion; updated from concurrent requests
+        self.generation_stats = {'generations': 0, 'early_stops': 0, 'tokens_saved': 0}
+        self._generation_stats_lock = threading.Lock()
+        
         logger.info("Enhanced AI Engine initialized")
     
     def _load_user_profiles(self):
-        """Load user preference profiles from disk"""
+        """Migrate the legacy pickle into the profile store; profiles are faulted in lazily"""
+        if self.profile_store is None:
+            return
+        try:
+            self.profile_store.migrate_from_pickle(self.user_profiles_path)
+        except Exception as e:
+            logger.warning(f"Could not migrate user profiles from {self.user_profiles_path}: {e}")
+        try:
+            logger.info(f"Profile store has {len(self.profile_store)} user profiles")
+        except Exception as e:
+            logger.warning(f"Could not open user profiles: {e}")
+    
+    def _fault_in_profile(self, user_id: str) -> Optional[UserPreferenceProfile]:
+        """Load one user's profile from the store on first access"""
+        if self.profile_store is None:
+            return None
+        try:
+            data = self.profile_store.get(user_id)
+            return UserPreferenceProfile(**data) if data is not None else None
+        except Exception as e:
+            logger.warning(f"Could not load profile for user {user_id}: {e}")
+            return None
+    
+    def _fault_in_history(self, user_id: str) -> Optional[deque]:
+        """Load one user's recent interactions through ``history_loader`` on first access"""
+        if self.history_loader is None:
+            return None
+        try:
+            interactions = self.history_loader(user_id)
+        except Exception as e:
+            logger.warning(f"Could not load interaction history for user {user_id}: {e}")
+            return None
+        return InteractionHistory(interactions) if interactions is not None else None
+    
+    def _save_user_profile(self, user_id: str, profile: UserPreferenceProfile):
+        """Mark one user's changed profile dirty; the profile writer persists it per the durability mode"""
+        # Waits for a table being built, so this save is not missed by it
+        with self._profile_columns_lock:
+            table = self.profile_columns
+        if table is not None:
+            table.upsert(profile)
         try:
-            if os.path.exists(self.user_profiles_path):
-                with open(self.user_profiles_path, 'rb') as f:
-                    profiles_data = pickle.load(f)
-                    self.user_profiles = {
-                        uid: UserPreferenceProfile(**data) if isinstance(data, dict) else data
-                        for uid, data in profiles_data.items()
-                    }
-                logger.info(f"Loaded {len(self.user_profiles)} user profiles")
+            self.profile_writer.mark_dirty(user_id)
         except Exception as e:
-            logger.warning(f"Could not load user profiles: {e}")
-            self.user_profiles = {}
+            logger.error(f"Could not save profile for user {user_id}: {e}")
     
     def _save_user_profiles(self):
-        """Save user preference profiles to disk"""
+        """Persist every user preference profile in one transaction"""
+        if self.profile_store is None:
+            return
         try:
-            profiles_data = {
-                uid: asdict(profile) for uid, profile in self.user_profiles.items()
-            }
-            with open(self.user_profiles_path, 'wb') as f:
-                pickle.dump(profiles_data, f)
-            logger.info(f"Saved {len(self.user_profiles)} user profiles")
+            # Profiles that are not resident are already persisted
+            saved = self.profile_store.put_many(self.user_profiles.resident_items())
+            logger.info(f"Saved {saved} user profiles")
         except Exception as e:
             logger.error(f"Could not save user profiles: {e}")
     
+    def flush_profiles(self) -> int:
+        """Write all pending profile updates now"""
+        return self.profile_writer.flush()
+    
+    def get_persistence_stats(self) -> Dict[str, Any]:
+        """Profile write-behind metrics: flush sizes, lag and pending updates"""
+        return self.profile_writer.stats()
+    
+    def get_residency_stats(self) -> Dict[str, Any]:
+        """How many profiles/histories are in memory, and LRU hit/fault/eviction counts"""
+        return {
+            'profiles': self.user_profiles.stats(),
+            'histories': self.interaction_history.stats(),
+            'interaction_log': self.interaction_log.stats() if self.interaction_log is not None else None
+        }
+    
+    def shutdown(self):
+        """Flush pending profile updates and stop the background flusher (graceful shutdown hook)"""
+        self.profile_writer.close()
+    
+    def get_profile_columns(self) -> ProfileColumns:
+        """Columnar table of every stored profile, with in-memory profiles taking precedence"""
+        with self._profile_columns_lock:
+            if self.profile_columns is None:
+                table = ProfileColumns(capacity=len(self.profile_store) if self.profile_store is not None else 1024)
+                if self.profile_store is not None:
+                    for uid, data in self.profile_store.items():
+                        table.upsert(UserPreferenceProfile(**data))
+                for uid, profile in self.user_profiles.resident_items():
+                    table.upsert(profile)
+                self.profile_columns = table
+            return self.profile_columns
+    
+    def get_population_stats(self, fields: Optional[List[str]] = None, group_by: Optional[str] = None,
+                             labels: Optional[Dict[str, str]] = None, histogram_bins: int = 0) -> Dict[str, Any]:
+        """Fleet-wide profile aggregates computed on the columnar table
+        
+        ``group_by`` is ``'interaction_tier'`` or ``'label'``; with ``'label'`` each user's
+        group comes from ``labels`` (e.g. experience level), missing users go to ``'unknown'``.
+        """
+        table = self.get_profile_columns()
+        fields = fields or ['acceptance_rate', 'learning_rate', 'workout_confidence', 'total_interactions']
+        for field in fields:
+            if field not in PROFILE_COLUMN_FIELDS:
+                raise ValueError(f"Unknown profile field '{field}'")
+        
+        # One consistent set of rows for the labels and every column
+        with table.lock:
+            stats: Dict[str, Any] = {'users': len(table), 'fields': {}}
+            if group_by == 'interaction_tier':
+                groups = table.interaction_tiers()
+            elif group_by == 'label':
+                labels = labels or {}
+                groups = np.array([labels.get(uid, 'unknown') for uid in table.user_ids], dtype=object).astype(str)
+            elif group_by is not None:
+                raise ValueError(f"Unknown group_by '{group_by}'")
+        
+            for field in fields:
+                entry = {'overall': table.summary(field)}
+                if group_by is not None:
+                    entry['groups'] = table.group_by(field, groups)
+                if histogram_bins > 0 and len(table):
+                    entry['histogram'] = table.histogram(field, histogram_bins)
+                stats['fields'][field] = entry
+        return stats
+    
     def get_user_profile(self, user_id: str) -> UserPreferenceProfile:
         """Get or create user preference profile"""
-        if user_id not in self.user_profiles:
-            self.user_profiles[user_id] = UserPreferenceProfile(
-                user_id=user_id,
-                last_updated=datetime.now().timestamp()
-            )
-        return self.user_profiles[user_id]
+        with self.user_profiles.checkout(user_id, lambda: self._new_profile(user_id)) as profile:
+            return profile
+    
+    @staticmethod
+    def _new_profile(user_id: str) -> UserPreferenceProfile:
+        return UserPreferenceProfile(
+            user_id=user_id,
+            last_updated=datetime.now().timestamp()
+        )
     
     def update_user_preferences(self, user_id: str, feedback: Dict[str, Any]) -> None:
         """Update user preferences based on feedback"""
-        profile = self.get_user_profile(user_id)
-        
-        # Extract feedback signals
-        action = feedback.get('action', 'ignored')
-        rating = feedback.get('rating')
-        response_time = feedback.get('response_time')
-        modification_reason = feedback.get('modification_reason')
-        
-        # Update acceptance and modification rates
-        profile.total_interactions += 1
-        
-        if action == 'accepted':
-            profile.acceptance_rate = self._exponential_moving_average(
-                profile.acceptance_rate, 1.0, profile.learning_rate
-            )
-        elif action == 'rejected':
-            profile.acceptance_rate = self._exponential_moving_average(
-                profile.acceptance_rate, 0.0, profile.learning_rate
-            )
-            if modification_reason:
-                profile.common_rejection_reasons.append(modification_reason)
-                # Keep only recent rejection reasons
-                profile.common_rejection_reasons = profile.common_rejection_reasons[-20:]
-        elif action == 'modified':
-            profile.modification_frequency = self._exponential_moving_average(
-                profile.modification_frequency, 1.0, profile.learning_rate
-            )
-        
-        # Update confidence based on rating
-        if rating is not None:
-            confidence_adjustment = (rating - 3.0) / 5.0  # Convert 1-5 to -0.4 to 0.4
-            profile.workout_confidence = np.clip(
-                profile.workout_confidence + confidence_adjustment * profile.learning_rate,
-                0.0, 1.0
-            )
-        
-        # Learn from response time
-        if response_time is not None:
-            # Quick responses (< 5s) suggest good recommendations
-            if response_time < 5:
-                profile.workout_confidence = min(1.0, profile.workout_confidence + 0.01)
-            elif response_time > 30:
-                # Slow responses suggest uncertainty
-                profile.workout_confidence = max(0.0, profile.workout_confidence - 0.01)
-        
-        profile.last_updated = datetime.now().timestamp()
-        self._save_user_profiles()
+        # Pinned while it changes, so it cannot be evicted before it is marked dirty
+        with self.user_profiles.checkout(user_id, lambda: self._new_profile(user_id)) as profile:
+            # Extract feedback signals
+            action = feedback.get('action', 'ignored')
+            rating = feedback.get('rating')
+            response_time = feedback.get('response_time')
+            modification_reason = feedback.get('modification_reason')
+            
+            # Update acceptance and modification rates
+            profile.total_interactions += 1
+            
+            if action == 'accepted':
+                profile.acceptance_rate = self._exponential_moving_average(
+                    profile.acceptance_rate, 1.0, profile.learning_rate
+                )
+            elif action == 'rejected':
+                profile.acceptance_rate = self._exponential_moving_average(
+                    profile.acceptance_rate, 0.0, profile.learning_rate
+                )
+                if modification_reason:
+                    profile.common_rejection_reasons.append(sys.intern(str(modification_reason)))
+                    # Keep only recent rejection reasons
+                    profile.common_rejection_reasons = profile.common_rejection_reasons[-20:]
+            elif action == 'modified':
+                profile.modification_frequency = self._exponential_moving_average(
+                    profile.modification_frequency, 1.0, profile.learning_rate
+                )
+            
+            # Update confidence based on rating
+            if rating is not None:
+                confidence_adjustment = (rating - 3.0) / 5.0  # Convert 1-5 to -0.4 to 0.4
+                profile.workout_confidence = np.clip(
+                    profile.workout_confidence + confidence_adjustment * profile.learning_rate,
+                    0.0, 1.0
+                )
+            
+            # Learn from response time
+            if response_time is not None:
+                # Quick responses (< 5s) suggest good recommendations
+                if response_time < 5:
+                    profile.workout_confidence = min(1.0, profile.workout_confidence + 0.01)
+                elif response_time > 30:
+                    # Slow responses suggest uncertainty
+                    profile.workout_confidence = max(0.0, profile.workout_confidence - 0.01)
+            
+            profile.last_updated = datetime.now().timestamp()
+            self._save_user_profile(user_id, profile)
         
         logger.info(f"Updated preferences for user {user_id}: acceptance_rate={profile.acceptance_rate:.2f}")
     
@@ -231,7 +779,17 @@ class EnhancedAIEngine:
         # Calculate confidence based on profile and context
         confidence = self._calculate_confidence(profile, context_analysis, safe_recommendation)
         
-        return AIRecommendation(
+        return self._to_recommendation(user_id, safe_recommendation, exercise_data, confidence)
+    
+    def _to_recommendation(
+        self,
+        user_id: str,
+        safe_recommendation: Dict[str, Any],
+        exercise_data: Dict[str, Any],
+        confidence: float
+    ) -> AIRecommendation:
+        """Wrap a personalized, safety-checked suggestion as an AIRecommendation registered under a new tweak_id"""
+        recommendation = AIRecommendation(
             type=safe_recommendation.get('type', 'maintain_program'),
             original_value=exercise_data.get('planned_value'),
             suggested_value=safe_recommendation.get('suggested_value'),
@@ -242,6 +800,51 @@ class EnhancedAIEngine:
             risk_assessment=safe_recommendation.get('risk_assessment', 'Low risk'),
             alternative_options=safe_recommendation.get('alternatives', [])
         )
+        recommendation.tweak_id = self.tweak_registry.register(user_id, recommendation)
+        return recommendation
+    
+    def generate_personalized_recommendations_batch(
+        self,
+        requests: List[Tuple],
+        event_type: str = "workout_tweak",
+        batch_size: int = 8
+    ) -> List[AIRecommendation]:
+        """Recommendations for many ``(user_id, exercise_data, context[, event_type])`` tuples at once
+        
+        Same results as calling generate_personalized_recommendation per tuple, but the model
+        runs one generate per ``batch_size`` prompts and context analysis and confidence are
+        computed as NumPy arrays over the whole batch. Results are returned in input order.
+        """
+        if not requests:
+            return []
+        
+        items = [
+            (user_id, exercise_data, context, rest[0] if rest else event_type)
+            for user_id, exercise_data, context, *rest in requests
+        ]
+        profiles = [self.get_user_profile(user_id) for user_id, _, _, _ in items]
+        contexts = [context for _, _, context, _ in items]
+        analyses = self._analyze_contexts_batch(contexts, profiles)
+        
+        exercises = [exercise_data for _, exercise_data, _, _ in items]
+        if self.model is not None:
+            suggestions = self._generate_ai_suggestions_batch(items, profiles, batch_size)
+        else:
+            suggestions = [
+                self._generate_fallback_recommendation(exercise_data, context, profile, item_event)
+                for (_, exercise_data, context, item_event), profile in zip(items, profiles)
+            ]
+        
+        safe_recommendations = [
+            self._apply_safety_constraints(self._personalize_recommendation(suggestion, profile, analysis), exercise_data)
+            for suggestion, profile, analysis, exercise_data in zip(suggestions, profiles, analyses, exercises)
+        ]
+        confidences = self._calculate_confidence_batch(profiles, analyses, safe_recommendations)
+        
+        return [
+            self._to_recommendation(user_id, safe, exercise_data, confidence)
+            for safe, (user_id, exercise_data, _, _), confidence in zip(safe_recommendations, items, confidences)
+        ]
     
     def _analyze_context(self, context: WorkoutContext, profile: UserPreferenceProfile) -> Dict[str, Any]:
         """Analyze workout context to inform recommendations"""
@@ -286,6 +889,113 @@ class EnhancedAIEngine:
         
         return analysis
     
+    def _analyze_contexts_batch(
+        self,
+        contexts: List[WorkoutContext],
+        profiles: List[UserPreferenceProfile]
+    ) -> List[Dict[str, Any]]:
+        """_analyze_context for many contexts, with the numeric factors computed as arrays"""
+        def optional(values):
+            return np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64)
+        
+        energy = optional(c.user_energy for c in contexts)
+        available = optional(c.available_time for c in contexts)
+        motivation = optional(c.user_motivation for c in contexts)
+        preferred_time = np.array([p.time_constraints for p in profiles], dtype=np.float64)
+        
+        energy_optimal = 7.0
+        energy_alignment = np.where(
+            np.isnan(energy), 1.0, np.maximum(0.0, 1.0 - np.abs(energy - energy_optimal) / energy_optimal)
+        )
+        
+        timed = ~np.isnan(available) & (preferred_time > 0)
+        time_ratio = np.divide(available, preferred_time, out=np.ones_like(available), where=timed)
+        time_pressure = np.where(timed & (time_ratio < 0.8), 0.8 - time_ratio, 0.0)
+        
+        motivation_factor = np.where(np.isnan(motivation), 1.0, motivation / 10.0)
+        
+        crowding_impact = {'low': 0.0, 'medium': 0.3, 'high': 0.7}
+        analyses = []
+        for i, context in enumerate(contexts):
+            equipment_constraints = 0.0
+            if context.equipment_availability:
+                unavailable_count = sum(1 for available in context.equipment_availability.values() if not available)
+                equipment_constraints = unavailable_count / len(context.equipment_availability)
+            analyses.append({
+                'energy_alignment': float(energy_alignment[i]),
+                'time_pressure': float(time_pressure[i]),
+                'equipment_constraints': equipment_constraints,
+                'motivation_factor': float(motivation_factor[i]),
+                'crowding_impact': crowding_impact.get(context.gym_crowding, 0.0),
+                'performance_trend': 'stable'
+            })
+        return analyses
+
+    def _record_generations(self, tokens_saved: List[int]) -> None:
+        """Count one generation per row, and the budget left unused by rows that stopped early"""
+        with self._generation_stats_lock:
+            self.generation_stats['generations'] += len(tokens_saved)
+            for saved in tokens_saved:
+                if saved > 0:
+                    self.generation_stats['early_stops'] += 1
+                    self.generation_stats['tokens_saved'] += saved
+
+    def _generate_ai_suggestions_batch(
+        self,
+        items: List[Tuple[str, Dict[str, Any], WorkoutContext, str]],
+        profiles: List[UserPreferenceProfile],
+        batch_size: int
+    ) -> List[Dict[str, Any]]:
+        """_generate_ai_suggestion for many items, one left-padded model.generate per chunk"""
+        import torch
+        from transformers import StoppingCriteriaList
+        
+        suggestions: List[Dict[str, Any]] = []
+        for start in range(0, len(items), max(1, batch_size)):
+            chunk = items[start:start + batch_size]
+            chunk_profiles = profiles[start:start + batch_size]
+            try:
+                encoded = [
+                    self.tokenizer.encode(
+                        self._create_enhanced_prompt(user_id, exercise_data, context, profile, item_event),
+                        max_length=800, truncation=True
+                    )
+                    for (user_id, exercise_data, context, item_event), profile in zip(chunk, chunk_profiles)
+                ]
+                prompt_length = max(len(ids) for ids in encoded)
+                pad_id = self.tokenizer.eos_token_id
+                input_ids = torch.tensor([[pad_id] * (prompt_length - len(ids)) + ids for ids in encoded],
+                                         device=self.model.device)
+                attention_mask = torch.tensor([[0] * (prompt_length - len(ids)) + [1] * len(ids) for ids in encoded],
+                                              device=self.model.device)
+                
+                max_length = min(prompt_length + 120, 900)
+                stop_on_object = JSONObjectStoppingCriteria(self.tokenizer, prompt_length, max_length - prompt_length)
+                with torch.no_grad():
+                    outputs = self.model.generate(
+                        input_ids,
+                        attention_mask=attention_mask,
+                        max_length=max_length,
+                        num_return_sequences=1,
+                        temperature=0.2,  # Low temperature for consistent recommendations
+                        do_sample=True,
+                        pad_token_id=pad_id,
+                        eos_token_id=pad_id,
+                        stopping_criteria=StoppingCriteriaList([stop_on_object])
+                    )
+                
+                self._record_generations(stop_on_object.tokens_saved)
+                for row, (_, exercise_data, _, _) in enumerate(chunk):
+                    response_text = self.tokenizer.decode(outputs[row][prompt_length:], skip_special_tokens=True)
+                    suggestions.append(self._parse_ai_response(response_text, exercise_data))
+            except Exception as e:
+                logger.error(f"Batched AI suggestion generation failed: {e}")
+                suggestions.extend(
+                    self._generate_fallback_recommendation(exercise_data, context, profile, item_event)
+                    for (_, exercise_data, context, item_event), profile in zip(chunk, chunk_profiles)
+                )
+        return suggestions
+    
     def _generate_ai_suggestion(
         self, 
         user_id: str, 
@@ -301,21 +1011,32 @@ class EnhancedAIEngine:
             prompt = self._create_enhanced_prompt(user_id, exercise_data, context, profile, event_type)
             
             # Generate response
-            inputs = self.tokenizer.encode(prompt, return_tensors="pt", max_length=800, truncation=True)
+            inputs = self.tokenizer.encode(prompt, return_tensors="pt", max_length=800, truncation=True).to(self.model.device)
             
             import torch
+            from transformers import StoppingCriteriaList
+            
+            prompt_length = len(inputs[0])
+            max_length = min(prompt_length + 120, 900)
+            stop_on_object = JSONObjectStoppingCriteria(self.tokenizer, prompt_length, max_length - prompt_length)
             with torch.no_grad():
                 outputs = self.model.generate(
                     inputs,
-                    max_length=min(len(inputs[0]) + 120, 900),
+                    max_length=max_length,
                     num_return_sequences=1,
                     temperature=0.2,  # Low temperature for consistent recommendations
                     do_sample=True,
                     pad_token_id=self.tokenizer.eos_token_id,
-                    eos_token_id=self.tokenizer.eos_token_id
+                    eos_token_id=self.tokenizer.eos_token_id,
+                    stopping_criteria=StoppingCriteriaList([stop_on_object])
                 )
             
-            response_text = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
+            self._record_generations(stop_on_object.tokens_saved)
+            if stop_on_object.closed_at is not None:
+                logger.debug(f"Recommendation JSON closed early, saved {stop_on_object.tokens_saved[0]} tokens")
+            
+            # Decode only the continuation; the prompt itself contains a JSON template
+            response_text = self.tokenizer.decode(outputs[0][prompt_length:], skip_special_tokens=True)
             
             # Parse AI response
             suggestion = self._parse_ai_response(response_text, exercise_data)
@@ -639,19 +1360,67 @@ JSON:"""
         
         return np.clip(base_confidence, 0.0, 1.0)
     
+    def _calculate_confidence_batch(
+        self,
+        profiles: List[UserPreferenceProfile],
+        context_analyses: List[Dict[str, Any]],
+        recommendations: List[Dict[str, Any]]
+    ) -> np.ndarray:
+        """_calculate_confidence over a batch, as elementwise array operations"""
+        def score(recommendation):
+            try:
+                return float(recommendation.get('confidence_score', 0.5))
+            except (TypeError, ValueError):
+                return 0.5
+        
+        base_confidence = np.array([score(r) for r in recommendations], dtype=np.float64)
+        total_interactions = np.array([p.total_interactions for p in profiles], dtype=np.float64)
+        acceptance = np.array([p.acceptance_rate for p in profiles], dtype=np.float64)
+        energy = np.array([a['energy_alignment'] for a in context_analyses], dtype=np.float64)
+        time_pressure = np.array([a['time_pressure'] for a in context_analyses], dtype=np.float64)
+        motivation = np.array([a['motivation_factor'] for a in context_analyses], dtype=np.float64)
+        crowding = np.array([a['crowding_impact'] for a in context_analyses], dtype=np.float64)
+        
+        base_confidence = np.where(
+            total_interactions > 20, base_confidence + np.minimum(0.2, total_interactions / 100), base_confidence
+        )
+        base_confidence *= (0.5 + acceptance * 0.5)
+        context_clarity = (
+            energy * 0.3 +
+            (1 - time_pressure) * 0.2 +
+            motivation * 0.3 +
+            (1 - crowding) * 0.2
+        )
+        base_confidence *= (0.7 + context_clarity * 0.3)
+        
+        conservative_types = ['maintain_program', 'rest_increase', 'form_focus']
+        conservative = np.array([r['type'] in conservative_types for r in recommendations], dtype=bool)
+        base_confidence = np.where(conservative, base_confidence * 1.1, base_confidence)
+        
+        return np.clip(base_confidence, 0.0, 1.0)
+    
     def process_user_feedback(self, user_id: str, tweak_id: str, feedback: Dict[str, Any]) -> None:
         """Process user feedback to improve future recommendations"""
         
         # Update user preferences
         self.update_user_preferences(user_id, feedback)
         
-        # Store interaction for pattern analysis
+        # Store interaction for pattern analysis, joined to the recommendation it answers
         interaction = {
             'tweak_id': tweak_id,
             'feedback': feedback,
             'timestamp': datetime.now().timestamp()
         }
+        issued = self.tweak_registry.record_feedback(tweak_id, user_id, feedback.get('action'))
+        if issued is not None:
+            interaction['type'] = issued['type']
+            interaction['confidence'] = issued['confidence']
         self.interaction_history[user_id].append(interaction)
+        if self.interaction_log is not None:
+            try:
+                self.interaction_log.append(user_id, interaction)
+            except Exception as e:
+                logger.error(f"Could not log interaction for user {user_id}: {e}")
         
         # Analyze patterns if we have enough data
         if len(self.interaction_history[user_id]) >= 10:
@@ -662,84 +1431,84 @@ JSON:"""
     def _analyze_interaction_patterns(self, user_id: str) -> None:
         """Analyze user interaction patterns to identify learning opportunities"""
         
-        interactions = list(self.interaction_history[user_id])
-        profile = self.get_user_profile(user_id)
-        
-        # Analyze recent acceptance rate trend
-        recent_interactions = interactions[-20:]  # Last 20 interactions
-        recent_acceptances = sum(1 for i in recent_interactions 
-                               if i['feedback'].get('action') == 'accepted')
-        recent_acceptance_rate = recent_acceptances / len(recent_interactions)
-        
-        # Adjust learning rate based on stability
-        if abs(recent_acceptance_rate - profile.acceptance_rate) > 0.2:
-            # Significant change in pattern - increase learning rate
-            profile.learning_rate = min(0.3, profile.learning_rate * 1.2)
-            logger.info(f"Increased learning rate for user {user_id} due to pattern change")
-        else:
-            # Stable pattern - decrease learning rate
-            profile.learning_rate = max(0.05, profile.learning_rate * 0.95)
+        history = self.interaction_history[user_id]
         
-        # Identify common rejection reasons
-        rejections = [i for i in recent_interactions 
-                     if i['feedback'].get('action') == 'rejected']
+        # Analyze recent acceptance rate trend (last 20 interactions, kept as running counts)
+        recent, recent_acceptances, recent_rejections = history.recent_counts(PATTERN_WINDOW)
+        recent_acceptance_rate = recent_acceptances / recent
         
-        if len(rejections) > 3:
-            reasons = [r['feedback'].get('modification_reason', 'unknown') 
-                      for r in rejections if r['feedback'].get('modification_reason')]
+        # Pinned and marked dirty like update_user_preferences, so the changes reach the store
+        with self.user_profiles.checkout(user_id, lambda: self._new_profile(user_id)) as profile:
+            # Adjust learning rate based on stability
+            if abs(recent_acceptance_rate - profile.acceptance_rate) > 0.2:
+                # Significant change in pattern - increase learning rate
+                profile.learning_rate = min(0.3, profile.learning_rate * 1.2)
+                logger.info(f"Increased learning rate for user {user_id} due to pattern change")
+            else:
+                # Stable pattern - decrease learning rate
+                profile.learning_rate = max(0.05, profile.learning_rate * 0.95)
             
-            # Update common rejection patterns
-            profile.common_rejection_reasons.extend(reasons)
-            profile.common_rejection_reasons = profile.common_rejection_reasons[-10:]  # Keep recent
+            # Identify common rejection reasons
+            if recent_rejections > 3:
+                recent_interactions = list(islice(reversed(history), recent))[::-1]
+                rejections = [i for i in recent_interactions 
+                             if i['feedback'].get('action') == 'rejected']
+                reasons = [r['feedback'].get('modification_reason', 'unknown') 
+                          for r in rejections if r['feedback'].get('modification_reason')]
+                
+                # Update common rejection patterns
+                profile.common_rejection_reasons.extend(intern_reasons(reasons))
+                profile.common_rejection_reasons = profile.common_rejection_reasons[-10:]  # Keep recent
+                
+                logger.info(f"Updated rejection patterns for user {user_id}: {reasons}")
             
-            logger.info(f"Updated rejection patterns for user {user_id}: {reasons}")
+            self._save_user_profile(user_id, profile)
     
     def get_user_insights(self, user_id: str) -> Dict[str, Any]:
-        """Get comprehensive insights about user preferences and AI performance"""
+        """Get comprehensive insights about user preferences and AI performance
+        
+        Reads the running aggregates of the user's InteractionHistory, so the cost does
+        not depend on how many interactions are stored.
+        """
         
         profile = self.get_user_profile(user_id)
-        interactions = list(self.interaction_history[user_id])
+        history = self.interaction_history[user_id]
         
         insights = {
             'user_profile': asdict(profile),
             'interaction_summary': {
-                'total_interactions': len(interactions),
-                'recent_acceptance_rate': self._calculate_recent_acceptance_rate(interactions),
-                'improvement_trend': self._calculate_improvement_trend(interactions),
-                'preferred_recommendation_types': self._analyze_preferred_types(interactions)
+                'total_interactions': len(history),
+                'recent_acceptance_rate': self._calculate_recent_acceptance_rate(history),
+                'improvement_trend': self._calculate_improvement_trend(history),
+                'preferred_recommendation_types': self._analyze_preferred_types(history)
             },
             'ai_performance': {
-                'confidence_trend': self._calculate_confidence_trend(interactions),
+                'confidence_trend': self._calculate_confidence_trend(history),
                 'accuracy_estimate': profile.workout_confidence,
                 'learning_stability': 1.0 - profile.learning_rate,  # Inverse relationship
                 'personalization_level': min(1.0, profile.total_interactions / 50)
             },
-            'recommendations': self._generate_coaching_recommendations(profile, interactions)
+            'recommendations': self._generate_coaching_recommendations(profile, history)
         }
         
         return insights
     
-    def _calculate_recent_acceptance_rate(self, interactions: List[Dict[str, Any]]) -> float:
+    def get_users_insights(self, user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """get_user_insights for many users; repeated ids are answered once"""
+        return {user_id: self.get_user_insights(user_id) for user_id in dict.fromkeys(user_ids)}
+    
+    def _calculate_recent_acceptance_rate(self, history: InteractionHistory) -> float:
         """Calculate acceptance rate for recent interactions"""
-        if not interactions:
-            return 0.5
-        
-        recent = interactions[-10:]  # Last 10 interactions
-        accepted = sum(1 for i in recent if i['feedback'].get('action') == 'accepted')
-        return accepted / len(recent) if recent else 0.5
+        recent, accepted, _ = history.recent_counts(INSIGHT_WINDOW)
+        return accepted / recent if recent else 0.5
     
-    def _calculate_improvement_trend(self, interactions: List[Dict[str, Any]]) -> str:
+    def _calculate_improvement_trend(self, history: InteractionHistory) -> str:
         """Calculate whether user satisfaction is improving"""
-        if len(interactions) < 10:
+        if len(history) < 10:
             return 'insufficient_data'
         
         # Compare first half vs second half ratings
-        mid = len(interactions) // 2
-        first_half = interactions[:mid]
-        second_half = interactions[mid:]
-        
-        first_avg = np.mean([i['feedback'].get('rating', 3) for i in first_half])
-        second_avg = np.mean([i['feedback'].get('rating', 3) for i in second_half])
+        first_avg, second_avg = history.half_rating_means()
         
         if second_avg > first_avg + 0.3:
             return 'improving'
@@ -748,31 +1517,31 @@ JSON:"""
         else:
             return 'stable'
     
-    def _analyze_preferred_types(self, interactions: List[Dict[str, Any]]) -> Dict[str, int]:
-        """Analyze which types of recommendations user prefers"""
-        preferences = defaultdict(int)
-        
-        for interaction in interactions:
-            if interaction['feedback'].get('action') == 'accepted':
-                # Would need to track recommendation type in interaction
-                # For now, return placeholder
-                preferences['placeholder'] += 1
-        
-        return dict(preferences)
+    def _analyze_preferred_types(self, history: InteractionHistory) -> Dict[str, int]:
+        """Analyze which types of recommendations user prefers (accepted count per type)"""
+        return history.accepted_types()
     
-    def _calculate_confidence_trend(self, interactions: List[Dict[str, Any]]) -> str:
-        """Calculate AI confidence trend"""
-        if len(interactions) < 5:
+    def _calculate_confidence_trend(self, history: InteractionHistory) -> str:
+        """Calculate AI confidence trend over the recommendations the user gave feedback on"""
+        count, first_avg, second_avg = history.half_confidence_means()
+        if count < 5:
             return 'establishing_baseline'
         
-        # This would require tracking confidence scores in interactions
-        # For now, return placeholder
-        return 'stable'
+        if second_avg > first_avg + CONFIDENCE_TREND_DELTA:
+            return 'increasing'
+        elif second_avg < first_avg - CONFIDENCE_TREND_DELTA:
+            return 'decreasing'
+        else:
+            return 'stable'
+    
+    def get_recommendation_type_stats(self) -> Dict[str, Any]:
+        """All-time issued/feedback counters, mean confidence and acceptance rate per recommendation type"""
+        return self.tweak_registry.stats()
     
     def _generate_coaching_recommendations(
         self, 
         profile: UserPreferenceProfile, 
-        interactions: List[Dict[str, Any]]
+        interactions: InteractionHistory
     ) -> List[str]:
         """Generate meta-recommendations for improving coaching"""
         
@@ -795,11 +1564,17 @@ JSON:"""
 enhanced_ai_engine = None
 
 def initialize_enhanced_engine(model=None, tokenizer=None):
-    """Initialize the enhanced AI engine"""
+    """Initialize the enhanced AI engine, flushing the one it replaces"""
     global enhanced_ai_engine
+    shutdown_enhanced_engine()
     enhanced_ai_engine = EnhancedAIEngine(model, tokenizer)
     return enhanced_ai_engine
 
 def get_enhanced_engine() -> Optional[EnhancedAIEngine]:
     """Get the global enhanced AI engine instance"""
-    return enhanced_ai_engine
\ No newline at end of file
+    return enhanced_ai_engine
+
+def shutdown_enhanced_engine():
+    """Flush pending profile writes of the global engine; call from the server's shutdown hook"""
+    if enhanced_ai_engine is not None:
+        enhanced_ai_engine.shutdown()
\ No newline at end of file
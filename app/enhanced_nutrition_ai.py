@@ -6,15 +6,33 @@ Implements recovery-aware nutrition adjustments, safety monitoring, and personal
 import json
 import logging
 import numpy as np
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, Iterable, Iterator, List, Any, Optional, Tuple
 from dataclasses import dataclass, asdict
 from datetime import datetime, timedelta
-from collections import defaultdict
-import pickle
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import chain, islice
+import argparse
+import copy
+import hashlib
+import multiprocessing
 import os
+import threading
+import time
+
+try:
+    from .profile_store import LazyLRUMap, ProfileStore
+except ImportError:
+    from profile_store import LazyLRUMap, ProfileStore
 
 logger = logging.getLogger(__name__)
 
+# Health/preference records live next to this module unless NUTRITION_PROFILES_PATH says otherwise
+DEFAULT_PROFILES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'user_health_profiles.db')
+# Whole-file pickle written by earlier versions
+LEGACY_PROFILES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'user_health_profiles.pkl')
+
 @dataclass
 class UserHealthProfile:
     """Comprehensive health profile for nutrition safety"""
@@ -47,6 +65,84 @@ class UserHealthProfile:
         if self.has_heart_condition() or 'hypertension' in self.medical_conditions:
             return 1500  # mg per day for heart/BP issues
         return 2300  # mg per day general recommendation
+    
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        # Any field change invalidates the compiled safety policy
+        if name != '_safety_policy':
+            object.__setattr__(self, '_safety_policy', None)
+    
+    def safety_policy(self) -> 'SafetyPolicy':
+        """Compiled safety checks for this profile, built on first use and cached until a field is set
+        
+        Call invalidate_safety_policy after mutating a field in place (e.g. appending a medication).
+        """
+        policy = getattr(self, '_safety_policy', None)
+        if policy is None:
+            policy = SafetyPolicy(self)
+            object.__setattr__(self, '_safety_policy', policy)
+        return policy
+    
+    def invalidate_safety_policy(self):
+        object.__setattr__(self, '_safety_policy', None)
+
+class SafetyPolicy:
+    """A UserHealthProfile's recommendation safety checks, precompiled for O(1) lookups
+    
+    Holds the protein/sodium limits and diabetes flag, and indexes every medication's
+    ``nutritionInteractions`` token by the first medication listing it, so matching an
+    action costs O(len(action)^2) lookups regardless of how many medications the user
+    takes; verdicts are memoized per action. Profiles whose data the scalar checks would
+    reject (or raise on) are marked ``irregular`` and checked the uncompiled way.
+    """
+    
+    __slots__ = ('protein_limit', 'sodium_limit', 'diabetes', 'irregular',
+                 '_medications', '_tokens', '_token_lengths', '_verdicts')
+    
+    DIABETES_BLOCKED_ACTIONS = frozenset({'increase_simple_carbs', 'add_sugar'})
+    MAX_MEMOIZED_ACTIONS = 256
+    
+    def __init__(self, profile: UserHealthProfile):
+        self.irregular = False
+        self._medications: List[Dict[str, Any]] = []
+        self._tokens: Dict[str, int] = {}  # interaction token -> index of the first medication listing it
+        self._verdicts: Dict[str, Optional[int]] = {}
+        try:
+            self.protein_limit = profile.get_protein_limit()
+            self.sodium_limit = profile.get_sodium_limit()
+            self.diabetes = bool(profile.has_diabetes())
+            self._medications = list(profile.medications)
+            for index, medication in enumerate(self._medications):
+                for nutrient in medication.get('nutritionInteractions', []):
+                    if not isinstance(nutrient, str):
+                        self.irregular = True
+                    self._tokens.setdefault(nutrient, index)
+        except Exception:
+            self.irregular = True
+        self._token_lengths = sorted({len(token) for token in self._tokens if isinstance(token, str)})
+    
+    def interacting_medication(self, action: str) -> Optional[Dict[str, Any]]:
+        """First medication with a nutritionInteractions token contained in ``action`` (case-insensitive)"""
+        if not self._tokens:
+            return None
+        try:
+            index = self._verdicts[action]
+        except KeyError:
+            index = self._match(action.lower())
+            if len(self._verdicts) < self.MAX_MEMOIZED_ACTIONS:
+                self._verdicts[action] = index
+        return self._medications[index] if index is not None else None
+    
+    def _match(self, text: str) -> Optional[int]:
+        first = None
+        for length in self._token_lengths:
+            if length > len(text):
+                break
+            for start in range(len(text) - length + 1):
+                index = self._tokens.get(text[start:start + length])
+                if index is not None and (first is None or index < first):
+                    first = index
+        return first
 
 @dataclass
 class RecoveryMetrics:
@@ -91,7 +187,30 @@ class NutritionRecommendation:
     expires_at: Optional[float]
     
     def is_safe_for_user(self, health_profile: UserHealthProfile) -> Tuple[bool, List[str]]:
-        """Check if recommendation is safe given user's health profile"""
+        """Check if recommendation is safe given user's health profile (via its compiled SafetyPolicy)"""
+        policy = health_profile.safety_policy()
+        if policy.irregular or type(self.action) is not str:
+            return self._check_safety(health_profile)
+        
+        if self.action == 'increase_protein' and self.target_value:
+            if policy.protein_limit and self.target_value > policy.protein_limit:
+                return False, ["Protein recommendation exceeds safe limit for kidney/diabetes conditions"]
+        
+        if self.action == 'adjust_sodium' and self.target_value:
+            if policy.sodium_limit and self.target_value > policy.sodium_limit:
+                return False, ["Sodium recommendation exceeds safe limit for heart/BP conditions"]
+        
+        if policy.diabetes and self.action in policy.DIABETES_BLOCKED_ACTIONS:
+            return False, ["Recommendation not suitable for diabetes management"]
+        
+        medication = policy.interacting_medication(self.action)
+        if medication is not None:
+            return False, [f"Potential interaction with medication: {medication['name']}"]
+        
+        return True, []
+    
+    def _check_safety(self, health_profile: UserHealthProfile) -> Tuple[bool, List[str]]:
+        """Uncompiled safety checks, scanning the health profile on every call"""
         warnings = []
         
         # Protein safety checks
@@ -123,6 +242,84 @@ class NutritionRecommendation:
         
         return True, warnings
 
+# Columns of the intake matrices passed to check_daily_intake_batch
+INTAKE_NUTRIENTS = ('calories', 'protein', 'sodium')
+# Alert columns of IntakeAlerts, in the order check_daily_intake reports them
+INTAKE_ALERT_TYPES = ('excessive_deficit', 'excessive_surplus', 'protein_deficiency', 'excessive_protein', 'excessive_sodium')
+# Severity codes of IntakeAlerts.severity (0 = no alert)
+SEVERITY_LEVELS = ('none', 'warning', 'critical')
+WARNING, CRITICAL = 1, 2
+
+def intake_matrix(intakes: Iterable[Dict[str, float]]) -> np.ndarray:
+    """users x INTAKE_NUTRIENTS float64 matrix of daily intakes; missing nutrients are 0"""
+    return np.array([[intake.get(nutrient, 0) for nutrient in INTAKE_NUTRIENTS] for intake in intakes],
+                    dtype=np.float64).reshape(-1, len(INTAKE_NUTRIENTS))
+
+@dataclass
+class HealthLimits:
+    """Per-user safety limits derived from UserHealthProfile, one array entry per user"""
+    protein_limit: np.ndarray  # g/kg, NaN where the profile sets no specific limit
+    sodium_limit: np.ndarray  # mg/day (int64)
+    kidney_issues: np.ndarray  # bool
+    heart_condition: np.ndarray  # bool
+    
+    @classmethod
+    def from_profiles(cls, profiles: Iterable[UserHealthProfile]) -> 'HealthLimits':
+        profiles = list(profiles)
+        protein = [p.get_protein_limit() for p in profiles]
+        return cls(
+            protein_limit=np.array([np.nan if limit is None else limit for limit in protein], dtype=np.float64),
+            sodium_limit=np.array([p.get_sodium_limit() for p in profiles], dtype=np.int64),
+            kidney_issues=np.array([bool(p.has_kidney_issues()) for p in profiles], dtype=bool),
+            heart_condition=np.array([bool(p.has_heart_condition()) for p in profiles], dtype=bool)
+        )
+    
+    def __len__(self) -> int:
+        return len(self.sodium_limit)
+
+@dataclass
+class IntakeAlerts:
+    """Result of check_daily_intake_batch: users x INTAKE_ALERT_TYPES alert masks and severities"""
+    mask: np.ndarray  # bool
+    severity: np.ndarray  # int8 SEVERITY_LEVELS codes, 0 where there is no alert
+    action_required: np.ndarray  # bool
+    calories_per_kg: np.ndarray
+    protein_per_kg: np.ndarray
+    max_protein: np.ndarray
+    sodium_mg: np.ndarray
+    sodium_limit: np.ndarray
+    thresholds: Dict[str, float]
+    
+    def alerts(self, user: int) -> List[Dict[str, Any]]:
+        """One user's alerts in the format of check_daily_intake"""
+        t = self.thresholds
+        messages = {
+            'excessive_deficit': lambda: f"Dangerously low calorie intake: {float(self.calories_per_kg[user]):.1f} cal/kg (min: {t['min_calories_per_kg']})",
+            'excessive_surplus': lambda: f"Very high calorie intake: {float(self.calories_per_kg[user]):.1f} cal/kg",
+            'protein_deficiency': lambda: f"Low protein intake: {float(self.protein_per_kg[user]):.1f}g/kg (min: {t['min_protein_per_kg']})",
+            'excessive_protein': lambda: f"High protein intake: {float(self.protein_per_kg[user]):.1f}g/kg (max: {float(self.max_protein[user])})",
+            'excessive_sodium': lambda: f"High sodium intake: {float(self.sodium_mg[user]):.0f}mg (limit: {int(self.sodium_limit[user])}mg)",
+        }
+        return [
+            {
+                'type': alert_type,
+                'severity': SEVERITY_LEVELS[self.severity[user, column]],
+                'message': messages[alert_type](),
+                'action_required': bool(self.action_required[user, column])
+            }
+            for column, alert_type in enumerate(INTAKE_ALERT_TYPES) if self.mask[user, column]
+        ]
+    
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        """Users with each alert type, by severity"""
+        return {
+            alert_type: {
+                level: int(np.count_nonzero(self.severity[:, column] == code))
+                for code, level in enumerate(SEVERITY_LEVELS) if code
+            }
+            for column, alert_type in enumerate(INTAKE_ALERT_TYPES)
+        }
+
 class NutritionSafetyMonitor:
     """Monitors nutrition intake for safety violations"""
     
@@ -194,38 +391,150 @@ class NutritionSafetyMonitor:
             })
         
         return alerts
+    
+    def check_daily_intake_batch(self, intake: np.ndarray, limits: HealthLimits,
+                                 body_weight_kg: np.ndarray) -> IntakeAlerts:
+        """check_daily_intake for every row of a users x INTAKE_NUTRIENTS intake matrix in one pass
+        
+        Same thresholds and branch order as the scalar check, evaluated as array masks;
+        ``IntakeAlerts.alerts(i)`` rebuilds row ``i``'s alert list. Body weights must be
+        positive (the scalar check raises ZeroDivisionError on 0).
+        """
+        intake = np.asarray(intake, dtype=np.float64).reshape(-1, len(INTAKE_NUTRIENTS))
+        weight = np.broadcast_to(np.asarray(body_weight_kg, dtype=np.float64), (intake.shape[0],))
+        t = self.safety_thresholds
+        n = intake.shape[0]
+        mask = np.zeros((n, len(INTAKE_ALERT_TYPES)), dtype=bool)
+        severity = np.zeros(mask.shape, dtype=np.int8)
+        action = np.zeros(mask.shape, dtype=bool)
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            calories_per_kg = intake[:, 0] / weight
+            protein_per_kg = intake[:, 1] / weight
+        sodium_mg = intake[:, 2]
+        max_protein = np.where(np.isnan(limits.protein_limit) | (limits.protein_limit == 0),
+                               t['max_protein_per_kg'], limits.protein_limit)
+        
+        # Calories: deficit, else surplus
+        mask[:, 0] = calories_per_kg < t['min_calories_per_kg']
+        mask[:, 1] = ~mask[:, 0] & (calories_per_kg > t['max_calories_per_kg'])
+        severity[:, 0] = np.where(mask[:, 0], CRITICAL, 0)
+        severity[:, 1] = np.where(mask[:, 1], WARNING, 0)
+        action[:, 0] = mask[:, 0]
+        
+        # Protein: deficiency, else above the (condition-specific) maximum
+        mask[:, 2] = protein_per_kg < t['min_protein_per_kg']
+        mask[:, 3] = ~mask[:, 2] & (protein_per_kg > max_protein)
+        severity[:, 2] = np.where(mask[:, 2], WARNING, 0)
+        severity[:, 3] = np.where(mask[:, 3], np.where(limits.kidney_issues, CRITICAL, WARNING), 0)
+        action[:, 2] = mask[:, 2]
+        action[:, 3] = mask[:, 3] & limits.kidney_issues
+        
+        # Sodium
+        mask[:, 4] = sodium_mg > limits.sodium_limit
+        severity[:, 4] = np.where(mask[:, 4], np.where(limits.heart_condition, CRITICAL, WARNING), 0)
+        action[:, 4] = mask[:, 4] & limits.heart_condition
+        
+        return IntakeAlerts(
+            mask=mask, severity=severity, action_required=action,
+            calories_per_kg=calories_per_kg, protein_per_kg=protein_per_kg, max_protein=max_protein,
+            sodium_mg=sodium_mg, sodium_limit=limits.sodium_limit, thresholds=t
+        )
 
 class EnhancedNutritionAI:
     """Enhanced Nutrition AI Engine with recovery awareness and safety monitoring"""
     
-    def __init__(self):
+    def __init__(self, profiles_path: Optional[str] = None, legacy_profiles_path: Optional[str] = None,
+                 cache_size: Optional[int] = None):
         self.safety_monitor = NutritionSafetyMonitor()
         self.model_version = "nutrition-ai-v1.0"
         
-        # Load user profiles cache
-        self.user_profiles_cache = {}
+        # Per-user records in a keyed store, one atomic upsert per feedback; opened on first use
+        self.profiles_path = profiles_path or os.getenv("NUTRITION_PROFILES_PATH") or DEFAULT_PROFILES_PATH
+        # A legacy pickle is only imported when configured; see migrate_legacy_profiles / --migrate
+        self.legacy_profiles_path = legacy_profiles_path or os.getenv("NUTRITION_LEGACY_PROFILES_PATH")
+        self._profile_store: Optional[ProfileStore] = None
+        self._store_lock = threading.Lock()
+        
+        # Read-through cache of recently used records
+        self.user_profiles_cache = LazyLRUMap(
+            self._load_user_profile,
+            max_resident=cache_size or int(os.getenv("NUTRITION_PROFILE_CACHE_SIZE", 10000)),
+            keys_source=lambda: self.profile_store.keys()
+        )
         self.load_user_profiles()
     
+    @property
+    def profile_store(self) -> ProfileStore:
+        with self._store_lock:
+            if self._profile_store is None:
+                self._profile_store = ProfileStore(self.profiles_path, table="health_profiles")
+            return self._profile_store
+    
     def load_user_profiles(self):
-        """Load cached user health profiles"""
+        """Import the configured legacy pickle, if any; records themselves are read through the cache"""
+        if not self.legacy_profiles_path:
+            return
         try:
-            if os.path.exists('user_health_profiles.pkl'):
-                with open('user_health_profiles.pkl', 'rb') as f:
-                    self.user_profiles_cache = pickle.load(f)
-                logger.info(f"Loaded {len(self.user_profiles_cache)} user health profiles from cache")
+            self.migrate_legacy_profiles(self.legacy_profiles_path)
         except Exception as e:
-            logger.error(f"Error loading user profiles: {e}")
-            self.user_profiles_cache = {}
+            logger.error(f"Error migrating user profiles from {self.legacy_profiles_path}: {e}")
+    
+    def migrate_legacy_profiles(self, pickle_path: str = LEGACY_PROFILES_PATH) -> int:
+        """One-time import of a ``user_health_profiles.pkl`` into the keyed store (renamed to *.migrated)"""
+        imported = self.profile_store.migrate_from_pickle(pickle_path)
+        if imported:
+            logger.info(f"Migrated {imported} user health profiles from {pickle_path}")
+        return imported
+    
+    def _load_user_profile(self, user_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            return self.profile_store.get(user_id)
+        except Exception as e:
+            logger.error(f"Error loading user profile {user_id}: {e}")
+            return None
+    
+    def _save_user_profile(self, user_id: str, record: Dict[str, Any]):
+        """Upsert one user's updated record"""
+        try:
+            self.profile_store.put(user_id, record)
+        except Exception as e:
+            logger.error(f"Error saving user profile {user_id}: {e}")
     
     def save_user_profiles(self):
-        """Save user health profiles to cache"""
+        """Persist every cached user record in one transaction"""
         try:
-            with open('user_health_profiles.pkl', 'wb') as f:
-                pickle.dump(self.user_profiles_cache, f)
-            logger.info(f"Saved {len(self.user_profiles_cache)} user health profiles to cache")
+            saved = self.profile_store.put_many(self.user_profiles_cache.resident_items())
+            logger.info(f"Saved {saved} user health profiles")
         except Exception as e:
             logger.error(f"Error saving user profiles: {e}")
     
+    def close(self):
+        with self._store_lock:
+            if self._profile_store is not None:
+                self._profile_store.close()
+                self._profile_store = None
+    
+    def safety_sweep(self, intake: np.ndarray, limits: HealthLimits, body_weight_kg: np.ndarray,
+                     user_ids: Optional[List[str]] = None, max_listed: int = 100) -> Dict[str, Any]:
+        """Population-wide daily intake safety check (vectorized check_daily_intake over every user)
+        
+        ``intake`` is a users x INTAKE_NUTRIENTS matrix (see intake_matrix) and ``limits``
+        the users' HealthLimits, built once from their profiles. Lists up to ``max_listed``
+        users with a critical alert (by id when ``user_ids`` is given, else by row).
+        """
+        started = time.perf_counter()
+        alerts = self.safety_monitor.check_daily_intake_batch(intake, limits, body_weight_kg)
+        critical = np.flatnonzero((alerts.severity == CRITICAL).any(axis=1))[:max_listed].tolist()
+        return {
+            'users': int(alerts.mask.shape[0]),
+            'users_with_alerts': int(np.count_nonzero(alerts.mask.any(axis=1))),
+            'users_action_required': int(np.count_nonzero(alerts.action_required.any(axis=1))),
+            'alert_counts': alerts.counts(),
+            'critical_users': [user_ids[i] for i in critical] if user_ids is not None else critical,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 3)
+        }
+    
     def get_recovery_adjusted_goals(self, user_id: str, base_goals: Dict[str, float],
                                    recovery_metrics: RecoveryMetrics) -> Dict[str, Any]:
         """Calculate recovery-adjusted nutrition goals"""
@@ -539,36 +848,39 @@ class EnhancedNutritionAI:
     def _update_user_preferences(self, user_id: str, feedback_data: Dict[str, Any]):
         """Update user preference learning based on feedback"""
         
-        if user_id not in self.user_profiles_cache:
-            self.user_profiles_cache[user_id] = {
-                'nutrition_preferences': {
-                    'protein_acceptance_rate': 0.5,
-                    'hydration_acceptance_rate': 0.5,
-                    'recovery_recommendation_acceptance': 0.5,
-                    'modification_frequency': 0.0,
-                    'total_recommendations': 0,
-                    'total_accepted': 0
-                }
+        # Created if missing and saved inside the block, before the cache may evict it
+        with self.user_profiles_cache.checkout(user_id, self._new_user_record) as record:
+            profile = record['nutrition_preferences']
+            profile['total_recommendations'] += 1
+            
+            if feedback_data['accepted']:
+                profile['total_accepted'] += 1
+            
+            if feedback_data.get('modified_value') is not None:
+                profile['modification_frequency'] = (profile['modification_frequency'] * 0.9 + 0.1)
+            
+            # Update acceptance rates with exponential moving average
+            alpha = 0.1  # Learning rate
+            if 'protein' in feedback_data.get('recommendation_id', ''):
+                current_rate = profile['protein_acceptance_rate']
+                new_value = 1.0 if feedback_data['accepted'] else 0.0
+                profile['protein_acceptance_rate'] = current_rate * (1 - alpha) + new_value * alpha
+            
+            # Save updated profile
+            self._save_user_profile(user_id, record)
+    
+    @staticmethod
+    def _new_user_record() -> Dict[str, Any]:
+        return {
+            'nutrition_preferences': {
+                'protein_acceptance_rate': 0.5,
+                'hydration_acceptance_rate': 0.5,
+                'recovery_recommendation_acceptance': 0.5,
+                'modification_frequency': 0.0,
+                'total_recommendations': 0,
+                'total_accepted': 0
             }
-        
-        profile = self.user_profiles_cache[user_id]['nutrition_preferences']
-        profile['total_recommendations'] += 1
-        
-        if feedback_data['accepted']:
-            profile['total_accepted'] += 1
-        
-        if feedback_data.get('modified_value') is not None:
-            profile['modification_frequency'] = (profile['modification_frequency'] * 0.9 + 0.1)
-        
-        # Update acceptance rates with exponential moving average
-        alpha = 0.1  # Learning rate
-        if 'protein' in feedback_data.get('recommendation_id', ''):
-            current_rate = profile['protein_acceptance_rate']
-            new_value = 1.0 if feedback_data['accepted'] else 0.0
-            profile['protein_acceptance_rate'] = current_rate * (1 - alpha) + new_value * alpha
-        
-        # Save updated profile
-        self.save_user_profiles()
+        }
     
     def get_nutrition_insights(self, user_id: str, days: int = 7) -> Dict[str, Any]:
         """Generate nutrition insights and analytics"""
@@ -601,8 +913,98 @@ class EnhancedNutritionAI:
             }
         }
 
+# health_data fields that make up a UserHealthProfile, with their container types
+HEALTH_PROFILE_FIELDS = (
+    ('medical_conditions', list), ('allergies', list), ('medications', list),
+    ('safety_flags', dict), ('metabolic_data', dict)
+)
+
+def parse_health_profile(user_id: str, health_data: Dict[str, Any]) -> UserHealthProfile:
+    """Validated UserHealthProfile from request ``health_data``; missing or null fields are empty"""
+    values = {}
+    for name, kind in HEALTH_PROFILE_FIELDS:
+        value = health_data.get(name)
+        if value is None:
+            value = kind()
+        elif not isinstance(value, kind):
+            raise ValueError(f"health_data.{name} must be a {kind.__name__}, got {type(value).__name__}")
+        values[name] = copy.deepcopy(value)
+    return UserHealthProfile(user_id=user_id, **values)
+
+class HealthProfileCache:
+    """LRU + TTL cache of parsed health profiles, one per user, keyed by a digest of their health data
+    
+    Requests whose health data is unchanged get the same UserHealthProfile object back,
+    so its compiled SafetyPolicy is reused too; changed data replaces the user's entry.
+    Cached profiles are shared and must not be modified by callers.
+    """
+    
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, str, UserHealthProfile]]" = OrderedDict()
+        self._lock = threading.Lock()
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    @staticmethod
+    def fingerprint(health_data: Dict[str, Any]) -> str:
+        """Hash of the profile fields of ``health_data`` (sorted JSON)"""
+        canonical = json.dumps({name: health_data.get(name) for name, _ in HEALTH_PROFILE_FIELDS},
+                               sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+    
+    def get_or_parse(self, user_id: str, health_data: Dict[str, Any]) -> UserHealthProfile:
+        digest = self.fingerprint(health_data)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                stored_at, stored_digest, profile = entry
+                if stored_digest == digest and time.monotonic() - stored_at <= self.ttl_seconds:
+                    self._entries.move_to_end(user_id)
+                    self.hits += 1
+                    return profile
+                if stored_digest == digest:
+                    self.expirations += 1
+                del self._entries[user_id]
+            self.misses += 1
+        
+        profile = parse_health_profile(user_id, health_data)
+        if self.max_entries > 0:
+            with self._lock:
+                self._entries[user_id] = (time.monotonic(), digest, profile)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return profile
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
 # Initialize the enhanced nutrition AI engine
 nutrition_ai_engine = EnhancedNutritionAI()
+health_profile_cache = HealthProfileCache(
+    max_entries=int(os.getenv("HEALTH_PROFILE_CACHE_MAX_ENTRIES", 10000)),
+    ttl_seconds=float(os.getenv("HEALTH_PROFILE_CACHE_TTL", 3600))
+)
 
 # Export functions for FastAPI integration
 def get_nutrition_recommendations(user_id: str, health_data: Dict[str, Any],
@@ -612,15 +1014,8 @@ def get_nutrition_recommendations(user_id: str, health_data: Dict[str, Any],
     """Main API function for getting nutrition recommendations"""
     
     try:
-        # Parse health profile
-        health_profile = UserHealthProfile(
-            user_id=user_id,
-            medical_conditions=health_data.get('medical_conditions', []),
-            allergies=health_data.get('allergies', []),
-            medications=health_data.get('medications', []),
-            safety_flags=health_data.get('safety_flags', {}),
-            metabolic_data=health_data.get('metabolic_data', {})
-        )
+        # Parsed health profile, reused while the user's health data is unchanged
+        health_profile = health_profile_cache.get_or_parse(user_id, health_data)
         
         # Parse recovery metrics
         recovery_metrics = RecoveryMetrics(
@@ -679,6 +1074,129 @@ def get_nutrition_recommendations(user_id: str, health_data: Dict[str, Any],
             'fallback_message': 'Unable to generate personalized recommendations. Please consult with a nutritionist.'
         }
 
+# Batch recommendations (e.g. the nightly morning-plan job): users per worker task, worker processes
+# shared by every batch call, and how long to wait on one chunk before computing it in-process
+NUTRITION_BATCH_CHUNK_SIZE = int(os.getenv("NUTRITION_BATCH_CHUNK_SIZE", 64))
+NUTRITION_BATCH_WORKERS = max(1, int(os.getenv("NUTRITION_BATCH_WORKERS", 2)))
+NUTRITION_BATCH_CHUNK_TIMEOUT = float(os.getenv("NUTRITION_BATCH_CHUNK_TIMEOUT", 120))
+
+_batch_pool: Optional[ProcessPoolExecutor] = None
+_batch_pool_lock = threading.Lock()
+
+def start_batch_pool() -> ProcessPoolExecutor:
+    """The process pool shared by every batch call; created once, by the server's startup hook or first use
+    
+    Workers are spawned rather than forked: the serving process holds the model, worker
+    threads and locks, and a forked child inheriting a lock held by another thread would
+    hang on it. Processes start on the first submitted chunk.
+    """
+    global _batch_pool
+    with _batch_pool_lock:
+        if _batch_pool is None:
+            _batch_pool = ProcessPoolExecutor(max_workers=NUTRITION_BATCH_WORKERS,
+                                              mp_context=multiprocessing.get_context("spawn"))
+        return _batch_pool
+
+def shutdown_batch_pool(pool: Optional[ProcessPoolExecutor] = None) -> None:
+    """Stop the batch worker processes (only if ``pool`` is still the current one, when given)"""
+    global _batch_pool
+    with _batch_pool_lock:
+        if pool is not None and pool is not _batch_pool:
+            return
+        pool, _batch_pool = _batch_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def _batch_item_kwargs(item: Any) -> Dict[str, Any]:
+    """get_nutrition_recommendations arguments of one batch item, validated like a single request"""
+    if not isinstance(item, dict):
+        raise ValueError("each request must be an object")
+    user_id = item.get('user_id')
+    if not isinstance(user_id, str) or not user_id:
+        raise ValueError("user_id must be a non-empty string")
+    kwargs: Dict[str, Any] = {'user_id': user_id}
+    for field in ('health_data', 'recovery_data', 'current_intake', 'goals'):
+        value = item.get(field)
+        if value is None:
+            value = {}
+        elif not isinstance(value, dict):
+            raise ValueError(f"{field} must be an object")
+        if field in ('current_intake', 'goals'):
+            try:
+                value = {str(key): float(amount) for key, amount in value.items()}
+            except (TypeError, ValueError):
+                raise ValueError(f"{field} values must be numbers")
+        kwargs[field] = value
+    return kwargs
+
+def _batch_item_result(index: int, item: Any) -> Dict[str, Any]:
+    """get_nutrition_recommendations for one batch item, tagged with its position; never raises"""
+    user_id = item.get('user_id') if isinstance(item, dict) else None
+    try:
+        result = get_nutrition_recommendations(**_batch_item_kwargs(item))
+    except Exception as e:
+        logger.error(f"Invalid nutrition batch item {index}: {e}")
+        result = {'success': False, 'error': f"Invalid request: {e}"}
+    return {'index': index, 'user_id': user_id if isinstance(user_id, str) else None, **result}
+
+def _recommend_chunk(chunk: List[Tuple[int, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Worker task: results for one chunk of ``(index, item)`` pairs"""
+    return [_batch_item_result(index, item) for index, item in chunk]
+
+def get_nutrition_recommendations_batch(requests: Iterable[Dict[str, Any]],
+                                        workers: Optional[int] = None,
+                                        chunk_size: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """get_nutrition_recommendations for many users, yielded in input order as they complete
+    
+    Each request is a dict of get_nutrition_recommendations arguments, validated per item.
+    Chunks of ``chunk_size`` users run in the shared batch pool (see start_batch_pool),
+    with at most ``workers * 2`` chunks of this call in flight, so arbitrarily long inputs
+    stream with bounded memory; ``workers=1`` computes everything in this process. Every
+    result carries its ``index`` and ``user_id``; a failing item only fails its own
+    result, and a chunk whose worker fails or exceeds NUTRITION_BATCH_CHUNK_TIMEOUT is
+    recomputed in this process.
+    """
+    workers = max(1, workers or NUTRITION_BATCH_WORKERS)
+    chunk_size = max(1, chunk_size or NUTRITION_BATCH_CHUNK_SIZE)
+    items = enumerate(requests)
+    chunks = iter(lambda: list(islice(items, chunk_size)), [])
+    
+    # Small batches are not worth a round trip to the workers
+    head = list(islice(chunks, 2))
+    if workers == 1 or len(head) < 2:
+        for chunk in chain(head, chunks):
+            yield from _recommend_chunk(chunk)
+        return
+    
+    pool = start_batch_pool()
+    pending = deque()
+    try:
+        for chunk in chain(head, chunks):
+            try:
+                future = pool.submit(_recommend_chunk, chunk)
+            except BrokenProcessPool:
+                # A worker died; start a fresh pool for later chunks and calls
+                shutdown_batch_pool(pool)
+                pool = start_batch_pool()
+                future = pool.submit(_recommend_chunk, chunk)
+            pending.append((chunk, future))
+            if len(pending) >= workers * 2:
+                yield from _chunk_results(*pending.popleft())
+        while pending:
+            yield from _chunk_results(*pending.popleft())
+    finally:
+        # Also reached when the consumer stops early (e.g. the client disconnected)
+        for _, future in pending:
+            future.cancel()
+
+def _chunk_results(chunk: List[Tuple[int, Dict[str, Any]]], future) -> List[Dict[str, Any]]:
+    try:
+        return future.result(timeout=NUTRITION_BATCH_CHUNK_TIMEOUT)
+    except Exception as e:
+        future.cancel()
+        logger.error(f"Nutrition batch worker failed, recomputing {len(chunk)} items in-process: {e!r}")
+        return _recommend_chunk(chunk)
+
 def process_nutrition_feedback(user_id: str, recommendation_id: str,
                              feedback_data: Dict[str, Any]) -> Dict[str, Any]:
     """API function for processing nutrition feedback"""
@@ -732,4 +1250,22 @@ def get_hydration_recommendations(user_id: str, recovery_data: Dict[str, Any],
                     'completed': False
                 }
             ]
-        }
\ No newline at end of file
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Enhanced Nutrition AI profile store maintenance")
+    parser.add_argument("--migrate", nargs="?", const=LEGACY_PROFILES_PATH, metavar="PICKLE",
+                        help=f"Import a legacy profile pickle into the store (default {LEGACY_PROFILES_PATH})")
+    parser.add_argument("--store", help="Profile store path (default NUTRITION_PROFILES_PATH or next to this module)")
+    args = parser.parse_args()
+    
+    if args.migrate:
+        engine = EnhancedNutritionAI(profiles_path=args.store)
+        imported = engine.migrate_legacy_profiles(args.migrate)
+        print(f"Imported {imported} user health profiles into {engine.profiles_path}")
+        engine.close()
+    else:
+        parser.print_help()
+
+if __name__ == "__main__":
+    main()
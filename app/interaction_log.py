@@ -0,0 +1,148 @@
+"""
+Append-only interaction log for Adaptive fIt AI engines
+Stores each user's interactions as newline-delimited JSON segments, one file per
+UTC day under ``<root>/<user>/<YYYY-MM-DD>.jsonl``. Appends only ever write to the
+end of today's segment, old days are dropped whole once they fall out of the
+retention window, and reads memory-map the segments instead of loading them, so
+recent interactions can be tailed without touching the rest of the history.
+"""
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import shutil
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+from urllib.parse import quote
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = ".jsonl"
+
+class InteractionLog:
+    """Per-user, per-day segmented log of interaction records
+
+    - ``append`` adds one JSON line to the user's segment for the record's day
+    - ``tail`` returns the last N records, scanning segments newest-first from the end
+    - Segments older than ``retention_days`` are deleted when a user starts a new day
+    - A line torn by a crash is skipped on read and never glued to the next append
+    """
+
+    def __init__(self, root: str, retention_days: int = 90):
+        if retention_days < 1:
+            raise ValueError("retention_days must be at least 1")
+        self.root = root
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+        # user -> day of the newest segment seen, so retention runs once per user per day
+        self._current_day: Dict[str, str] = {}
+        os.makedirs(root, exist_ok=True)
+
+        # Metrics
+        self.appends = 0
+        self.bytes_written = 0
+        self.tail_reads = 0
+        self.segments_pruned = 0
+        self.corrupt_records = 0
+
+    def _user_dir(self, user_id: str) -> str:
+        name = quote(user_id, safe="")
+        if len(name) > 128 or name.startswith("."):
+            name = "_" + hashlib.sha256(user_id.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, name)
+
+    @staticmethod
+    def _day(timestamp: Optional[float]) -> str:
+        moment = datetime.fromtimestamp(timestamp, timezone.utc) if timestamp is not None else datetime.now(timezone.utc)
+        return moment.strftime("%Y-%m-%d")
+
+    def segments(self, user_id: str) -> List[str]:
+        """Paths of the user's segments, oldest day first"""
+        directory = self._user_dir(user_id)
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            return []
+        return [os.path.join(directory, name) for name in sorted(names) if name.endswith(SEGMENT_SUFFIX)]
+
+    def append(self, user_id: str, record: Dict[str, Any]) -> None:
+        """Append one record to the segment of its ``timestamp`` day (now if absent)"""
+        day = self._day(record.get("timestamp"))
+        line = (json.dumps(record, default=str, separators=(",", ":")) + "\n").encode("utf-8")
+        directory = self._user_dir(user_id)
+        path = os.path.join(directory, day + SEGMENT_SUFFIX)
+
+        with self._lock:
+            if self._current_day.get(user_id) != day:
+                os.makedirs(directory, exist_ok=True)
+                self._prune(user_id, day)
+                self._current_day[user_id] = max(day, self._current_day.get(user_id, day))
+            with open(path, "a+b") as f:
+                # Start on a fresh line if a previous write was torn
+                size = os.fstat(f.fileno()).st_size
+                if size > 0 and os.pread(f.fileno(), 1, size - 1) != b"\n":
+                    line = b"\n" + line
+                f.write(line)
+            self.appends += 1
+            self.bytes_written += len(line)
+
+    def _prune(self, user_id: str, today: str) -> None:
+        cutoff = (datetime.strptime(today, "%Y-%m-%d") - timedelta(days=self.retention_days - 1)).strftime("%Y-%m-%d")
+        for path in self.segments(user_id):
+            if os.path.basename(path)[:-len(SEGMENT_SUFFIX)] >= cutoff:
+                break
+            try:
+                os.remove(path)
+                self.segments_pruned += 1
+            except OSError as e:
+                logger.warning(f"Could not remove expired interaction segment {path}: {e}")
+
+    def _decode(self, line: bytes) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads(line)
+        except ValueError:
+            self.corrupt_records += 1
+            return None
+
+    def tail(self, user_id: str, n: int) -> List[Dict[str, Any]]:
+        """The user's last ``n`` records, oldest first"""
+        self.tail_reads += 1
+        records: List[Dict[str, Any]] = []  # newest first
+        for path in reversed(self.segments(user_id)):
+            if len(records) >= n:
+                break
+            with open(path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                if size == 0:
+                    continue
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as segment:
+                    end = size
+                    while end > 0 and len(records) < n:
+                        start = segment.rfind(b"\n", 0, end - 1) + 1
+                        line = segment[start:end].strip()
+                        record = self._decode(line) if line else None
+                        if record is not None:
+                            records.append(record)
+                        end = start
+        records.reverse()
+        return records
+
+    def delete_user(self, user_id: str) -> None:
+        """Remove every segment of one user"""
+        with self._lock:
+            shutil.rmtree(self._user_dir(user_id), ignore_errors=True)
+            self._current_day.pop(user_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "root": self.root,
+            "retention_days": self.retention_days,
+            "appends": self.appends,
+            "bytes_written": self.bytes_written,
+            "tail_reads": self.tail_reads,
+            "segments_pruned": self.segments_pruned,
+            "corrupt_records": self.corrupt_records
+        }
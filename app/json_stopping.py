@@ -0,0 +1,87 @@
+"""
+Early stopping on the first closed JSON object.
+
+Shared by the /event tweak generator in app.py and EnhancedAIEngine: both prompt the
+model for a single JSON object, so generation can end as soon as it closes.
+"""
+
+from typing import Any, Dict, List, Optional
+
+
+class JSONObjectStoppingCriteria:
+    """Stopping criterion that ends each row once its first top-level JSON object closes.
+
+    Only the tokens added since the previous call are scanned, with brace depth and
+    string/escape state kept per row, so each step costs the same however long the
+    output is. ``closed_rows`` holds, per row, the number of generated tokens at which
+    the object closed, and ``tokens_saved`` how much of the budget was left unused.
+    Used through ``model.generate(stopping_criteria=...)``.
+    """
+
+    def __init__(self, tokenizer, prompt_width: int, max_new_tokens: int):
+        self.tokenizer = tokenizer
+        self.prompt_width = prompt_width
+        self.max_new_tokens = max_new_tokens
+        self._scanned = prompt_width
+        self._rows: Optional[List[Dict[str, Any]]] = None
+
+    @staticmethod
+    def _feed(row: Dict[str, Any], text: str) -> bool:
+        """Advance one row's scanner over ``text``; True once the object has closed"""
+        for ch in text:
+            if row["in_string"]:
+                if row["escaped"]:
+                    row["escaped"] = False
+                elif ch == "\\":
+                    row["escaped"] = True
+                elif ch == '"':
+                    row["in_string"] = False
+            elif ch == "{":
+                row["depth"] += 1
+            elif row["depth"] == 0:
+                continue  # Text before the object opens
+            elif ch == '"':
+                row["in_string"] = True
+            elif ch == "}":
+                row["depth"] -= 1
+                if row["depth"] == 0:
+                    return True
+        return False
+
+    def __call__(self, input_ids, scores, **kwargs):
+        import torch
+
+        if self._rows is None:
+            self._rows = [
+                {"depth": 0, "in_string": False, "escaped": False, "closed_at": None}
+                for _ in range(input_ids.shape[0])
+            ]
+
+        new_tokens = input_ids[:, self._scanned:].tolist()
+        for row, tokens in zip(self._rows, new_tokens):
+            if row["closed_at"] is not None:
+                continue
+            for offset, token in enumerate(tokens):
+                if self._feed(row, self.tokenizer.decode([token], skip_special_tokens=True)):
+                    row["closed_at"] = self._scanned - self.prompt_width + offset + 1
+                    break
+        self._scanned = input_ids.shape[1]
+
+        return torch.tensor([row["closed_at"] is not None for row in self._rows],
+                            dtype=torch.bool, device=input_ids.device)
+
+    @property
+    def closed_rows(self) -> List[Optional[int]]:
+        return [row["closed_at"] for row in self._rows or []]
+
+    @property
+    def closed_at(self) -> Optional[int]:
+        """Generated tokens at which the first row closed, or None"""
+        return self._rows[0]["closed_at"] if self._rows else None
+
+    @property
+    def tokens_saved(self) -> List[int]:
+        return [
+            self.max_new_tokens - row["closed_at"] if row["closed_at"] is not None else 0
+            for row in self._rows or []
+        ]
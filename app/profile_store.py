@@ -0,0 +1,552 @@
+"""
+Persistent keyed profile storage for Adaptive fIt AI engines
+Stores one JSON record per user in SQLite (WAL mode), so saving a profile writes
+only that user's row instead of re-pickling every profile. WriteBehindWriter
+coalesces bursts of updates into periodic batched writes, and LazyLRUMap keeps
+only recently used records in memory.
+"""
+
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, is_dataclass
+from collections import OrderedDict, deque
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# sync: write each update immediately; batched: write-behind; memory: never persist (tests)
+DURABILITY_MODES = ("sync", "batched", "memory")
+
+class ProfileStore:
+    """Keyed store of JSON-serialisable records backed by a SQLite database in WAL mode
+
+    - One write per saved record; each write is its own transaction, so a crash
+      leaves either the old or the new record, never a torn file
+    - WAL lets readers proceed while a writer commits, and SQLite's locking makes
+      concurrent writers (threads or processes) safe
+    - ``migrate_from_pickle`` imports a legacy ``{id: dict | dataclass}`` pickle once
+    """
+
+    def __init__(self, path: str, table: str = "profiles", synchronous: str = "FULL"):
+        if not table.isidentifier():
+            raise ValueError(f"Invalid table name: {table}")
+        self.path = path
+        self.table = table
+        self._lock = threading.RLock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30.0, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA synchronous={synchronous}")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "  key TEXT PRIMARY KEY,"
+            "  data TEXT NOT NULL,"
+            "  updated_at REAL NOT NULL"
+            ")"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS store_meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+
+    @staticmethod
+    def _encode(record: Any) -> str:
+        if is_dataclass(record):
+            record = asdict(record)
+        return json.dumps(record, default=float, separators=(",", ":"))
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Stored record for ``key``, or None"""
+        with self._lock:
+            row = self._conn.execute(f"SELECT data FROM {self.table} WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key: str, record: Any) -> None:
+        """Insert or replace one record (a dict or dataclass) atomically"""
+        data = self._encode(record)
+        with self._lock:
+            self._conn.execute(
+                f"INSERT INTO {self.table} (key, data, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                (key, data, time.time())
+            )
+
+    def put_many(self, records: Iterable[Tuple[str, Any]]) -> int:
+        """Insert or replace several records in a single transaction"""
+        now = time.time()
+        rows = [(key, self._encode(record), now) for key, record in records]
+        if not rows:
+            return 0
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    f"INSERT INTO {self.table} (key, data, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                    rows
+                )
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return len(rows)
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+        return cursor.rowcount > 0
+
+    def keys(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._conn.execute(f"SELECT key FROM {self.table} ORDER BY key")]
+
+    def items(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """All records; rows are fetched up front so the store stays usable while iterating"""
+        with self._lock:
+            rows = self._conn.execute(f"SELECT key, data FROM {self.table}").fetchall()
+        for key, data in rows:
+            yield key, json.loads(data)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return self._conn.execute(f"SELECT 1 FROM {self.table} WHERE key = ?", (key,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def migrate_from_pickle(self, pickle_path: str) -> int:
+        """One-time import of a legacy whole-file pickle of ``{id: dict | dataclass}``
+
+        The migration is recorded in the store, and the pickle is renamed to
+        ``<name>.migrated`` so it is never imported twice. Returns the number of
+        records imported (0 if there was nothing to migrate).
+        """
+        marker = f"migrated:{self.table}:{os.path.abspath(pickle_path)}"
+        with self._lock:
+            done = self._conn.execute("SELECT 1 FROM store_meta WHERE name = ?", (marker,)).fetchone()
+        if done or not os.path.exists(pickle_path):
+            return 0
+
+        with open(pickle_path, 'rb') as f:
+            legacy = pickle.load(f)
+
+        imported = self.put_many((str(key), record) for key, record in legacy.items())
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO store_meta (name, value) VALUES (?, ?)", (marker, str(time.time()))
+            )
+        try:
+            os.replace(pickle_path, pickle_path + ".migrated")
+        except OSError as e:
+            logger.warning(f"Migrated {pickle_path} but could not rename it: {e}")
+        logger.info(f"Migrated {imported} records from {pickle_path} into {self.path}")
+        return imported
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+class WriteBehindWriter:
+    """Coalescing write-behind persistence for records kept in memory
+
+    Callers mark keys dirty after mutating the in-memory record, both inside
+    ``LazyLRUMap.checkout`` when the record can be evicted. In ``batched``
+    mode a background thread persists all dirty records in one transaction every
+    ``flush_interval_ms`` (or as soon as ``flush_max_records`` are dirty), so a
+    burst of updates to one user costs a single write. ``sync`` writes through on
+    every update and ``memory`` never touches disk. ``close`` performs the final
+    flush and must be called on shutdown.
+    """
+
+    def __init__(self, store: Optional[ProfileStore], snapshot: Callable[[str], Any],
+                 mode: str = "batched", flush_interval_ms: float = 500, flush_max_records: int = 256):
+        if mode not in DURABILITY_MODES:
+            raise ValueError(f"Unknown durability mode '{mode}', expected one of {DURABILITY_MODES}")
+        if store is None and mode != "memory":
+            raise ValueError(f"Durability mode '{mode}' needs a store")
+        self.store = store
+        self.snapshot = snapshot
+        self.mode = mode
+        self.flush_interval = max(0.001, flush_interval_ms / 1000.0)
+        self.flush_max_records = max(1, flush_max_records)
+
+        self._cond = threading.Condition()
+        self._dirty: Dict[str, float] = {}  # key -> monotonic time it first became dirty
+        self._flush_lock = threading.Lock()
+        self._closed = False
+
+        # Metrics
+        self.updates = 0
+        self.flushes = 0
+        self.records_written = 0
+        self.failures = 0
+        self._flush_sizes: Deque[int] = deque(maxlen=256)
+        self._lag_ms: Deque[float] = deque(maxlen=256)
+
+        self._thread = None
+        if mode == "batched":
+            self._thread = threading.Thread(target=self._run, name="profile-flusher", daemon=True)
+            self._thread.start()
+
+    def mark_dirty(self, key: str) -> None:
+        """Record that ``key`` changed and must be persisted"""
+        with self._cond:
+            self.updates += 1
+            if self.mode == "memory":
+                return
+            self._dirty.setdefault(key, time.monotonic())
+            if self.mode == "batched":
+                if len(self._dirty) >= self.flush_max_records:
+                    self._cond.notify()
+                return
+        self.flush()  # sync mode: write through
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._dirty)
+
+    def flush(self) -> int:
+        """Persist every dirty record now; returns how many were written"""
+        if self.store is None:
+            return 0
+        with self._flush_lock:
+            with self._cond:
+                dirty, self._dirty = self._dirty, {}
+            if not dirty:
+                return 0
+
+            records = []
+            for key in dirty:
+                record = self.snapshot(key)
+                if record is not None:
+                    records.append((key, record))
+            try:
+                written = self.store.put_many(records)
+            except Exception as e:
+                logger.error(f"Profile flush of {len(dirty)} records failed, will retry: {e}")
+                with self._cond:
+                    self.failures += 1
+                    for key, since in dirty.items():
+                        self._dirty[key] = min(since, self._dirty.get(key, since))
+                return 0
+
+            now = time.monotonic()
+            with self._cond:
+                self.flushes += 1
+                self.records_written += written
+                self._flush_sizes.append(written)
+                self._lag_ms.append((now - min(dirty.values())) * 1000)
+            return written
+
+    def write_now(self, key: str, record: Any) -> bool:
+        """Persist ``record`` immediately if ``key`` has a pending update (used when it leaves memory)"""
+        if self.store is None:
+            return False
+        with self._flush_lock:
+            with self._cond:
+                since = self._dirty.pop(key, None)
+            if since is None:
+                return False
+            try:
+                self.store.put(key, record)
+            except Exception as e:
+                logger.error(f"Profile write of {key} failed, will retry: {e}")
+                with self._cond:
+                    self.failures += 1
+                    self._dirty.setdefault(key, since)
+                return False
+            with self._cond:
+                self.records_written += 1
+            return True
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if not self._closed and len(self._dirty) < self.flush_max_records:
+                    self._cond.wait(self.flush_interval)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def close(self) -> None:
+        """Stop the background flusher after a final flush"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            sizes = list(self._flush_sizes)
+            lags = sorted(self._lag_ms)
+            oldest = min(self._dirty.values()) if self._dirty else None
+            return {
+                "mode": self.mode,
+                "updates": self.updates,
+                "pending": len(self._dirty),
+                "oldest_pending_ms": round((time.monotonic() - oldest) * 1000, 2) if oldest is not None else None,
+                "flushes": self.flushes,
+                "records_written": self.records_written,
+                "failures": self.failures,
+                "avg_flush_size": round(sum(sizes) / len(sizes), 2) if sizes else 0.0,
+                "max_flush_size": max(sizes) if sizes else 0,
+                "avg_lag_ms": round(sum(lags) / len(lags), 2) if lags else None,
+                "max_lag_ms": round(lags[-1], 2) if lags else None
+            }
+
+class LazyLRUMap(MutableMapping):
+    """Dict-like map that faults records in on first access and keeps at most ``max_resident`` in memory
+
+    - ``loader(key)`` returns the stored value or None; on a miss ``default_factory``
+      (if given) creates the value, like ``defaultdict``. The loader runs outside the
+      map's lock, once per key however many threads miss on it together
+    - The least recently used entries beyond ``max_resident`` are evicted and passed
+      to ``on_evict(key, value)`` outside the map's lock; until that returns they
+      remain visible to ``peek`` and are faulted back from memory, not the loader
+    - ``checkout`` pins an entry so it cannot be evicted while a caller changes it
+    - Iteration and ``len`` cover resident keys plus ``keys_source()`` (persisted keys);
+      the keys are counted once, on the first ``len``, and the count is kept up to date
+    """
+
+    def __init__(self, loader: Callable[[str], Any], max_resident: Optional[int] = None,
+                 default_factory: Optional[Callable[[], Any]] = None,
+                 on_evict: Optional[Callable[[str, Any], None]] = None,
+                 keys_source: Optional[Callable[[], Iterable[str]]] = None):
+        self.loader = loader
+        self.max_resident = max_resident if max_resident and max_resident > 0 else None
+        self.default_factory = default_factory
+        self.on_evict = on_evict
+        self.keys_source = keys_source
+        self._lock = threading.RLock()
+        self._resident: "OrderedDict[str, Any]" = OrderedDict()
+        self._evicting: Dict[str, Any] = {}
+        self._loading: Dict[str, threading.Event] = {}
+        self._pins: Dict[str, int] = {}
+        self._size: Optional[int] = None  # resident + persisted keys, once len() has counted them
+
+        # Metrics
+        self.hits = 0
+        self.faults = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _fault_in(self, key: str, create: bool, factory: Optional[Callable[[], Any]] = None,
+                  pin: bool = False) -> Any:
+        """Resident value for ``key``, loading (or creating) it if needed; None if absent"""
+        factory = factory or self.default_factory
+        while True:
+            with self._lock:
+                value = self._resident.get(key)
+                if value is not None:
+                    self.hits += 1
+                    self._resident.move_to_end(key)
+                    self._pin_locked(key, pin)
+                    return value
+                value = self._evicting.get(key)
+                if value is not None:
+                    evicted = self._install_locked(key, value, pin)
+                    break
+                loading = self._loading.get(key)
+                if loading is None:
+                    loading = self._loading[key] = threading.Event()
+                    evicted = None
+                    break
+            loading.wait()  # Another thread is loading this key; use its result
+
+        if evicted is None:
+            try:
+                loaded = self.loader(key)
+            except BaseException:
+                with self._lock:
+                    del self._loading[key]
+                loading.set()
+                raise
+            with self._lock:
+                del self._loading[key]
+                value = self._resident.get(key)
+                if value is None:
+                    value = self._evicting.get(key)
+                if value is not None:
+                    # Set through __setitem__ while the loader ran, so newer than ``loaded``
+                    evicted = self._install_locked(key, value, pin)
+                elif loaded is not None:
+                    self.faults += 1
+                    value = loaded
+                    evicted = self._install_locked(key, value, pin)
+                else:
+                    self.misses += 1
+                    evicted = []
+                    if create and factory is not None:
+                        value = factory()
+                        if self._size is not None:
+                            self._size += 1
+                        evicted = self._install_locked(key, value, pin)
+            loading.set()
+        self._finish_evictions(evicted)
+        return value
+
+    def _pin_locked(self, key: str, pin: bool) -> None:
+        if pin:
+            self._pins[key] = self._pins.get(key, 0) + 1
+
+    def _install_locked(self, key: str, value: Any, pin: bool) -> List[Tuple[str, Any]]:
+        """Make ``value`` resident and most recently used; returns the entries to evict"""
+        self._resident[key] = value
+        self._resident.move_to_end(key)
+        self._pin_locked(key, pin)
+        return self._evict_locked()
+
+    def _evict_locked(self) -> List[Tuple[str, Any]]:
+        evicted = []
+        if self.max_resident is not None:
+            excess = len(self._resident) - self.max_resident
+            if excess > 0:
+                # Least recently used first, skipping entries a caller has checked out
+                keys = []
+                for key in self._resident:
+                    if key not in self._pins:
+                        keys.append(key)
+                        if len(keys) == excess:
+                            break
+                for key in keys:
+                    value = self._resident.pop(key)
+                    self._evicting[key] = value
+                    evicted.append((key, value))
+            self.evictions += len(evicted)
+        return evicted
+
+    def _finish_evictions(self, evicted: List[Tuple[str, Any]]) -> None:
+        for key, value in evicted:
+            try:
+                if self.on_evict is not None:
+                    self.on_evict(key, value)
+            finally:
+                with self._lock:
+                    if self._evicting.get(key) is value:
+                        del self._evicting[key]
+
+    @contextmanager
+    def checkout(self, key: str, create: Optional[Callable[[], Any]] = None) -> Iterator[Any]:
+        """Value for ``key`` (created with ``create`` or ``default_factory`` if absent), pinned in memory
+
+        Callers that change the value and then record the change (e.g. ``mark_dirty``)
+        do both inside the block, so ``on_evict`` can never see the entry in between.
+        """
+        value = self._fault_in(key, create=True, factory=create, pin=True)
+        if value is None:
+            raise KeyError(key)
+        try:
+            yield value
+        finally:
+            with self._lock:
+                if self._pins[key] > 1:
+                    self._pins[key] -= 1
+                else:
+                    del self._pins[key]
+                evicted = self._evict_locked()
+            self._finish_evictions(evicted)
+
+    def peek(self, key: str) -> Any:
+        """Value if it is in memory (resident or being evicted), without loading or reordering"""
+        with self._lock:
+            value = self._resident.get(key)
+            return value if value is not None else self._evicting.get(key)
+
+    def __getitem__(self, key: str) -> Any:
+        value = self._fault_in(key, create=True)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self._fault_in(key, create=False)
+        return default if value is None else value
+
+    def __contains__(self, key: object) -> bool:
+        return self._fault_in(key, create=False) is not None
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        # Only a counted map needs to know whether the key is new; ask the loader outside the lock
+        if self._size is not None and self.peek(key) is None:
+            is_new = self.loader(key) is None
+        else:
+            is_new = False
+        with self._lock:
+            if is_new and self._size is not None and key not in self._resident and key not in self._evicting:
+                self._size += 1
+            self._resident[key] = value
+            self._resident.move_to_end(key)
+            evicted = self._evict_locked()
+        self._finish_evictions(evicted)
+
+    def __delitem__(self, key: str) -> None:
+        """Drop ``key`` from memory (the backing store is left untouched)
+
+        A counted map stops counting the key unless the backing store still holds it.
+        """
+        with self._lock:
+            del self._resident[key]
+            counted = self._size is not None
+        # Ask the loader outside the lock, as __setitem__ does
+        if counted and self.loader(key) is None:
+            with self._lock:
+                if key not in self._resident and key not in self._evicting:
+                    self._size -= 1
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            resident = list(self._resident)
+        yield from resident
+        if self.keys_source is not None:
+            seen = set(resident)
+            for key in self.keys_source():
+                if key not in seen:
+                    yield key
+
+    def __len__(self) -> int:
+        if self.keys_source is None:
+            return self.resident_count()
+        with self._lock:
+            if self._size is not None:
+                return self._size
+        size = sum(1 for _ in self)
+        with self._lock:
+            if self._size is None:
+                self._size = size
+            return self._size
+
+    def resident_items(self) -> List[Tuple[str, Any]]:
+        """In-memory entries only, least recently used first"""
+        with self._lock:
+            return list(self._resident.items())
+
+    def resident_count(self) -> int:
+        with self._lock:
+            return len(self._resident)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.faults + self.misses
+            return {
+                "resident": len(self._resident),
+                "max_resident": self.max_resident,
+                "hits": self.hits,
+                "faults": self.faults,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
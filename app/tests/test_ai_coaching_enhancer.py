@@ -0,0 +1,70 @@
+"""
+AI Coaching Enhancer Test Suite
+Tests for persona-styled coaching line generation
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+try:
+    from ai_coaching_enhancer import AICoachingEnhancer, CoachingContext
+    IMPORTS_AVAILABLE = True
+except ImportError:
+    IMPORTS_AVAILABLE = False
+
+pytestmark = pytest.mark.skipif(not IMPORTS_AVAILABLE, reason="AI coaching enhancer imports not available")
+
+LOCAL_TOKENIZER_PATH = os.path.join(os.path.dirname(__file__), '..', 'fine_tuned_gpt2')
+BASE_LINE = "Drive through your heels and own this rep!"
+
+@pytest.fixture
+def enhancer():
+    """Enhancer with a small random GPT-2 and one scripted phase, skipping model/pipeline downloads"""
+    import torch
+    from transformers import GPT2Config, GPT2LMHeadModel, GPT2Tokenizer
+
+    torch.manual_seed(0)
+    enhancer = AICoachingEnhancer.__new__(AICoachingEnhancer)
+    enhancer.device = "cpu"
+    enhancer.tokenizer = GPT2Tokenizer.from_pretrained(LOCAL_TOKENIZER_PATH)
+    enhancer.tokenizer.pad_token = enhancer.tokenizer.eos_token
+    enhancer.model = GPT2LMHeadModel(GPT2Config(n_layer=2, n_head=2, n_embd=64)).eval()
+    enhancer.persona_scripts = {"alice": {"phrases": {"set_start": [BASE_LINE]}}}
+    enhancer.used_phrases = {"alice": {phase: set() for phase in enhancer._get_all_phases()}}
+    return enhancer
+
+class TestStreaming:
+    """Token streaming of coaching lines"""
+
+    def test_streams_a_single_line(self, enhancer):
+        context = CoachingContext(
+            coach_persona="alice",
+            workout_phase="set_start",
+            exercise_name="Squat",
+            set_number=1,
+            rep_count=8
+        )
+
+        pieces = list(enhancer.stream_enhanced_response(context))
+        line = "".join(pieces)
+
+        assert pieces
+        assert "\n" not in line
+        assert line == BASE_LINE or len(line.strip()) > 10
+
+    def test_unscripted_persona_streams_fallback(self, enhancer):
+        context = CoachingContext(
+            coach_persona="aiden",
+            workout_phase="set_start",
+            exercise_name="Squat",
+            set_number=1,
+            rep_count=8
+        )
+
+        assert list(enhancer.stream_enhanced_response(context)) == [
+            "Execute Squat with precision. Focus on form."
+        ]
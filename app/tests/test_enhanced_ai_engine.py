@@ -0,0 +1,564 @@
+"""
+Enhanced AI Engine Test Suite
+Tests for EnhancedAIEngine generation, profile learning and insights
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+try:
+    from enhanced_ai_engine import (
+        EnhancedAIEngine,
+        JSONObjectStoppingCriteria,
+        UserPreferenceProfile,
+        WorkoutContext,
+        AIRecommendation,
+        InteractionHistory,
+        ProfileColumns
+    )
+    from profile_store import ProfileStore
+    IMPORTS_AVAILABLE = True
+except ImportError:
+    IMPORTS_AVAILABLE = False
+
+pytestmark = pytest.mark.skipif(not IMPORTS_AVAILABLE, reason="Enhanced AI engine imports not available")
+
+LOCAL_TOKENIZER_PATH = os.path.join(os.path.dirname(__file__), '..', 'fine_tuned_gpt2')
+
+@pytest.fixture
+def tokenizer():
+    transformers = pytest.importorskip("transformers")
+    return transformers.GPT2Tokenizer.from_pretrained(LOCAL_TOKENIZER_PATH)
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = EnhancedAIEngine(user_profiles_path=str(tmp_path / "user_profiles.pkl"))
+    yield engine
+    engine.shutdown()
+
+def make_engine(tmp_path, **kwargs):
+    return EnhancedAIEngine(user_profiles_path=str(tmp_path / "user_profiles.pkl"), **kwargs)
+
+class TestEarlyStopping:
+    """Stopping generation once the recommendation JSON closes"""
+
+    def test_stops_on_first_top_level_object(self, tokenizer):
+        torch = pytest.importorskip("torch")
+        prompt = tokenizer.encode("JSON:")
+        generated = tokenizer.encode(' {"type": "rest_change", "reasoning": "use } carefully"} and then more text')
+        stop = JSONObjectStoppingCriteria(tokenizer, len(prompt), len(generated))
+
+        steps = 0
+        for steps in range(1, len(generated) + 1):
+            input_ids = torch.tensor([prompt + generated[:steps]])
+            if bool(stop(input_ids, None)[0]):
+                break
+
+        closing = tokenizer.decode(generated[:steps])
+        assert closing.endswith("}")
+        assert closing.count("}") == 2  # the brace inside the string did not end it
+        assert stop.closed_at == steps
+
+    def test_generation_stats_count_saved_tokens(self, engine, tokenizer):
+        transformers = pytest.importorskip("transformers")
+        torch = pytest.importorskip("torch")
+        torch.manual_seed(0)
+        engine.model = transformers.GPT2LMHeadModel(transformers.GPT2Config(n_layer=2, n_head=2, n_embd=64)).eval()
+        engine.tokenizer = tokenizer
+
+        suggestion = engine._generate_ai_suggestion(
+            "user_1",
+            {"exercise_name": "squat", "planned_reps": 8},
+            WorkoutContext(time_of_day="morning", day_of_week=1),
+            UserPreferenceProfile(user_id="user_1"),
+            "complete_set"
+        )
+
+        assert "type" in suggestion
+        assert engine.generation_stats["generations"] == 1
+        assert engine.generation_stats["tokens_saved"] >= 0
+
+class TestProfilePersistence:
+    """Profiles persisted through the keyed profile store"""
+
+    def test_feedback_writes_only_that_users_profile(self, tmp_path, monkeypatch):
+        engine = make_engine(tmp_path, durability="sync")
+        engine.update_user_preferences("user_1", {"action": "accepted"})
+        engine.update_user_preferences("user_2", {"action": "rejected", "modification_reason": "too_heavy"})
+
+        writes = []
+        original_put_many = engine.profile_store.put_many
+        def recording_put_many(records):
+            records = list(records)
+            writes.append([key for key, _ in records])
+            return original_put_many(records)
+        monkeypatch.setattr(engine.profile_store, "put_many", recording_put_many)
+
+        engine.update_user_preferences("user_1", {"action": "accepted", "rating": 5})
+
+        assert writes == [["user_1"]]
+        assert engine.profile_store.get("user_1")["total_interactions"] == 2
+        engine.shutdown()
+
+    def test_legacy_pickle_is_migrated(self, tmp_path):
+        import pickle
+        from dataclasses import asdict
+
+        legacy = tmp_path / "user_profiles.pkl"
+        with open(legacy, 'wb') as f:
+            pickle.dump({"user_1": asdict(UserPreferenceProfile(user_id="user_1", total_interactions=7))}, f)
+
+        engine = EnhancedAIEngine(user_profiles_path=str(legacy))
+        engine.shutdown()
+        reloaded = EnhancedAIEngine(user_profiles_path=str(legacy))
+        reloaded.shutdown()
+
+        assert engine.get_user_profile("user_1").total_interactions == 7
+        assert reloaded.get_user_profile("user_1").total_interactions == 7
+        assert os.path.exists(str(legacy) + ".migrated")
+
+class TestWriteBehind:
+    """Coalesced, batched profile persistence"""
+
+    def test_burst_of_updates_is_coalesced(self, tmp_path):
+        engine = make_engine(tmp_path, durability="batched", flush_interval_ms=60000)
+        for rating in range(20):
+            engine.update_user_preferences("user_1", {"action": "accepted", "rating": rating % 5 + 1})
+        engine.update_user_preferences("user_2", {"action": "accepted"})
+
+        assert engine.profile_store.get("user_1") is None  # nothing written yet
+        assert engine.get_persistence_stats()["pending"] == 2
+
+        assert engine.flush_profiles() == 2
+        stats = engine.get_persistence_stats()
+        assert stats["updates"] == 21
+        assert stats["flushes"] == 1
+        assert stats["max_flush_size"] == 2
+        assert stats["pending"] == 0
+        assert stats["max_lag_ms"] >= 0
+        assert engine.profile_store.get("user_1")["total_interactions"] == 20
+        engine.shutdown()
+
+    def test_background_flusher_persists_after_interval(self, tmp_path):
+        import time
+        engine = make_engine(tmp_path, durability="batched", flush_interval_ms=20)
+        engine.update_user_preferences("user_1", {"action": "accepted"})
+
+        deadline = time.monotonic() + 5
+        while engine.profile_store.get("user_1") is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        assert engine.profile_store.get("user_1")["total_interactions"] == 1
+        engine.shutdown()
+
+    def test_max_records_triggers_flush(self, tmp_path):
+        import time
+        engine = make_engine(tmp_path, durability="batched", flush_interval_ms=60000, flush_max_records=3)
+        for i in range(3):
+            engine.update_user_preferences(f"user_{i}", {"action": "accepted"})
+
+        deadline = time.monotonic() + 5
+        while len(engine.profile_store) < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        assert len(engine.profile_store) == 3
+        engine.shutdown()
+
+    def test_shutdown_flushes_pending_updates(self, tmp_path):
+        engine = make_engine(tmp_path, durability="batched", flush_interval_ms=60000)
+        engine.update_user_preferences("user_1", {"action": "rejected", "modification_reason": "too_heavy"})
+        engine.shutdown()
+
+        reloaded = make_engine(tmp_path, durability="sync")
+        assert reloaded.get_user_profile("user_1").common_rejection_reasons == ["too_heavy"]
+        reloaded.shutdown()
+
+    def test_memory_mode_never_touches_disk(self, tmp_path):
+        engine = make_engine(tmp_path, durability="memory")
+        engine.update_user_preferences("user_1", {"action": "accepted"})
+        engine.shutdown()
+
+        assert engine.profile_store is None
+        assert engine.get_user_profile("user_1").total_interactions == 1
+        assert not any(tmp_path.iterdir())
+
+    def test_unknown_durability_mode_is_rejected(self, tmp_path):
+        with pytest.raises(ValueError):
+            make_engine(tmp_path, durability="eventually")
+
+class TestLazyProfiles:
+    """Profiles and histories faulted in on demand under a resident-user bound"""
+
+    def test_startup_loads_no_profiles(self, tmp_path):
+        store = ProfileStore(str(tmp_path / "user_profiles.db"))
+        store.put_many((f"user_{i}", UserPreferenceProfile(user_id=f"user_{i}", total_interactions=i)) for i in range(200))
+        store.close()
+
+        engine = make_engine(tmp_path, durability="sync", max_resident_users=10)
+        assert engine.user_profiles.resident_count() == 0
+        assert engine.get_user_profile("user_42").total_interactions == 42
+        assert "user_7" in engine.user_profiles
+        assert len(engine.user_profiles) == 200
+        assert engine.get_residency_stats()["profiles"]["faults"] == 2
+        engine.shutdown()
+
+    def test_evicted_dirty_profile_is_persisted(self, tmp_path):
+        engine = make_engine(tmp_path, durability="batched", flush_interval_ms=60000, max_resident_users=2)
+        engine.update_user_preferences("user_1", {"action": "accepted"})
+        engine.update_user_preferences("user_2", {"action": "accepted"})
+        engine.update_user_preferences("user_3", {"action": "accepted"})
+
+        assert engine.user_profiles.resident_count() == 2
+        assert engine.profile_store.get("user_1")["total_interactions"] == 1  # written on eviction
+        assert engine.get_user_profile("user_1").total_interactions == 1
+        engine.shutdown()
+
+    def test_pattern_analysis_survives_eviction(self, tmp_path):
+        engine = make_engine(tmp_path, durability="batched", flush_interval_ms=60000, max_resident_users=2)
+        for i in range(10):
+            engine.process_user_feedback("user_1", f"t{i}", {"action": "rejected", "modification_reason": "too_hard"})
+        engine.flush_profiles()
+
+        engine._analyze_interaction_patterns("user_1")
+        learning_rate = engine.get_user_profile("user_1").learning_rate
+        engine.get_user_profile("user_2")
+        engine.get_user_profile("user_3")
+
+        assert "user_1" not in dict(engine.user_profiles.resident_items())
+        assert engine.profile_store.get("user_1")["learning_rate"] == pytest.approx(learning_rate)
+        assert engine.get_user_profile("user_1").learning_rate == pytest.approx(learning_rate)
+        engine.shutdown()
+
+    def test_histories_are_bounded_and_use_loader(self, tmp_path):
+        loaded = []
+        def history_loader(user_id):
+            loaded.append(user_id)
+            return [{"tweak_id": "t0", "feedback": {"action": "accepted"}, "timestamp": 0.0}]
+
+        engine = make_engine(tmp_path, durability="sync", max_resident_users=2, history_loader=history_loader)
+        for i in range(3):
+            engine.process_user_feedback(f"user_{i}", f"t{i}", {"action": "accepted"})
+
+        assert engine.interaction_history.resident_count() == 2
+        assert len(engine.interaction_history["user_2"]) == 2
+        assert loaded == ["user_0", "user_1", "user_2"]
+        engine.shutdown()
+
+    def test_interaction_history_survives_restart_without_replay(self, tmp_path):
+        engine = make_engine(tmp_path, durability="sync")
+        for i in range(15):
+            engine.process_user_feedback("user_1", f"t{i}", {"action": "rejected" if i % 3 else "accepted", "rating": 2})
+        expected = engine.get_user_insights("user_1")["interaction_summary"]
+        engine.shutdown()
+
+        restarted = make_engine(tmp_path, durability="sync")
+        assert restarted.interaction_log.stats()["tail_reads"] == 0
+        assert restarted.get_user_insights("user_1")["interaction_summary"] == expected
+        assert [i["tweak_id"] for i in restarted.interaction_history["user_1"]] == [f"t{i}" for i in range(15)]
+        assert restarted.interaction_log.stats()["tail_reads"] == 1
+        restarted.shutdown()
+
+class TestProfileColumns:
+    """Columnar profile table and vectorized population aggregates"""
+
+    def _seed(self, engine, n=60):
+        for i in range(n):
+            for _ in range(i % 15):
+                engine.update_user_preferences(f"user_{i}", {"action": "accepted" if i % 3 else "rejected"})
+            engine.get_user_profile(f"user_{i}")
+
+    def test_aggregates_match_profile_objects(self, tmp_path):
+        engine = make_engine(tmp_path, durability="sync")
+        self._seed(engine)
+        engine.shutdown()
+        engine = make_engine(tmp_path, durability="sync")  # table comes from the store
+
+        stats = engine.get_population_stats(fields=["acceptance_rate"], group_by="interaction_tier")
+        profiles = [engine.get_user_profile(uid) for uid in engine.profile_store.keys()]
+        rates = np.array([p.acceptance_rate for p in profiles])
+
+        overall = stats["fields"]["acceptance_rate"]["overall"]
+        assert stats["users"] == len(profiles)
+        assert overall["mean"] == pytest.approx(rates.mean())
+        assert overall["p50"] == pytest.approx(np.median(rates))
+        new_rates = [p.acceptance_rate for p in profiles if p.total_interactions < 10]
+        tier = stats["fields"]["acceptance_rate"]["groups"]["new"]
+        assert tier["count"] == len(new_rates)
+        assert tier["mean"] == pytest.approx(np.mean(new_rates))
+        assert tier["max"] == pytest.approx(max(new_rates))
+        engine.shutdown()
+
+    def test_table_tracks_updates_and_labels(self, tmp_path):
+        engine = make_engine(tmp_path, durability="memory")
+        self._seed(engine, n=4)
+        table = engine.get_profile_columns()
+        engine.update_user_preferences("user_9", {"action": "accepted"})
+
+        assert "user_9" in table
+        assert table.row("user_9")["acceptance_rate"] == engine.get_user_profile("user_9").acceptance_rate
+        stats = engine.get_population_stats(
+            fields=["total_interactions"], group_by="label", labels={"user_1": "beginner", "user_2": "beginner"},
+            histogram_bins=4
+        )
+        groups = stats["fields"]["total_interactions"]["groups"]
+        assert groups["beginner"]["count"] == 2
+        assert groups["beginner"]["mean"] == 1.5
+        assert sum(stats["fields"]["total_interactions"]["histogram"]["counts"]) == len(table)
+
+    def test_concurrent_upserts_get_unique_rows(self, tmp_path):
+        import threading
+        table = ProfileColumns(capacity=1)  # grows many times under the writers
+        barrier = threading.Barrier(8)
+
+        def writer(w):
+            barrier.wait()
+            for i in range(500):
+                table.upsert(UserPreferenceProfile(user_id=f"user_{w}_{i}", total_interactions=i))
+                table.upsert(UserPreferenceProfile(user_id=f"user_{w}_{i // 2}", total_interactions=i // 2))
+
+        threads = [threading.Thread(target=writer, args=(w,)) for w in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(table) == 8 * 500
+        assert sorted(table.index.values()) == list(range(8 * 500))
+        assert all(table.user_ids[row] == uid for uid, row in table.index.items())
+        assert all(table.row(f"user_{w}_{i}")["total_interactions"] == i for w in range(8) for i in range(500))
+
+    def test_table_is_built_once(self, tmp_path):
+        import threading
+        engine = make_engine(tmp_path, durability="memory")
+        self._seed(engine, n=4)
+        barrier = threading.Barrier(4)
+        tables = []
+
+        def build():
+            barrier.wait()
+            tables.append(engine.get_profile_columns())
+
+        threads = [threading.Thread(target=build) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len({id(table) for table in tables}) == 1
+        engine.shutdown()
+
+    def test_unknown_field_is_rejected(self, engine):
+        with pytest.raises(ValueError):
+            engine.get_population_stats(fields=["user_id"])
+
+class TestCompactProfiles:
+    """Slotted profile objects with interned rejection reasons"""
+
+    def test_profiles_have_no_instance_dict(self):
+        profile = UserPreferenceProfile(user_id="user_1")
+        context = WorkoutContext(time_of_day="morning", day_of_week=1)
+
+        assert not hasattr(profile, "__dict__")
+        assert not hasattr(context, "__dict__")
+        with pytest.raises(AttributeError):
+            profile.unknown_field = 1
+
+    def test_rejection_reasons_are_interned_and_serialize_unchanged(self, tmp_path):
+        import json
+        from dataclasses import asdict
+
+        decoded = json.loads('["too_heavy", "pain"]')
+        profile = UserPreferenceProfile(user_id="user_1", common_rejection_reasons=decoded)
+        other = UserPreferenceProfile(user_id="user_2", common_rejection_reasons=json.loads('["too_heavy"]'))
+
+        assert profile.common_rejection_reasons[0] is other.common_rejection_reasons[0]
+        assert asdict(profile)["common_rejection_reasons"] == ["too_heavy", "pain"]
+        assert UserPreferenceProfile(**asdict(profile)) == profile
+
+        engine = make_engine(tmp_path, durability="sync")
+        engine.update_user_preferences("user_1", {"action": "rejected", "modification_reason": "too_" + "heavy"})
+        assert engine.get_user_profile("user_1").common_rejection_reasons[0] is other.common_rejection_reasons[0]
+        engine.shutdown()
+
+class TestBatchRecommendations:
+    """generate_personalized_recommendations_batch matches the per-item path"""
+
+    def _requests(self):
+        import itertools
+        contexts = [
+            WorkoutContext(time_of_day="morning", day_of_week=1),
+            WorkoutContext(time_of_day="evening", day_of_week=3, user_energy=3, user_motivation=4,
+                           available_time=20, gym_crowding="high", equipment_availability={"rack": False, "bench": True}),
+            WorkoutContext(time_of_day="noon", day_of_week=5, user_energy=9, user_motivation=8,
+                           available_time=90, gym_crowding="low"),
+        ]
+        exercises = [
+            {"exercise_name": "squat", "planned_reps": 8, "planned_weight": 100, "planned_sets": 3},
+            {"exercise_name": "row", "planned_reps": [10, 10, 8], "planned_weight": 60, "planned_sets": 3},
+        ]
+        events = ["struggle_set", "complete_set", "workout_tweak"]
+        return [
+            (f"user_{i % 4}", exercise, context, event)
+            for i, (exercise, context, event) in enumerate(itertools.product(exercises, contexts, events))
+        ]
+
+    def test_fallback_batch_equals_individual_calls(self, tmp_path):
+        engine = make_engine(tmp_path, durability="memory")
+        for i in range(4):
+            for _ in range(i * 12):
+                engine.update_user_preferences(f"user_{i}", {"action": "accepted" if i % 2 else "rejected"})
+        engine.get_user_profile("user_2").progression_rate = 0.9
+        requests = self._requests()
+
+        batch = engine.generate_personalized_recommendations_batch(requests)
+        single = [engine.generate_personalized_recommendation(*request) for request in requests]
+
+        assert len(batch) == len(requests)
+        for got, expected in zip(batch, single):
+            assert got.type == expected.type
+            assert got.suggested_value == expected.suggested_value
+            assert got.reasoning == expected.reasoning
+            assert got.confidence == expected.confidence
+
+    def test_model_batch_generates_in_input_order(self, tmp_path, tokenizer):
+        transformers = pytest.importorskip("transformers")
+        torch = pytest.importorskip("torch")
+        torch.manual_seed(0)
+        engine = make_engine(tmp_path, durability="memory")
+        engine.model = transformers.GPT2LMHeadModel(transformers.GPT2Config(n_layer=2, n_head=2, n_embd=64)).eval()
+        engine.tokenizer = tokenizer
+        requests = [
+            (user_id, {**exercise, "planned_value": i}, context, event)
+            for i, (user_id, exercise, context, event) in enumerate(self._requests()[:5])
+        ]
+
+        calls = []
+        original_generate = engine.model.generate
+        engine.model.generate = lambda *args, **kwargs: (calls.append(args[0].shape[0]), original_generate(*args, **kwargs))[1]
+        results = engine.generate_personalized_recommendations_batch(requests, batch_size=4)
+
+        assert calls == [4, 1]
+        assert len(results) == 5
+        assert all(0.0 <= r.confidence <= 1.0 for r in results)
+        assert engine.generation_stats["generations"] == 5
+        assert [r.original_value for r in results] == [0, 1, 2, 3, 4]
+
+class TestRollingInsights:
+    """Insights read running aggregates that match a full rescan of the history"""
+
+    @staticmethod
+    def rescan(interactions):
+        recent = interactions[-10:]
+        mid = len(interactions) // 2
+        first = np.mean([i['feedback'].get('rating', 3) for i in interactions[:mid]]) if mid else None
+        second = np.mean([i['feedback'].get('rating', 3) for i in interactions[mid:]]) if interactions else None
+        if len(interactions) < 10:
+            trend = 'insufficient_data'
+        elif second > first + 0.3:
+            trend = 'improving'
+        elif second < first - 0.3:
+            trend = 'declining'
+        else:
+            trend = 'stable'
+        accepted = sum(1 for i in interactions if i['feedback'].get('action') == 'accepted')
+        return {
+            'total_interactions': len(interactions),
+            'recent_acceptance_rate': sum(1 for i in recent if i['feedback'].get('action') == 'accepted') / len(recent) if recent else 0.5,
+            'improvement_trend': trend,
+            'preferred_recommendation_types': {'unknown': accepted} if accepted else {}
+        }
+
+    def test_summary_matches_rescan_across_evictions(self, tmp_path):
+        import random
+        rng = random.Random(7)
+        engine = make_engine(tmp_path, durability="memory")
+        for step in range(160):
+            feedback = {"action": rng.choice(["accepted", "rejected", "modified"])}
+            if rng.random() < 0.8:
+                feedback["rating"] = rng.choice([1, 2, 3, 4, 5]) if step < 80 else rng.choice([4, 5])
+            engine.process_user_feedback("user_1", f"tweak_{step}", feedback)
+            if step % 9 == 0 or step > 150:
+                summary = engine.get_user_insights("user_1")["interaction_summary"]
+                assert summary == self.rescan(list(engine.interaction_history["user_1"]))
+        assert len(engine.interaction_history["user_1"]) == 100
+        assert engine.get_user_insights("user_1")["interaction_summary"]["improvement_trend"] == "improving"
+
+    def test_other_mutations_and_pickling_keep_aggregates_consistent(self):
+        import pickle
+        history = InteractionHistory(
+            ({"feedback": {"action": "accepted", "rating": r}} for r in [1, 1, 1, 1, 1, 5, 5, 5, 5, 5, 5, 5]),
+            maxlen=20
+        )
+        history.popleft()
+        history.appendleft({"feedback": {"action": "rejected", "rating": 2}})
+        restored = pickle.loads(pickle.dumps(history))
+
+        for h in (history, restored):
+            assert type(h) is InteractionHistory and h.maxlen == 20
+            assert h.recent_counts(10) == (10, 10, 0)
+            assert h.half_rating_means() == (np.mean([2, 1, 1, 1, 1, 5]), 5.0)
+            assert h.accepted_types() == {"unknown": 11}
+
+    def test_many_users_in_one_call(self, engine):
+        engine.process_user_feedback("user_1", "t1", {"action": "accepted", "rating": 5})
+        insights = engine.get_users_insights(["user_1", "user_2", "user_1"])
+
+        assert list(insights) == ["user_1", "user_2"]
+        assert insights["user_1"]["interaction_summary"]["recent_acceptance_rate"] == 1.0
+        assert insights["user_2"]["interaction_summary"]["total_interactions"] == 0
+
+class TestTweakRegistry:
+    """Issued recommendations are joined back to feedback by tweak_id"""
+
+    def _issue(self, engine, user_id, event, energy=8):
+        context = WorkoutContext(time_of_day="morning", day_of_week=1, user_energy=energy, user_motivation=8)
+        return engine.generate_personalized_recommendation(
+            user_id, {"planned_reps": 10, "planned_weight": 100, "planned_sets": 3}, context, event
+        )
+
+    def test_feedback_records_type_and_confidence(self, tmp_path):
+        engine = make_engine(tmp_path, durability="memory")
+        struggle = self._issue(engine, "user_1", "struggle_set")
+        steady = self._issue(engine, "user_1", "workout_tweak")
+        assert struggle.tweak_id and struggle.tweak_id != steady.tweak_id
+
+        engine.process_user_feedback("user_1", struggle.tweak_id, {"action": "accepted"})
+        engine.process_user_feedback("user_1", steady.tweak_id, {"action": "rejected"})
+        engine.process_user_feedback("user_2", steady.tweak_id, {"action": "accepted"})  # not user_2's tweak
+
+        history = list(engine.interaction_history["user_1"])
+        assert [i["type"] for i in history] == [struggle.type, steady.type]
+        assert history[0]["confidence"] == struggle.confidence
+        assert "type" not in engine.interaction_history["user_2"][0]
+        assert engine.get_user_insights("user_1")["interaction_summary"]["preferred_recommendation_types"] == {struggle.type: 1}
+
+        stats = engine.get_recommendation_type_stats()
+        assert stats["unmatched_feedback"] == 1
+        assert stats["types"][struggle.type]["accepted"] == 1
+        assert stats["types"][steady.type]["rejected"] == 1
+        assert stats["types"][steady.type]["mean_confidence"] == steady.confidence
+
+    def test_confidence_trend_follows_joined_confidences(self, tmp_path):
+        engine = make_engine(tmp_path, durability="memory")
+        for confidence in [0.9] * 5 + [0.5] * 5:
+            recommendation = self._issue(engine, "user_1", "complete_set")
+            engine.tweak_registry.get(recommendation.tweak_id)["confidence"] = confidence
+            engine.process_user_feedback("user_1", recommendation.tweak_id, {"action": "accepted"})
+            if len(engine.interaction_history["user_1"]) == 4:
+                assert engine.get_user_insights("user_1")["ai_performance"]["confidence_trend"] == "establishing_baseline"
+
+        assert engine.get_user_insights("user_1")["ai_performance"]["confidence_trend"] == "decreasing"
+
+    def test_batch_recommendations_are_registered(self, tmp_path):
+        engine = make_engine(tmp_path, durability="memory")
+        context = WorkoutContext(time_of_day="morning", day_of_week=1)
+        results = engine.generate_personalized_recommendations_batch(
+            [(f"user_{i}", {"planned_reps": 8}, context) for i in range(3)]
+        )
+        assert len({r.tweak_id for r in results}) == 3
+        assert [engine.tweak_registry.get(r.tweak_id)["user_id"] for r in results] == ["user_0", "user_1", "user_2"]
@@ -0,0 +1,610 @@
+"""
+Inference Service Test Suite
+Tests for the /event inference path in app.py: worker pool, micro-batching, caching, load shedding and fallbacks
+"""
+
+import os
+import sys
+import asyncio
+import json
+import threading
+
+import pytest
+
+# Never reach out to the Hugging Face Hub from tests
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+try:
+    from fastapi.testclient import TestClient
+    import app as service
+    IMPORTS_AVAILABLE = True
+except ImportError:
+    IMPORTS_AVAILABLE = False
+
+pytestmark = pytest.mark.skipif(not IMPORTS_AVAILABLE, reason="Inference service imports not available")
+
+EVENT_REQUEST = {
+    "event": "skip_set",
+    "user_id": "test_user_123",
+    "context": {"exercise": "bench_press", "set_number": 3},
+    "user_data": {
+        "fitness_level": "intermediate",
+        "current_program": {"planned_reps": 10},
+        "goals": ["build_muscle"]
+    }
+}
+
+LOCAL_TOKENIZER_PATH = os.path.join(os.path.dirname(__file__), '..', 'fine_tuned_gpt2')
+
+@pytest.fixture
+def client():
+    return TestClient(service.app)
+
+@pytest.fixture
+def tiny_model(monkeypatch):
+    """Install a small randomly initialised GPT-2 with the real tokenizer"""
+    from transformers import GPT2Config, GPT2LMHeadModel, GPT2Tokenizer
+
+    torch = pytest.importorskip("torch")
+    torch.manual_seed(0)
+    tokenizer = GPT2Tokenizer.from_pretrained(LOCAL_TOKENIZER_PATH)
+    tokenizer.pad_token = tokenizer.eos_token
+    tokenizer.padding_side = "left"
+    model = GPT2LMHeadModel(GPT2Config(n_layer=2, n_head=2, n_embd=64))
+    model.eval()
+
+    monkeypatch.setattr(service, "model", model)
+    monkeypatch.setattr(service, "tokenizer", tokenizer)
+    monkeypatch.setattr(service, "MAX_NEW_TOKENS", 8)
+    return model, tokenizer
+
+class TestInferenceExecutor:
+    """Worker pool admission and bookkeeping"""
+
+    def test_rejects_when_workers_and_queue_are_full(self):
+        executor = service.InferenceExecutor(workers=1, queue_depth=0)
+        release = threading.Event()
+
+        async def scenario():
+            blocked = asyncio.ensure_future(executor.run(release.wait, 5))
+            await asyncio.sleep(0.05)
+            with pytest.raises(service.InferenceQueueFull):
+                await executor.run(lambda: None)
+            release.set()
+            await blocked
+
+        asyncio.run(scenario())
+        stats = executor.stats()
+        assert stats["rejected"] == 1
+        assert stats["completed"] == 1
+        assert stats["in_flight"] == 0
+        executor.shutdown()
+
+    def test_runs_off_the_event_loop_thread(self):
+        executor = service.InferenceExecutor(workers=2, queue_depth=2)
+
+        async def scenario():
+            return await executor.run(threading.current_thread)
+
+        worker = asyncio.run(scenario())
+        assert worker is not threading.main_thread()
+        assert worker.name.startswith("inference")
+        executor.shutdown()
+
+class TestTweakBatcher:
+    """Micro-batching of concurrent generations"""
+
+    def test_concurrent_prompts_share_one_generate_call(self, monkeypatch):
+        batch_sizes = []
+
+        def fake_generate(prompts):
+            batch_sizes.append(len(prompts))
+            return [f"echo:{prompt}" for prompt in prompts]
+
+        monkeypatch.setattr(service, "generate_tweak_texts", fake_generate)
+        executor = service.InferenceExecutor(workers=1, queue_depth=4)
+        batcher = service.TweakBatcher(executor, max_batch_size=4, max_wait_ms=50)
+
+        async def scenario():
+            return await asyncio.gather(*(batcher.submit(f"p{i}") for i in range(4)))
+
+        results = asyncio.run(scenario())
+
+        assert results == ["echo:p0", "echo:p1", "echo:p2", "echo:p3"]
+        assert batch_sizes == [4]
+        stats = batcher.stats()
+        assert stats["batches"] == 1
+        assert stats["avg_batch_fill"] == 1.0
+        assert stats["latency_ms"]["samples"] == 4
+        executor.shutdown()
+
+    def test_rejects_beyond_max_pending(self):
+        batcher = service.TweakBatcher(service.InferenceExecutor(), max_batch_size=2, max_pending=1)
+
+        async def scenario():
+            first = asyncio.ensure_future(batcher.submit("a"))
+            await asyncio.sleep(0)
+            with pytest.raises(service.InferenceQueueFull):
+                await batcher.submit("b")
+            first.cancel()
+
+        asyncio.run(scenario())
+        assert batcher.rejected == 1
+
+    def test_batched_generate_returns_one_continuation_per_prompt(self, tiny_model):
+        prompts = [
+            service.build_tweak_prompt("skip_set", {}, {}),
+            service.build_tweak_prompt("complete_workout", {"goals": ["strength"]}, {"set_number": 3})
+        ]
+
+        texts = service.generate_tweak_texts(prompts)
+
+        assert len(texts) == 2
+        assert all(isinstance(text, str) for text in texts)
+        assert not any("Return ONLY valid JSON" in text for text in texts)
+
+class TestConstrainedDecoding:
+    """Grammar-constrained tweak generation"""
+
+    @pytest.fixture
+    def grammar(self, tiny_model):
+        return service.tweak_grammar_for(tiny_model[1])
+
+    def test_grammar_accepts_only_the_tweak_schema(self, grammar):
+        valid = ' {"action": "reduce_volume", "reason": "Tired - go easy", "modifications": {"sets": -1, "rest_time": 30.5}}'
+
+        assert grammar.walk(grammar.START, valid) == grammar.DONE
+        assert grammar.walk(grammar.START, '{"action": "two words"') is None
+        assert grammar.walk(grammar.START, '{"action": "a", "reason": "b", "modifications": {"reps": 07') is None
+        assert grammar.walk(grammar.START, '{"reason": "b"') is None
+
+    def test_closed_object_only_allows_eos(self, grammar):
+        mask = grammar.allowed_tokens(grammar.DONE, 10)
+
+        assert mask.nonzero().flatten().tolist() == [grammar.eos_token_id]
+
+    def test_random_model_output_always_parses(self, tiny_model, monkeypatch):
+        monkeypatch.setattr(service, "MAX_NEW_TOKENS", 60)
+        monkeypatch.setattr(service, "generation_metrics", service.GenerationMetrics())
+        prompts = [service.build_tweak_prompt("skip_set", {}, {}) for _ in range(3)]
+
+        texts = service.generate_tweak_texts(prompts)
+        tweaks = [service.tweak_from_response(text, {}) for text in texts]
+
+        assert all(tweak is not None for tweak in tweaks)
+        assert all(set(tweak) == {"action", "reason", "modifications"} for tweak in tweaks)
+        stats = service.generation_metrics.stats()
+        assert stats["wasted"] == 0
+        assert stats["avg_new_tokens"] <= 60
+
+class TestEarlyStopping:
+    """Stopping each row at its tweak's closing brace"""
+
+    def test_rows_stop_independently(self, tiny_model):
+        import torch
+
+        _, tokenizer = tiny_model
+        closed = tokenizer.encode(' {"action": "a", "modifications": {"sets": 1}} trailing')
+        still_open = tokenizer.encode(' {"action": "a", "reason": "b } is inside a string, so keep going"')
+        width = min(len(closed), len(still_open))
+        criteria = service.JSONObjectStoppingCriteria(tokenizer, prompt_width=1, max_new_tokens=50)
+
+        done = None
+        for step in range(1, width + 1):
+            input_ids = torch.tensor([[0] + closed[:step], [0] + still_open[:step]])
+            done = criteria(input_ids, None)
+            if done[0]:
+                break
+
+        assert done.tolist() == [True, False]
+        assert criteria.tokens_saved[0] == 50 - step
+        assert criteria.tokens_saved[1] == 0
+
+    def test_closed_tweak_reports_tokens_saved(self, tiny_model, monkeypatch):
+        monkeypatch.setattr(service, "CONSTRAINED_DECODING", True)
+        monkeypatch.setattr(service, "MAX_NEW_TOKENS", 80)
+        monkeypatch.setattr(service, "generation_metrics", service.GenerationMetrics())
+
+        service.generate_tweak_texts([service.build_tweak_prompt("skip_set", {}, {})])
+
+        stats = service.generation_metrics.stats()
+        assert stats["early_stops"] == 1
+        assert stats["avg_new_tokens"] + stats["avg_tokens_saved"] == 80
+
+class TestPromptPrefixCache:
+    """Reusing the static prompt header's key/value states"""
+
+    PROMPTS = [
+        ("skip_set", {}, {}),
+        ("complete_workout", {"goals": ["strength", "endurance"]}, {"set_number": 3, "exercise": "deadlift"})
+    ]
+
+    def test_split_encoding_matches_full_prompt_tokens(self, tiny_model):
+        model, tokenizer = tiny_model
+        prefix_ids, _ = service.PromptPrefixCache(enabled=False).prepare(model, tokenizer)
+
+        for args in self.PROMPTS:
+            prompt = service.build_tweak_prompt(*args)
+            input_ids, _, shares_prefix = service.encode_tweak_prompts([prompt], tokenizer, prefix_ids)
+
+            assert shares_prefix
+            assert input_ids[0].tolist() == tokenizer(prompt)["input_ids"]
+
+    def test_prompt_keeps_request_details_before_rules(self):
+        prompt = service.build_tweak_prompt("skip_set", {"goals": ["strength"]}, {"set_number": 3})
+
+        assert prompt.splitlines() == [
+            "You are a fitness AI assistant. Generate a JSON workout tweak response.",
+            "",
+            "Event: skip_set",
+            "User Fitness Level: intermediate",
+            "Goals: strength",
+            "Current Program: {}",
+            'Context: {"set_number": 3}',
+            "",
+            "Rules:",
+            "- No rep drops below 80% of planned reps",
+            "- Maintain progressive overload principles",
+            "- Consider user's fitness level and goals",
+            "",
+            "Return ONLY valid JSON with these exact fields:",
+            '{"action": "action_name", "reason": "explanation", "modifications": {"field": value}}',
+            "",
+            "JSON:"
+        ]
+
+    def test_cached_prefix_matches_full_prefill(self, tiny_model):
+        model, tokenizer = tiny_model
+        cache = service.PromptPrefixCache(enabled=True)
+        prompts = [service.build_tweak_prompt(*args) for args in self.PROMPTS]
+
+        prefix_ids, cached = cache.prepare(model, tokenizer)
+        input_ids, attention_mask, shares_prefix = service.encode_tweak_prompts(prompts, tokenizer, prefix_ids)
+        settings = {"max_new_tokens": 6, "do_sample": False, "pad_token_id": tokenizer.eos_token_id}
+        full = model.generate(input_ids=input_ids, attention_mask=attention_mask, **settings)
+        reused = model.generate(input_ids=input_ids, attention_mask=attention_mask,
+                                past_key_values=cache.past_key_values(len(prompts)), **settings)
+
+        assert cached and shares_prefix
+        assert reused.tolist() == full.tolist()
+
+    def test_hot_swap_rebuilds_prefix_states(self, tiny_model, monkeypatch):
+        model, tokenizer = tiny_model
+        cache = service.PromptPrefixCache(enabled=True)
+        monkeypatch.setattr(service, "prompt_prefix_cache", cache)
+        monkeypatch.setattr(service, "tweak_cache", service.TweakCache())
+
+        service.generate_tweak_texts([service.build_tweak_prompt("skip_set", {}, {})])
+        service.install_model(model, tokenizer)
+        service.generate_tweak_texts([service.build_tweak_prompt("skip_set", {}, {})])
+
+        assert cache.stats()["builds"] == 2
+        assert cache.stats()["uses"] == 2
+
+class TestBackgroundModelLoading:
+    """Lazy model loading and liveness/readiness probes"""
+
+    @pytest.fixture(autouse=True)
+    def isolated_model_state(self, monkeypatch):
+        for key, value in {"status": "loading", "source": None, "error": None, "load_seconds": None}.items():
+            monkeypatch.setitem(service.model_state, key, value)
+        monkeypatch.setattr(service, "model", None)
+        monkeypatch.setattr(service, "tokenizer", None)
+
+    def test_warming_instance_is_alive_but_not_ready(self, client):
+        assert client.get("/health/live").status_code == 200
+        assert client.get("/health").json()["model_status"] == "loading"
+
+        response = client.get("/health/ready")
+        assert response.status_code == 503
+        assert "Retry-After" in response.headers
+
+    def test_initialize_model_publishes_loaded_model(self, client, monkeypatch):
+        loaded = (object(), object())
+        monkeypatch.setattr(service, "load_model", lambda: loaded)
+
+        service.initialize_model()
+
+        assert service.model_state["status"] == "ready"
+        assert (service.model, service.tokenizer) == loaded
+        assert client.get("/health/ready").json()["ready"] is True
+
+    def test_failed_load_keeps_serving_fallbacks(self, client, monkeypatch):
+        monkeypatch.setattr(service, "load_model", lambda: (None, None))
+
+        service.initialize_model()
+
+        assert service.model_state["status"] == "failed"
+        ready = client.get("/health/ready").json()
+        assert ready["degraded"] is True
+        event = client.post("/event", json=EVENT_REQUEST).json()
+        assert event["ai_powered"] is False
+
+class TestModelArtifactCache:
+    """Verified on-disk snapshots used ahead of the network tiers"""
+
+    def test_stored_snapshot_round_trips(self, tiny_model, tmp_path):
+        import torch
+
+        model, tokenizer = tiny_model
+        cache = service.ModelArtifactCache(str(tmp_path))
+
+        cache.store("distilgpt2", "abc123", model, tokenizer)
+        snapshot = cache.lookup("distilgpt2")
+        loaded, loaded_tokenizer = service.load_pretrained(snapshot)
+
+        assert snapshot.endswith(os.path.join("snapshots", "abc123"))
+        assert "model.safetensors" in os.listdir(snapshot)
+        assert loaded_tokenizer.padding_side == "left"
+        input_ids = torch.randint(0, 1000, (1, 8))
+        with torch.no_grad():
+            assert torch.allclose(model(input_ids).logits, loaded(input_ids).logits, atol=1e-6)
+
+    def test_corrupted_snapshot_is_discarded(self, tiny_model, tmp_path):
+        model, tokenizer = tiny_model
+        cache = service.ModelArtifactCache(str(tmp_path))
+        snapshot = cache.store("distilgpt2", "abc123", model, tokenizer)
+
+        with open(os.path.join(snapshot, "config.json"), "a") as f:
+            f.write(" ")
+
+        assert cache.lookup("distilgpt2") is None
+        assert not os.path.exists(snapshot)
+        assert cache.stats()["corrupt"] == 1
+
+    def _install_cache(self, cache, monkeypatch, reachable=()):
+        """Use ``cache``; only sources in ``reachable`` load over the network (returns the attempts)"""
+        attempts = []
+
+        def network(source, token=None):
+            attempts.append(source)
+            if source not in reachable:
+                raise OSError(f"{source} unreachable")
+            return reachable[source]
+
+        monkeypatch.setattr(service, "model_artifact_cache", cache)
+        monkeypatch.setattr(service, "load_and_cache", network)
+        monkeypatch.setitem(service.model_state, "source", None)
+        monkeypatch.setattr(service, "precision_report", service.precision_report)
+        return attempts
+
+    def test_load_model_prefers_cache_over_network(self, tiny_model, tmp_path, monkeypatch):
+        model, tokenizer = tiny_model
+        cache = service.ModelArtifactCache(str(tmp_path))
+        cache.store(service.MODEL_REPO, "abc123", model, tokenizer)
+        attempts = self._install_cache(cache, monkeypatch)
+
+        loaded, _ = service.load_model()
+
+        assert loaded is not None
+        assert attempts == []
+        assert service.model_state["source"] == service.MODEL_REPO
+        assert cache.stats()["hits"] == 1
+
+    def test_cached_lower_tier_does_not_shadow_reachable_hub(self, tiny_model, tmp_path, monkeypatch):
+        model, tokenizer = tiny_model
+        cache = service.ModelArtifactCache(str(tmp_path))
+        cache.store(service.MODEL_NAME, "abc123", model, tokenizer)
+        attempts = self._install_cache(cache, monkeypatch, reachable={service.MODEL_REPO: (model, tokenizer)})
+
+        loaded, _ = service.load_model()
+
+        assert loaded is model
+        assert attempts == [service.MODEL_REPO]
+        assert service.model_state["source"] == service.MODEL_REPO
+
+    def test_cached_lower_tier_serves_when_higher_tiers_fail(self, tiny_model, tmp_path, monkeypatch):
+        model, tokenizer = tiny_model
+        cache = service.ModelArtifactCache(str(tmp_path))
+        cache.store(service.MODEL_NAME, "abc123", model, tokenizer)
+        attempts = self._install_cache(cache, monkeypatch)
+
+        loaded, _ = service.load_model()
+
+        assert loaded is not None
+        assert attempts == [service.MODEL_REPO, service.LOCAL_MODEL_PATH]
+        assert service.model_state["source"] == service.MODEL_NAME
+
+class TestModelPrecision:
+    """Startup precision selection and self-check"""
+
+    def test_int8_quantization_passes_self_check(self, tiny_model):
+        model, tokenizer = tiny_model
+
+        optimized, report = service.optimize_model(model, tokenizer, "int8")
+
+        assert report["active"] == "int8"
+        assert report["perplexity_ratio"] <= service.PRECISION_MAX_PERPLEXITY_RATIO
+        assert optimized is not model
+
+    def test_int8_legacy_path_logs_its_deprecation_warnings(self, tiny_model, monkeypatch, caplog):
+        import warnings
+
+        model, tokenizer = tiny_model
+        monkeypatch.setitem(sys.modules, "torchao", None)  # the legacy torch.ao path
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", DeprecationWarning)
+            optimized, report = service.optimize_model(model, tokenizer, "int8")
+
+        assert report["active"] == "int8"
+        assert "deprecated torch.ao quantization path" in caplog.text
+
+    def test_int8_without_a_quantization_api_serves_fp32(self, tiny_model, monkeypatch):
+        import torch
+
+        model, tokenizer = tiny_model
+        monkeypatch.setitem(sys.modules, "torchao", None)
+        monkeypatch.delattr(torch.ao.quantization, "quantize_dynamic")
+
+        optimized, report = service.optimize_model(model, tokenizer, "int8")
+
+        assert optimized is model
+        assert report["active"] == "fp32"
+        assert "torchao" in report["error"]
+
+    def test_conv1d_swap_preserves_outputs(self, tiny_model):
+        import copy
+        import torch
+
+        model, _ = tiny_model
+        converted = copy.deepcopy(model)
+        service._replace_conv1d_with_linear(converted)
+        input_ids = torch.randint(0, 1000, (1, 12))
+
+        with torch.no_grad():
+            assert torch.allclose(model(input_ids).logits, converted(input_ids).logits, atol=1e-5)
+
+    def test_unknown_precision_serves_fp32(self, tiny_model):
+        model, tokenizer = tiny_model
+
+        optimized, report = service.optimize_model(model, tokenizer, "fp16")
+
+        assert optimized is model
+        assert report["active"] == "fp32"
+        assert "error" in report
+
+class TestTweakCache:
+    """Prompt-fingerprint response cache"""
+
+    def test_fingerprint_ignores_key_order(self):
+        first = service.TweakCache.fingerprint("skip_set", {"current_program": {"a": 1, "b": 2}}, {"x": 1, "y": 2})
+        second = service.TweakCache.fingerprint("skip_set", {"current_program": {"b": 2, "a": 1}}, {"y": 2, "x": 1})
+        other = service.TweakCache.fingerprint("struggle_set", {"current_program": {"a": 1, "b": 2}}, {"x": 1, "y": 2})
+
+        assert first == second
+        assert first != other
+
+    def test_evicts_least_recently_used(self):
+        cache = service.TweakCache(max_entries=2, max_bytes=10_000, ttl_seconds=60)
+        cache.put("a", {"action": "a"})
+        cache.put("b", {"action": "b"})
+        cache.get("a")
+        cache.put("c", {"action": "c"})
+
+        assert cache.get("b") is None
+        assert cache.get("a") == {"action": "a"}
+        assert cache.stats()["evictions"] == 1
+
+    def test_expired_entries_miss(self, monkeypatch):
+        cache = service.TweakCache(max_entries=4, max_bytes=10_000, ttl_seconds=10)
+        clock = [100.0]
+        monkeypatch.setattr(service.time, "monotonic", lambda: clock[0])
+
+        cache.put("a", {"action": "a"})
+        clock[0] += 11
+
+        assert cache.get("a") is None
+        assert cache.stats()["expirations"] == 1
+
+    def test_byte_budget_bounds_memory(self):
+        cache = service.TweakCache(max_entries=100, max_bytes=60, ttl_seconds=60)
+        for i in range(5):
+            cache.put(str(i), {"action": f"action_{i}"})
+
+        assert cache.stats()["bytes"] <= 60
+        assert cache.stats()["evictions"] > 0
+
+    def test_repeated_event_is_served_from_cache(self, client, monkeypatch):
+        calls = []
+
+        class EchoBatcher:
+            async def submit(self, prompt):
+                calls.append(prompt)
+                return '{"action": "add_rest", "reason": "tired", "modifications": {"rest_time": 30}}'
+
+        monkeypatch.setattr(service, "model", object())
+        monkeypatch.setattr(service, "tokenizer", object())
+        monkeypatch.setattr(service, "tweak_batcher", EchoBatcher())
+        monkeypatch.setattr(service, "tweak_cache", service.TweakCache())
+
+        first = client.post("/event", json=EVENT_REQUEST).json()
+        second = client.post("/event", json=EVENT_REQUEST).json()
+        client.post("/event", json={**EVENT_REQUEST, "fresh": True})
+
+        assert first["tweak"] == second["tweak"] == {
+            "action": "add_rest", "reason": "tired", "modifications": {"rest_time": 30}
+        }
+        assert len(calls) == 2
+        assert service.tweak_cache.stats()["hits"] == 1
+
+class TestEventEndpoint:
+    """/event behaviour around the inference pool"""
+
+    def test_queue_full_returns_503_with_retry_after(self, client, monkeypatch):
+        class SaturatedExecutor:
+            async def run(self, fn, *args, **kwargs):
+                raise service.InferenceQueueFull("saturated")
+
+        monkeypatch.setattr(service, "model", object())
+        monkeypatch.setattr(service, "tokenizer", object())
+        monkeypatch.setattr(service, "tweak_batcher", service.TweakBatcher(SaturatedExecutor()))
+
+        response = client.post("/event", json=EVENT_REQUEST)
+
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == str(service.INFERENCE_RETRY_AFTER)
+
+    def test_fallback_skips_inference_pool(self, client, monkeypatch):
+        class UnusedExecutor:
+            async def run(self, fn, *args, **kwargs):
+                raise AssertionError("fallback path must not use the inference pool")
+
+        monkeypatch.setattr(service, "model", None)
+        monkeypatch.setattr(service, "tokenizer", None)
+        monkeypatch.setattr(service, "tweak_batcher", service.TweakBatcher(UnusedExecutor()))
+
+        response = client.post("/event", json=EVENT_REQUEST)
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["ai_powered"] is False
+        assert data["tweak"]["action"] == "reduce_volume"
+
+class TestEventStreaming:
+    """/event/stream Server-Sent Events"""
+
+    @staticmethod
+    def parse_sse(body):
+        events = []
+        for frame in body.strip().split("\n\n"):
+            lines = dict(line.split(": ", 1) for line in frame.splitlines())
+            events.append((lines["event"], json.loads(lines["data"])))
+        return events
+
+    def test_partial_parser_emits_completed_fields_only(self):
+        parser = service.PartialTweakParser({"current_program": {"planned_reps": 10}})
+
+        assert parser.feed(' {"action": "reduce_re') == []
+        assert parser.feed('ps", "reason": "Tired') == [{"action": "reduce_reps"}]
+        assert parser.feed('", "modifications": {"reps": 2') == [{"reason": "Tired"}]
+        # The value is only final at the separator, and is safety-checked like the full tweak
+        assert parser.feed(', "sets": -1}}') == [{"modifications": {"reps": 8}}, {"modifications": {"sets": -1}}]
+
+    def test_stream_emits_fields_then_tweak_and_timings(self, client, tiny_model, monkeypatch):
+        monkeypatch.setattr(service, "MAX_NEW_TOKENS", 60)
+        monkeypatch.setattr(service, "tweak_cache", service.TweakCache())
+        monkeypatch.setattr(service, "stream_metrics", service.StreamMetrics())
+
+        response = client.post("/event/stream", json=EVENT_REQUEST)
+        events = self.parse_sse(response.text)
+
+        assert response.headers["content-type"].startswith("text/event-stream")
+        names = [name for name, _ in events]
+        assert names[-2:] == ["tweak", "done"]
+        assert {"action", "reason"} <= {key for name, data in events if name == "field" for key in data}
+        tweak = events[-2][1]["tweak"]
+        assert events[0][1] == {"action": tweak["action"]}
+        done = events[-1][1]
+        assert 0 < done["ttft_ms"] <= done["total_ms"]
+        assert service.stream_metrics.stats()["streams"] == 1
+
+    def test_stream_without_model_sends_fallback(self, client, monkeypatch):
+        monkeypatch.setattr(service, "model", None)
+        monkeypatch.setattr(service, "tokenizer", None)
+
+        events = self.parse_sse(client.post("/event/stream", json=EVENT_REQUEST).text)
+
+        assert [name for name, _ in events] == ["tweak", "done"]
+        assert events[0][1]["ai_powered"] is False
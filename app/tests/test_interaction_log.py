@@ -0,0 +1,78 @@
+"""
+Interaction Log Test Suite
+Tests for the append-only per-user/day interaction log: tail reads and retention
+"""
+
+import os
+import sys
+from datetime import datetime, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+try:
+    from interaction_log import InteractionLog
+    IMPORTS_AVAILABLE = True
+except ImportError:
+    IMPORTS_AVAILABLE = False
+
+pytestmark = pytest.mark.skipif(not IMPORTS_AVAILABLE, reason="Interaction log imports not available")
+
+DAY = 86400.0
+
+def day_timestamp(day: int, offset: float = 0.0) -> float:
+    return datetime(2024, 3, day, tzinfo=timezone.utc).timestamp() + offset
+
+@pytest.fixture
+def log(tmp_path):
+    return InteractionLog(str(tmp_path / "interactions"), retention_days=3)
+
+def record(i: int, day: int = 1):
+    return {"tweak_id": f"t{i}", "feedback": {"action": "accepted"}, "timestamp": day_timestamp(day, i)}
+
+class TestInteractionLog:
+    """Segmented appends and reads"""
+
+    def test_records_are_partitioned_by_user_and_day(self, log):
+        for i in range(3):
+            log.append("user/1", record(i, day=1))
+        log.append("user/1", record(3, day=2))
+        log.append("user_2", record(0, day=2))
+
+        assert [os.path.basename(p) for p in log.segments("user/1")] == ["2024-03-01.jsonl", "2024-03-02.jsonl"]
+        assert len(log.segments("user_2")) == 1
+        assert log.segments("missing") == []
+
+    def test_tail_spans_segments_newest_last(self, log):
+        for i in range(5):
+            log.append("user_1", record(i, day=1))
+        for i in range(5, 7):
+            log.append("user_1", record(i, day=2))
+
+        assert [r["tweak_id"] for r in log.tail("user_1", 4)] == ["t3", "t4", "t5", "t6"]
+        assert [r["tweak_id"] for r in log.tail("user_1", 100)] == [f"t{i}" for i in range(7)]
+        assert log.tail("missing", 10) == []
+
+    def test_retention_drops_whole_old_days(self, log):
+        for day in range(1, 6):
+            log.append("user_1", record(0, day=day))
+
+        assert [os.path.basename(p) for p in log.segments("user_1")] == [
+            "2024-03-03.jsonl", "2024-03-04.jsonl", "2024-03-05.jsonl"
+        ]
+        assert log.stats()["segments_pruned"] == 2
+
+    def test_torn_line_is_skipped_and_not_glued_to_next_append(self, log):
+        log.append("user_1", record(0))
+        with open(log.segments("user_1")[0], "ab") as f:
+            f.write(b'{"tweak_id": "torn", "feedb')
+        log.append("user_1", record(1))
+
+        assert [r["tweak_id"] for r in log.tail("user_1", 10)] == ["t0", "t1"]
+        assert log.stats()["corrupt_records"] == 1
+
+    def test_delete_user(self, log):
+        log.append("user_1", record(0))
+        log.delete_user("user_1")
+        assert log.tail("user_1", 10) == []
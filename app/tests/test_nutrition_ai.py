@@ -0,0 +1,388 @@
+"""
+Enhanced Nutrition AI Test Suite
+Tests for nutrition profile persistence, batch recommendations and the safety checks
+"""
+
+import json
+import os
+import pickle
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+try:
+    from enhanced_nutrition_ai import (
+        EnhancedNutritionAI,
+        HealthLimits,
+        HealthProfileCache,
+        NutritionRecommendation,
+        NutritionSafetyMonitor,
+        UserHealthProfile,
+        get_nutrition_recommendations,
+        get_nutrition_recommendations_batch,
+        health_profile_cache,
+        intake_matrix,
+        start_batch_pool
+    )
+    import enhanced_nutrition_ai
+    IMPORTS_AVAILABLE = True
+except ImportError:
+    IMPORTS_AVAILABLE = False
+
+# The FastAPI service (app.py) for the endpoint tests; never reach out to the Hugging Face Hub
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+try:
+    from fastapi.testclient import TestClient
+    import app as service
+    SERVICE_AVAILABLE = True
+except ImportError:
+    SERVICE_AVAILABLE = False
+
+pytestmark = pytest.mark.skipif(not IMPORTS_AVAILABLE, reason="Enhanced nutrition AI imports not available")
+
+@pytest.fixture
+def nutrition_ai(tmp_path):
+    engine = EnhancedNutritionAI(profiles_path=str(tmp_path / "health.db"))
+    yield engine
+    engine.close()
+
+class TestNutritionProfileStore:
+    """Per-user keyed records instead of a whole-file pickle"""
+
+    def test_feedback_upserts_only_that_user(self, nutrition_ai, monkeypatch):
+        nutrition_ai.process_nutrition_feedback("user_1", "protein_1", {"accepted": True})
+        written = []
+        original_put = nutrition_ai.profile_store.put
+        monkeypatch.setattr(nutrition_ai.profile_store, "put", lambda key, record: (written.append(key), original_put(key, record)))
+
+        nutrition_ai.process_nutrition_feedback("user_2", "protein_2", {"accepted": False})
+
+        assert written == ["user_2"]
+        assert nutrition_ai.profile_store.get("user_1")["nutrition_preferences"]["total_accepted"] == 1
+        assert nutrition_ai.profile_store.get("user_2")["nutrition_preferences"]["protein_acceptance_rate"] == pytest.approx(0.45)
+
+    def test_records_are_read_through_after_restart(self, tmp_path):
+        first = EnhancedNutritionAI(profiles_path=str(tmp_path / "health.db"), cache_size=1)
+        for user_id in ("user_1", "user_2"):
+            first.process_nutrition_feedback(user_id, "hydration_1", {"accepted": True})
+        assert first.user_profiles_cache.resident_count() == 1
+        first.close()
+
+        restarted = EnhancedNutritionAI(profiles_path=str(tmp_path / "health.db"))
+        assert restarted.user_profiles_cache.resident_count() == 0
+        insights = restarted.get_nutrition_insights("user_1")
+        assert insights["recommendations_summary"]["total_accepted"] == 1
+        assert sorted(restarted.user_profiles_cache) == ["user_1", "user_2"]
+        restarted.close()
+
+    def test_eviction_before_save_does_not_lose_feedback(self, tmp_path, monkeypatch):
+        engine = EnhancedNutritionAI(profiles_path=str(tmp_path / "health.db"), cache_size=1)
+        for user_id in ("user_1", "user_2"):
+            engine.process_nutrition_feedback(user_id, "protein_1", {"accepted": True})
+        original_save = engine._save_user_profile
+
+        def save_after_other_request(user_id, record):
+            engine.user_profiles_cache.get("user_2")  # another request faults in a user first
+            original_save(user_id, record)
+
+        monkeypatch.setattr(engine, "_save_user_profile", save_after_other_request)
+        engine.process_nutrition_feedback("user_1", "protein_2", {"accepted": True})
+
+        assert engine.profile_store.get("user_1")["nutrition_preferences"]["total_accepted"] == 2
+        engine.close()
+
+    def test_store_is_not_created_until_used(self, tmp_path):
+        engine = EnhancedNutritionAI(profiles_path=str(tmp_path / "health.db"))
+        assert not os.path.exists(tmp_path / "health.db")
+        engine.close()
+
+    def test_legacy_pickle_is_migrated_once(self, tmp_path):
+        legacy = tmp_path / "user_health_profiles.pkl"
+        with open(legacy, "wb") as f:
+            pickle.dump({"user_1": {"nutrition_preferences": {"total_recommendations": 3, "total_accepted": 2}}}, f)
+
+        engine = EnhancedNutritionAI(profiles_path=str(tmp_path / "health.db"), legacy_profiles_path=str(legacy))
+
+        assert not legacy.exists() and (tmp_path / "user_health_profiles.pkl.migrated").exists()
+        assert engine.get_nutrition_insights("user_1")["recommendations_summary"]["total_generated"] == 3
+        assert engine.migrate_legacy_profiles(str(legacy)) == 0
+        engine.close()
+
+def nutrition_request(i: int) -> dict:
+    return {
+        "user_id": f"user_{i}",
+        "health_data": {"safety_flags": {"diabetesFlag": i % 3 == 0}, "body_weight_kg": 60 + i},
+        "recovery_data": {"recovery_score": 30 + (i * 7) % 60, "sleep_duration": 5 + i % 4},
+        "current_intake": {"protein": 40 + i, "hydration": 1.0, "sugar": 20 + i * 3, "calories": 1500},
+        "goals": {"protein": 120, "hydration": 2.5, "carbs": 250, "calories": 2200},
+    }
+
+def comparable(result: dict) -> dict:
+    """A result without its generation timestamps"""
+    return {
+        key: [{k: v for k, v in rec.items() if k != "expires_at"} for rec in value] if key == "recommendations" else value
+        for key, value in result.items()
+    }
+
+class TestNutritionBatch:
+    """get_nutrition_recommendations_batch matches per-user calls and isolates failures"""
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_results_match_single_calls_in_order(self, workers):
+        requests = [nutrition_request(i) for i in range(9)]
+        results = list(get_nutrition_recommendations_batch(requests, workers=workers, chunk_size=2))
+
+        assert [r["index"] for r in results] == list(range(9))
+        for request, result in zip(requests, results):
+            expected = {"index": result["index"], "user_id": request["user_id"], **get_nutrition_recommendations(**request)}
+            assert comparable(result) == comparable(expected)
+
+    def test_failing_items_only_fail_themselves(self):
+        requests = [nutrition_request(0), {"goals": {}}, "not a request", {**nutrition_request(3), "goals": {"protein": 100}}]
+        results = list(get_nutrition_recommendations_batch(requests, workers=2, chunk_size=1))
+
+        assert [r["success"] for r in results] == [True, False, False, False]
+        assert [r["user_id"] for r in results] == ["user_0", None, None, "user_3"]
+        assert "calories" in results[3]["error"]
+
+    def test_items_are_validated_one_by_one(self):
+        requests = [nutrition_request(0), {**nutrition_request(1), "goals": {"protein": "lots"}},
+                    {**nutrition_request(2), "health_data": []}]
+        results = list(get_nutrition_recommendations_batch(requests, workers=1))
+
+        assert [r["success"] for r in results] == [True, False, False]
+        assert "goals values must be numbers" in results[1]["error"]
+        assert "health_data must be an object" in results[2]["error"]
+
+    def test_calls_share_one_pool_and_time_out_to_in_process(self, monkeypatch):
+        requests = [nutrition_request(i) for i in range(4)]
+        list(get_nutrition_recommendations_batch(requests, workers=2, chunk_size=1))
+        pool = start_batch_pool()
+
+        monkeypatch.setattr(enhanced_nutrition_ai, "NUTRITION_BATCH_CHUNK_TIMEOUT", 0)
+        results = list(get_nutrition_recommendations_batch(requests, workers=2, chunk_size=1))
+
+        assert start_batch_pool() is pool
+        assert [(r["index"], r["success"]) for r in results] == [(i, True) for i in range(4)]
+
+    def test_chunk_that_cannot_reach_a_worker_is_computed_in_process(self):
+        unpicklable = {**nutrition_request(1), "health_data": {**nutrition_request(1)["health_data"], "callback": lambda: None}}
+        results = list(get_nutrition_recommendations_batch([nutrition_request(0), unpicklable], workers=2, chunk_size=1))
+
+        assert [(r["index"], r["success"]) for r in results] == [(0, True), (1, True)]
+
+def random_health_profiles(rng, n):
+    return [
+        UserHealthProfile(
+            user_id=f"user_{i}",
+            medical_conditions=rng.choice([[], ["hypertension"], ["diabetes"]]),
+            allergies=[], medications=[],
+            safety_flags={flag: rng.random() < 0.3 for flag in ("diabetesFlag", "heartConditionFlag", "kidneyIssueFlag")},
+            metabolic_data={}
+        )
+        for i in range(n)
+    ]
+
+class TestVectorizedSafetyCheck:
+    """check_daily_intake_batch reproduces check_daily_intake exactly"""
+
+    def test_matches_scalar_check(self):
+        import random
+        rng = random.Random(3)
+        monitor = NutritionSafetyMonitor()
+        profiles = random_health_profiles(rng, 2000)
+        weights = [rng.choice([50, 70.5, 95, 120.25]) for _ in profiles]
+        # Values around each threshold for the chosen weights, plus missing nutrients
+        intakes = []
+        for weight in weights:
+            intake = {
+                "calories": weight * rng.choice([14.99, 15, 15.01, 30, 49.99, 50, 50.01, 60]),
+                "protein": weight * rng.choice([0.5, 0.79, 0.8, 1.2, 1.21, 2.0, 2.01, 3.0, 3.01]),
+                "sodium": rng.choice([1499, 1500, 1501, 2300, 2300.5, 5000]),
+            }
+            intakes.append({k: v for k, v in intake.items() if rng.random() < 0.95})
+
+        alerts = monitor.check_daily_intake_batch(intake_matrix(intakes), HealthLimits.from_profiles(profiles), weights)
+
+        for i, (intake, profile, weight) in enumerate(zip(intakes, profiles, weights)):
+            assert alerts.alerts(i) == monitor.check_daily_intake(intake, profile, weight)
+
+    def test_population_sweep(self, nutrition_ai):
+        profiles = [UserHealthProfile(f"user_{i}", [], [], [], {}, {}) for i in range(4)]
+        profiles[1].safety_flags = {"kidneyIssueFlag": True}
+        intake = intake_matrix([
+            {"calories": 2100, "protein": 100, "sodium": 2000},
+            {"calories": 2100, "protein": 140, "sodium": 2000},  # above the kidney limit (1.2 g/kg)
+            {"calories": 500, "protein": 100, "sodium": 2000},  # below 15 cal/kg
+            {"calories": 2100, "protein": 100, "sodium": 2000},
+        ])
+        sweep = nutrition_ai.safety_sweep(intake, HealthLimits.from_profiles(profiles), np.full(4, 70.0),
+                                          user_ids=[p.user_id for p in profiles])
+
+        assert sweep["users"] == 4
+        assert sweep["critical_users"] == ["user_1", "user_2"]
+        assert sweep["alert_counts"]["excessive_protein"] == {"warning": 0, "critical": 1}
+        assert sweep["alert_counts"]["excessive_deficit"] == {"warning": 0, "critical": 1}
+
+def recommendation(action, target_value=None):
+    return NutritionRecommendation(
+        user_id="user_1", recommendation_type="test", title="t", description="d", action=action,
+        target_value=target_value, target_unit=None, priority="medium", reasoning={}, confidence=0.9,
+        safety_checked=False, expires_at=None
+    )
+
+class TestSafetyPolicy:
+    """is_safe_for_user through the compiled per-user policy"""
+
+    ACTIONS = ['increase_protein', 'adjust_sodium', 'increase_simple_carbs', 'add_sugar', 'increase_hydration',
+               'reduce_sugar', 'add_potassium_rich_foods', 'Increase_Grapefruit', 'increase_fiber']
+
+    def test_matches_uncompiled_checks(self):
+        import random
+        rng = random.Random(11)
+        tokens = ['protein', 'sugar', 'potassium', 'grapefruit', 'sodium', 'fiber', 'vitamin_k', 'Sugar', '']
+        for i in range(300):
+            profile = UserHealthProfile(
+                user_id=f"user_{i}",
+                medical_conditions=rng.choice([[], ["hypertension"], ["diabetes"]]),
+                allergies=[],
+                medications=[
+                    {"name": f"med_{m}", "nutritionInteractions": rng.sample(tokens[:-1] if rng.random() < 0.9 else tokens, rng.randint(0, 3))}
+                    for m in range(rng.randint(0, 40))
+                ],
+                safety_flags={flag: rng.random() < 0.3 for flag in ("diabetesFlag", "heartConditionFlag", "kidneyIssueFlag")},
+                metabolic_data={}
+            )
+            for action in self.ACTIONS:
+                rec = recommendation(action, rng.choice([None, 0, 1.0, 1.5, 2.5, 1400, 1600, 2400]))
+                assert rec.is_safe_for_user(profile) == rec._check_safety(profile)
+
+    def test_policy_is_cached_and_invalidated(self):
+        profile = UserHealthProfile("user_1", [], [], [{"name": "warfarin", "nutritionInteractions": ["vitamin_k"]}], {}, {})
+        policy = profile.safety_policy()
+        assert profile.safety_policy() is policy
+        assert recommendation("add_vitamin_k_foods").is_safe_for_user(profile) == (False, ["Potential interaction with medication: warfarin"])
+
+        profile.safety_flags = {"diabetesFlag": True}
+        assert profile.safety_policy() is not policy
+        assert recommendation("add_sugar").is_safe_for_user(profile)[0] is False
+
+        profile.medications.append({"name": "lisinopril", "nutritionInteractions": ["potassium"]})
+        profile.invalidate_safety_policy()
+        assert recommendation("add_potassium").is_safe_for_user(profile) == (False, ["Potential interaction with medication: lisinopril"])
+
+    def test_irregular_profiles_keep_scalar_behavior(self):
+        profile = UserHealthProfile("user_1", [], [], [{"name": "x", "nutritionInteractions": None}], {}, {})
+        assert profile.safety_policy().irregular
+        with pytest.raises(TypeError):
+            recommendation("increase_hydration").is_safe_for_user(profile)
+
+class TestHealthProfileCache:
+    """Parsed health profiles are reused while a user's health data is unchanged"""
+
+    HEALTH_DATA = {"medical_conditions": ["diabetes"], "medications": [{"name": "warfarin", "nutritionInteractions": ["vitamin_k"]}],
+                   "safety_flags": {"diabetesFlag": True}}
+
+    def test_unchanged_data_reuses_profile_and_policy(self):
+        cache = HealthProfileCache()
+        profile = cache.get_or_parse("user_1", self.HEALTH_DATA)
+        policy = profile.safety_policy()
+
+        again = cache.get_or_parse("user_1", {**self.HEALTH_DATA, "goals_note": "ignored"})
+        assert again is profile and again.safety_policy() is policy
+        assert profile.allergies == [] and profile.metabolic_data == {}
+        assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+    def test_changed_data_is_reparsed(self):
+        cache = HealthProfileCache()
+        health_data = {key: list(value) if isinstance(value, list) else dict(value) for key, value in self.HEALTH_DATA.items()}
+        profile = cache.get_or_parse("user_1", health_data)
+
+        health_data["medical_conditions"].append("hypertension")
+        changed = cache.get_or_parse("user_1", health_data)
+        assert changed is not profile
+        assert profile.medical_conditions == ["diabetes"]
+        assert changed.medical_conditions == ["diabetes", "hypertension"]
+        assert cache.stats()["entries"] == 1
+
+    def test_ttl_and_size_bounds(self, monkeypatch):
+        import enhanced_nutrition_ai
+        now = [1000.0]
+        monkeypatch.setattr(enhanced_nutrition_ai.time, "monotonic", lambda: now[0])
+
+        cache = HealthProfileCache(max_entries=2, ttl_seconds=60)
+        first = cache.get_or_parse("user_1", self.HEALTH_DATA)
+        now[0] += 61
+        assert cache.get_or_parse("user_1", self.HEALTH_DATA) is not first
+        assert cache.expirations == 1
+
+        cache.get_or_parse("user_2", {})
+        cache.get_or_parse("user_1", self.HEALTH_DATA)
+        cache.get_or_parse("user_3", {})
+        assert cache.evictions == 1
+        assert cache.stats()["entries"] == 2
+        cache.get_or_parse("user_2", {})
+        assert cache.stats()["misses"] == 5
+
+    def test_invalid_health_data_fails_the_request(self):
+        result = get_nutrition_recommendations(**{**nutrition_request(0), "health_data": {"medications": "warfarin"}})
+        assert result["success"] is False
+        assert "medications" in result["error"]
+
+    def test_recommendations_reuse_the_cached_profile(self):
+        request = nutrition_request(7)
+        first = get_nutrition_recommendations(**request)
+        hits = health_profile_cache.hits
+        second = get_nutrition_recommendations(**request)
+
+        assert health_profile_cache.hits == hits + 1
+        assert comparable(first) == comparable(second)
+
+@pytest.mark.skipif(not SERVICE_AVAILABLE, reason="FastAPI service not available")
+class TestNutritionEndpoints:
+    """The app.py nutrition endpoints reach enhanced_nutrition_ai rather than their fallbacks"""
+
+    @pytest.fixture
+    def client(self):
+        return TestClient(service.app)
+
+    def test_batch_streams_one_line_per_item(self, client):
+        requests = [nutrition_request(0), {**nutrition_request(1), "goals": {"protein": "lots"}}, nutrition_request(2)]
+        response = client.post("/nutrition/recommendations/batch", json={"requests": requests})
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert [(line["index"], line["user_id"], line["success"]) for line in lines] == [
+            (0, "user_0", True), (1, "user_1", False), (2, "user_2", True)
+        ]
+        assert "goals values must be numbers" in lines[1]["error"]
+
+    def test_repeated_request_reuses_the_parsed_profile(self, client):
+        request = nutrition_request(11)
+        first = client.post("/nutrition/recommendations", json=request).json()
+        hits, misses = health_profile_cache.hits, health_profile_cache.misses
+        second = client.post("/nutrition/recommendations", json=request).json()
+
+        assert first["success"] is True and first["ai_model_version"] != "fallback-v1.0"
+        assert (health_profile_cache.hits, health_profile_cache.misses) == (hits + 1, misses)
+        assert comparable(first) == comparable(second)
+
+    def test_unsafe_recommendation_is_filtered_by_the_compiled_policy(self, client, monkeypatch, caplog):
+        request = {**nutrition_request(12), "user_id": "diabetic_user", "current_intake": {"protein": 10, "calories": 1500}}
+        request["health_data"] = {"safety_flags": {"diabetesFlag": True}, "body_weight_kg": 60}
+        monkeypatch.setattr(NutritionRecommendation, "_check_safety",
+                            lambda self, profile: pytest.fail("regular profiles must use the compiled policy"))
+
+        result = client.post("/nutrition/recommendations", json=request).json()
+
+        assert result["success"] is True
+        assert "increase_protein" not in [rec["action"] for rec in result["recommendations"]]
+        assert "Protein recommendation exceeds safe limit" in caplog.text
+        profile = health_profile_cache.get_or_parse("diabetic_user", request["health_data"])
+        assert profile.safety_policy().diabetes
@@ -0,0 +1,209 @@
+"""
+Profile Store Test Suite
+Tests for the SQLite-backed keyed profile store, its pickle migration and the lazy LRU map
+"""
+
+import os
+import pickle
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+try:
+    from profile_store import LazyLRUMap, ProfileStore
+    IMPORTS_AVAILABLE = True
+except ImportError:
+    IMPORTS_AVAILABLE = False
+
+pytestmark = pytest.mark.skipif(not IMPORTS_AVAILABLE, reason="Profile store imports not available")
+
+@pytest.fixture
+def store(tmp_path):
+    store = ProfileStore(str(tmp_path / "profiles.db"))
+    yield store
+    store.close()
+
+class TestProfileStore:
+    """Keyed reads and writes"""
+
+    def test_put_replaces_single_record(self, store):
+        store.put("user_1", {"acceptance_rate": 0.5})
+        store.put("user_2", {"acceptance_rate": 0.7})
+        store.put("user_1", {"acceptance_rate": 0.9})
+
+        assert store.get("user_1") == {"acceptance_rate": 0.9}
+        assert store.get("missing") is None
+        assert len(store) == 2
+        assert "user_2" in store
+
+    def test_records_survive_reopen(self, tmp_path):
+        path = str(tmp_path / "profiles.db")
+        first = ProfileStore(path)
+        first.put_many([("a", {"x": 1}), ("b", {"x": 2})])
+        first.close()
+
+        reopened = ProfileStore(path)
+        assert dict(reopened.items()) == {"a": {"x": 1}, "b": {"x": 2}}
+        reopened.close()
+
+    def test_concurrent_writers_do_not_lose_records(self, store):
+        def write(worker):
+            for i in range(50):
+                store.put(f"user_{worker}_{i}", {"worker": worker, "i": i})
+
+        threads = [threading.Thread(target=write, args=(worker,)) for worker in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(store) == 200
+
+class TestPickleMigration:
+    """One-time import of the legacy whole-file pickle"""
+
+    def test_migrates_once_and_renames_pickle(self, store, tmp_path):
+        legacy = tmp_path / "user_profiles.pkl"
+        with open(legacy, 'wb') as f:
+            pickle.dump({"user_1": {"acceptance_rate": 0.4}, "user_2": {"acceptance_rate": 0.6}}, f)
+
+        assert store.migrate_from_pickle(str(legacy)) == 2
+        assert not legacy.exists()
+        assert (tmp_path / "user_profiles.pkl.migrated").exists()
+
+        # A stale copy reappearing later is not imported over newer data
+        store.put("user_1", {"acceptance_rate": 0.9})
+        with open(legacy, 'wb') as f:
+            pickle.dump({"user_1": {"acceptance_rate": 0.4}}, f)
+        assert store.migrate_from_pickle(str(legacy)) == 0
+        assert store.get("user_1") == {"acceptance_rate": 0.9}
+
+class TestLazyLRUMap:
+    """Faulting records in on access and evicting the least recently used"""
+
+    def test_faults_in_and_evicts_least_recently_used(self):
+        backing = {f"user_{i}": {"n": i} for i in range(5)}
+        evicted = []
+        profiles = LazyLRUMap(backing.get, max_resident=2, on_evict=lambda k, v: evicted.append(k),
+                              keys_source=lambda: list(backing))
+
+        assert profiles.resident_count() == 0
+        assert profiles["user_0"] == {"n": 0}
+        assert "user_1" in profiles
+        profiles["user_0"]  # user_0 is now the most recently used
+        assert profiles.get("user_2") == {"n": 2}
+
+        assert evicted == ["user_1"]
+        assert [k for k, _ in profiles.resident_items()] == ["user_0", "user_2"]
+        assert len(profiles) == 5
+        assert profiles.stats()["evictions"] == 1
+
+    def test_missing_keys_use_default_factory_only_on_getitem(self):
+        histories = LazyLRUMap(lambda key: None, max_resident=10, default_factory=list)
+
+        assert histories.get("user_1") is None
+        assert "user_1" not in histories
+        histories["user_1"].append("event")
+        assert histories["user_1"] == ["event"]
+
+    def test_entry_being_evicted_stays_visible_until_written(self):
+        backing = {"user_1": "stale"}
+        profiles = LazyLRUMap(backing.get, max_resident=1)
+        seen = []
+
+        def on_evict(key, value):
+            seen.append(profiles.peek(key))
+            backing[key] = value
+
+        profiles.on_evict = on_evict
+        profiles["user_1"] = "fresh"
+        profiles["user_2"] = "other"
+
+        assert seen == ["fresh"]
+        assert profiles.peek("user_1") is None
+        assert profiles["user_1"] == "fresh"
+
+    def test_checked_out_entry_is_not_evicted_until_released(self):
+        backing = {}
+        dirty = set()
+
+        def on_evict(key, value):
+            if key in dirty:
+                backing[key] = dict(value)
+                dirty.discard(key)
+
+        profiles = LazyLRUMap(backing.get, max_resident=1, on_evict=on_evict)
+
+        with profiles.checkout("user_1", create=dict) as profile:
+            profile["n"] = 1
+            profiles["user_2"] = {"n": 2}  # another request faults in a user mid-update
+            assert profiles.peek("user_1") is profile
+            dirty.add("user_1")
+
+        profiles["user_3"] = {"n": 3}
+        assert profiles.peek("user_1") is None
+        assert backing["user_1"] == {"n": 1}
+
+    def test_loader_runs_outside_the_lock_once_per_key(self):
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def loader(key):
+            calls.append(key)
+            if key == "slow":
+                started.set()
+                release.wait(5)
+            return {"key": key}
+
+        profiles = LazyLRUMap(loader, max_resident=10)
+        profiles["fast"] = {"key": "fast"}
+        readers = [threading.Thread(target=profiles.get, args=("slow",)) for _ in range(3)]
+        for reader in readers:
+            reader.start()
+        assert started.wait(5)
+
+        assert profiles.get("fast") == {"key": "fast"}  # not blocked by the slow load
+        release.set()
+        for reader in readers:
+            reader.join(5)
+        assert calls.count("slow") == 1
+
+    def test_len_counts_keys_once(self):
+        backing = {f"user_{i}": {"n": i} for i in range(3)}
+        listings = []
+
+        def keys_source():
+            listings.append(1)
+            return list(backing)
+
+        profiles = LazyLRUMap(backing.get, max_resident=2, default_factory=dict, keys_source=keys_source)
+
+        assert len(profiles) == 3
+        profiles["user_3"]  # created
+        profiles["user_4"] = {"n": 4}
+        profiles["user_0"] = {"n": 0}  # already stored
+        assert len(profiles) == 5
+        assert len(listings) == 1
+
+    def test_deleted_keys_leave_the_count(self):
+        backing = {f"user_{i}": {"n": i} for i in range(2)}
+        profiles = LazyLRUMap(backing.get, max_resident=2, default_factory=dict, on_evict=backing.__setitem__,
+                              keys_source=lambda: list(backing))
+        assert len(profiles) == 2
+
+        profiles["user_2"]["n"] = 2  # created in memory only
+        del profiles["user_2"]
+        profiles["user_0"]
+        del profiles["user_0"]  # still stored
+        assert len(profiles) == 2 and profiles.resident_count() == 0
+
+        profiles["user_3"]
+        profiles["user_4"]
+        assert profiles.stats()["evictions"] == 0
+        assert len(profiles) == 4 == sum(1 for _ in profiles)
+        profiles["user_5"]
+        assert profiles.stats()["evictions"] == 1
+        assert len(profiles) == 5 == len(backing) + profiles.resident_count()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Benchmark inference precision modes for the Adaptive fIt AI service
+- Compares fp32 / bf16 / int8 on each tier of the model fallback chain
+- Reports generation tokens/sec, forward latency, perplexity and resident memory
+- With --prefill, compares prompt prefill time with and without the cached prompt prefix
+
+Each (model, precision) pair runs in its own subprocess so memory numbers don't bleed into each other.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+NEW_TOKENS = 32
+RUNS = 3
+PREFILL_BATCH_SIZES = (1, 4, 8)
+
+def resident_memory_mb() -> float:
+    """Current resident set size of this process in MB"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    # ru_maxrss is the peak, not current, RSS - close enough where /proc is missing
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def run_single(source: str, precision: str) -> dict:
+    """Load one model tier in one precision and measure it"""
+    import torch
+    import app as service
+
+    path = dict(service.MODEL_SOURCES)[source]
+    token = service.HF_TOKEN if source == "hub" else None
+
+    rss_before = resident_memory_mb()
+    start = time.perf_counter()
+    fp32_model, tokenizer = service.load_pretrained(path, token=token)
+    model = service.apply_precision(fp32_model, precision)
+    if model is not fp32_model:
+        del fp32_model
+    load_seconds = time.perf_counter() - start
+    rss_model = resident_memory_mb() - rss_before
+
+    check = service.measure_model(model, tokenizer)
+
+    prompt = service.build_tweak_prompt(
+        "struggle_set",
+        {"fitness_level": "intermediate", "goals": ["build_muscle"], "current_program": {"planned_reps": 10}},
+        {"exercise": "bench_press", "set_number": 3}
+    )
+    inputs = tokenizer(prompt, return_tensors="pt")
+    timings = []
+    with torch.no_grad():
+        for _ in range(RUNS):
+            start = time.perf_counter()
+            model.generate(
+                **inputs,
+                max_new_tokens=NEW_TOKENS,
+                min_new_tokens=NEW_TOKENS,
+                do_sample=False,
+                pad_token_id=tokenizer.eos_token_id
+            )
+            timings.append(time.perf_counter() - start)
+
+    median = sorted(timings)[len(timings) // 2]
+    return {
+        "source": source,
+        "precision": precision,
+        "load_seconds": round(load_seconds, 2),
+        "tokens_per_second": round(NEW_TOKENS / median, 2),
+        "forward_latency_ms": check["latency_ms"],
+        "perplexity": check["perplexity"],
+        "model_rss_mb": round(rss_model, 1),
+        "total_rss_mb": round(resident_memory_mb(), 1)
+    }
+
+def measure_prefill(service, model, tokenizer, batch_size: int) -> dict:
+    """Median prefill time for a batch of /event prompts, full prompt vs cached prefix + suffix"""
+    import torch
+
+    prompts = [
+        service.build_tweak_prompt(
+            "struggle_set",
+            {"fitness_level": "intermediate", "goals": ["build_muscle"], "current_program": {"planned_reps": 10 + i}},
+            {"exercise": "bench_press", "set_number": i + 1}
+        )
+        for i in range(batch_size)
+    ]
+    cache = service.PromptPrefixCache(enabled=True)
+    prefix_ids, _ = cache.prepare(model, tokenizer)
+    input_ids, attention_mask, _ = service.encode_tweak_prompts(prompts, tokenizer, prefix_ids)
+    prefix_width = prefix_ids.shape[1]
+    position_ids = (attention_mask.cumsum(-1) - 1).clamp(min=0)
+
+    def full_prefill():
+        model(input_ids, attention_mask=attention_mask, position_ids=position_ids, use_cache=True)
+
+    def cached_prefill():
+        model(
+            input_ids[:, prefix_width:],
+            attention_mask=attention_mask,
+            position_ids=position_ids[:, prefix_width:],
+            past_key_values=cache.past_key_values(batch_size),
+            use_cache=True
+        )
+
+    timings = {}
+    with torch.no_grad():
+        for name, prefill in (("full_ms", full_prefill), ("cached_prefix_ms", cached_prefill)):
+            prefill()  # warm-up
+            runs = []
+            for _ in range(RUNS):
+                start = time.perf_counter()
+                prefill()
+                runs.append((time.perf_counter() - start) * 1000)
+            timings[name] = round(sorted(runs)[len(runs) // 2], 2)
+
+    return {
+        "batch_size": batch_size,
+        "prompt_tokens": input_ids.shape[1],
+        "prefix_tokens": prefix_width,
+        **timings,
+        "speedup": round(timings["full_ms"] / timings["cached_prefix_ms"], 2)
+    }
+
+def run_prefill(source: str) -> list:
+    """Prefill benchmark for one model tier in fp32"""
+    import app as service
+
+    path = dict(service.MODEL_SOURCES)[source]
+    model, tokenizer = service.load_pretrained(path, token=service.HF_TOKEN if source == "hub" else None)
+    return [{"source": source, **measure_prefill(service, model, tokenizer, size)} for size in PREFILL_BATCH_SIZES]
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare inference precision modes")
+    parser.add_argument("--sources", default="hub,local,base", help="Comma-separated model tiers")
+    parser.add_argument("--precisions", default="fp32,bf16,int8", help="Comma-separated precision modes")
+    parser.add_argument("--prefill", metavar="SOURCE", help="Benchmark prompt prefill with/without the prefix cache on one tier")
+    parser.add_argument("--single", nargs=2, metavar=("SOURCE", "PRECISION"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(run_single(*args.single)))
+        return
+
+    if args.prefill:
+        print("🏋️ Adaptive fIt prompt prefill benchmark")
+        print("=" * 50)
+        results = run_prefill(args.prefill)
+        for result in results:
+            print(
+                f"✅ batch {result['batch_size']:2d}  "
+                f"full {result['full_ms']:8.2f} ms  "
+                f"cached prefix {result['cached_prefix_ms']:8.2f} ms  "
+                f"({result['speedup']:.2f}x, {result['prefix_tokens']}/{result['prompt_tokens']} tokens cached)"
+            )
+        print(json.dumps(results, indent=2))
+        return
+
+    print("🏋️ Adaptive fIt inference precision benchmark")
+    print("=" * 50)
+
+    results = []
+    for source in args.sources.split(","):
+        for precision in args.precisions.split(","):
+            proc = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--single", source, precision],
+                capture_output=True, text=True
+            )
+            if proc.returncode != 0:
+                error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "unknown error"
+                print(f"❌ {source}/{precision}: {error}")
+                continue
+            result = json.loads(proc.stdout.strip().splitlines()[-1])
+            results.append(result)
+            print(
+                f"✅ {source:5s} {precision:5s} "
+                f"{result['tokens_per_second']:8.2f} tok/s  "
+                f"{result['forward_latency_ms']:8.2f} ms/forward  "
+                f"ppl {result['perplexity']:10.3f}  "
+                f"model RSS {result['model_rss_mb']:7.1f} MB"
+            )
+
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
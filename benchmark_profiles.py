@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Benchmark resident memory of learned user preference profiles
+- Compares the slotted UserPreferenceProfile (interned rejection reasons) with an
+  equivalent dict-backed dataclass holding one string object per stored reason
+- Reports bytes per resident user at 10k / 100k / 1M users
+- Checks that both produce identical asdict() output
+- With --safety, times the population-wide nutrition safety sweep against per-user check_daily_intake
+
+Each (layout, population) pair runs in its own subprocess so allocations don't bleed into each other.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+RUNS = 3
+POPULATIONS = (10_000, 100_000, 1_000_000)
+SAFETY_POPULATION = 100_000
+REASONS = ("too_heavy", "too_light", "too_long", "pain", "equipment_unavailable", "boring")
+
+def load_engine_module():
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "app"))
+    import enhanced_ai_engine
+    return enhanced_ai_engine
+
+def dict_backed_profile_class(engine):
+    """The pre-slots layout: same fields, instance __dict__, reasons kept as separate strings"""
+    from dataclasses import field, fields, make_dataclass
+
+    spec = []
+    for f in fields(engine.UserPreferenceProfile):
+        if f.name == "user_id":
+            spec.append((f.name, f.type))
+        else:
+            spec.append((f.name, f.type, field(default=f.default)))
+
+    def __post_init__(self):
+        if self.common_rejection_reasons is None:
+            self.common_rejection_reasons = []
+
+    return make_dataclass("DictUserPreferenceProfile", spec, namespace={"__post_init__": __post_init__})
+
+def make_profile(cls, i: int):
+    # Reasons are rebuilt per user, as they are when decoded from the profile store
+    reasons = [json.loads(json.dumps(REASONS[(i + k) % len(REASONS)])) for k in range(i % 5)]
+    return cls(user_id=f"user_{i}", total_interactions=i % 200, acceptance_rate=(i % 100) / 100,
+               common_rejection_reasons=reasons)
+
+def run_single(layout: str, users: int) -> dict:
+    """Build ``users`` profiles of one layout and measure the traced allocation per user"""
+    engine = load_engine_module()
+    cls = engine.UserPreferenceProfile if layout == "slots" else dict_backed_profile_class(engine)
+
+    ids = [f"user_{i}" for i in range(users)]  # allocated before tracing: keys exist either way
+    tracemalloc.start()
+    start = time.perf_counter()
+    profiles = {uid: make_profile(cls, i) for i, uid in enumerate(ids)}
+    build_seconds = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "layout": layout,
+        "users": users,
+        "bytes_per_user": round(current / users, 1),
+        "total_mb": round(current / (1024 * 1024), 1),
+        "build_seconds": round(build_seconds, 2),
+        "has_dict": hasattr(next(iter(profiles.values())), "__dict__")
+    }
+
+def check_asdict_compatible() -> bool:
+    from dataclasses import asdict
+
+    engine = load_engine_module()
+    legacy_cls = dict_backed_profile_class(engine)
+    return all(
+        asdict(make_profile(engine.UserPreferenceProfile, i)) == asdict(make_profile(legacy_cls, i))
+        for i in range(50)
+    )
+
+def run_safety(users: int) -> dict:
+    """Daily intake safety check for ``users`` users: per-user scalar calls vs one vectorized sweep"""
+    import random
+    import numpy as np
+
+    load_engine_module()
+    import enhanced_nutrition_ai as nutrition
+
+    rng = random.Random(users)
+    profiles = [
+        nutrition.UserHealthProfile(
+            user_id=f"user_{i}", medical_conditions=rng.choice([[], ["hypertension"]]), allergies=[], medications=[],
+            safety_flags={flag: rng.random() < 0.2 for flag in ("diabetesFlag", "heartConditionFlag", "kidneyIssueFlag")},
+            metabolic_data={}
+        )
+        for i in range(users)
+    ]
+    weights = [rng.uniform(45, 130) for _ in range(users)]
+    intakes = [{"calories": rng.uniform(600, 6000), "protein": rng.uniform(20, 300), "sodium": rng.uniform(800, 5000)}
+               for _ in range(users)]
+    engine = nutrition.EnhancedNutritionAI(profiles_path=os.devnull)
+    monitor = engine.safety_monitor
+
+    start = time.perf_counter()
+    scalar = [monitor.check_daily_intake(intake, profile, weight) for intake, profile, weight in zip(intakes, profiles, weights)]
+    scalar_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    limits = nutrition.HealthLimits.from_profiles(profiles)
+    matrix, weight_column = nutrition.intake_matrix(intakes), np.array(weights)
+    prepare_seconds = time.perf_counter() - start
+
+    sweeps = [engine.safety_sweep(matrix, limits, weight_column) for _ in range(RUNS)]
+    sweep_ms = sorted(sweep["elapsed_ms"] for sweep in sweeps)[RUNS // 2]
+
+    alerts = monitor.check_daily_intake_batch(matrix, limits, weight_column)
+    return {
+        "users": users,
+        "identical": all(alerts.alerts(i) == expected for i, expected in enumerate(scalar)),
+        "scalar_ms": round(scalar_seconds * 1000, 1),
+        "prepare_ms": round(prepare_seconds * 1000, 1),
+        "sweep_ms": sweep_ms,
+        "users_with_alerts": sweeps[0]["users_with_alerts"]
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare resident memory of profile layouts")
+    parser.add_argument("--users", default=",".join(str(n) for n in POPULATIONS), help="Comma-separated population sizes")
+    parser.add_argument("--safety", action="store_true", help="Benchmark the vectorized nutrition safety sweep")
+    parser.add_argument("--single", nargs=2, metavar=("LAYOUT", "USERS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(run_single(args.single[0], int(args.single[1]))))
+        return
+
+    if args.safety:
+        print("🏋️ Adaptive fIt nutrition safety sweep benchmark")
+        print("=" * 50)
+        result = run_safety(SAFETY_POPULATION)
+        print(
+            f"{'✅' if result['identical'] else '❌'} {result['users']:,d} users  "
+            f"scalar {result['scalar_ms']:.1f} ms  sweep {result['sweep_ms']:.1f} ms  "
+            f"(limits/matrix built once in {result['prepare_ms']:.1f} ms)"
+        )
+        print(json.dumps(result, indent=2))
+        return
+
+    print("🏋️ Adaptive fIt profile memory benchmark")
+    print("=" * 50)
+    print(f"{'✅' if check_asdict_compatible() else '❌'} asdict() output identical across layouts")
+
+    results = []
+    for users in (int(n) for n in args.users.split(",")):
+        for layout in ("dict", "slots"):
+            proc = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--single", layout, str(users)],
+                capture_output=True, text=True
+            )
+            if proc.returncode != 0:
+                error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "unknown error"
+                print(f"❌ {layout}/{users}: {error}")
+                continue
+            result = json.loads(proc.stdout.strip().splitlines()[-1])
+            results.append(result)
+            print(
+                f"✅ {layout:5s} {users:>9,d} users  "
+                f"{result['bytes_per_user']:8.1f} B/user  "
+                f"{result['total_mb']:8.1f} MB  "
+                f"built in {result['build_seconds']:.2f}s"
+            )
+
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()